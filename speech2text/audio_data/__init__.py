@@ -28,18 +28,34 @@ How it works in general:
 - (optional) noise reduction
 - transcribing via OpenAI Whisper
 5. Transcribed text
+
+The conversions between the formats go straight through the PCM buffer
+(no in-memory WAVE files are built on the way).
+
+`PcmConverter` converts a stream to other PCM-parameters chunk by chunk
+(e.g. a 48 kHz stereo microphone input to `WHISPER_PCM_PARAMS`).
+
+`VoiceActivityDetector` tells the blocks with speech from the ones with
+only a noise (see `vad.py`).
 """
 
+from .loudness import LoudnessProfile
 from .np_array import NpData
 from .pcm_params import WHISPER_PCM_PARAMS, PcmParams
 from .pydub_audioseg import PdData
+from .resampler import PcmConverter
+from .vad import VoiceActivity, VoiceActivityDetector
 from .wave_data import WavData
 
 __all__ = [
     "IAudioData",
+    "LoudnessProfile",
     "NpData",
+    "PcmConverter",
     "PcmParams",
     "PdData",
+    "VoiceActivity",
+    "VoiceActivityDetector",
     "WHISPER_PCM_PARAMS",
     "WavData",
 ]
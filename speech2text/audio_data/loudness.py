@@ -0,0 +1,286 @@
+"""`LoudnessProfile` keeps track of the loudness of a growing PCM-encoded
+audio block with a millisecond resolution.
+
+The profile stores the cumulative energy of the samples at every millisecond
+boundary, so the energy of any span is just a difference of two values.
+New audio is appended with `extend`, which only touches the new frames:
+```
+profile = LoudnessProfile(pcm_params)
+profile.extend(chunk)  # O(len(chunk))
+silent_ranges = profile.detect_silence(1000, -30, 10)
+```
+
+`detect_silence` and `detect_nonsilent` mirror the functions with the same
+names from `pydub.silence` (and return the same ranges in milliseconds),
+but never rescan the audio itself.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+import numpy.typing as np_typing
+
+from .pcm_params import PcmParams
+
+MSEC_IN_SEC = 1000
+
+
+class LoudnessProfile:
+    def __init__(self, pcm_params: PcmParams) -> None:
+        self.pcm_params = pcm_params
+        # `_energy[ms]` is the sum of squared (normalized) samples within
+        # the time span `[0, ms)`. The array grows with a doubling capacity.
+        self._energy: np_typing.NDArray[np.float64] = np.zeros(64, "f8")
+        self._complete_msec: int = 0  # the last `ms` with known `_energy`
+        self._frames_count: int = 0
+        self._total_energy: float = 0.0
+        self._window_rms_cache: dict = {}
+
+    @property
+    def duration_msec(self) -> int:
+        """The same as `len(audio_segment)`."""
+        frame_rate = self.pcm_params.frame_rate
+        return round(MSEC_IN_SEC * (self._frames_count / frame_rate))
+
+    @property
+    def frames_count(self) -> int:
+        return self._frames_count
+
+    def _msec_to_frame(self, msec: np_typing.ArrayLike) -> np.ndarray:
+        # the same rounding as in `pydub.AudioSegment.__getitem__`
+        frame_rate = self.pcm_params.frame_rate
+        return (np.asarray(msec) * frame_rate / MSEC_IN_SEC).astype(np.int64)
+
+    def _energy_at(self, msec: np.ndarray) -> np.ndarray:
+        # the frames after the last whole millisecond are padded with
+        # silence (as `pydub` does), so the energy stays the same
+        known = np.minimum(msec, self._complete_msec)
+        return np.where(
+            msec <= self._complete_msec,
+            self._energy[known],
+            self._total_energy,
+        )
+
+    def _reserve(self, size: int) -> None:
+        if size <= len(self._energy):
+            return
+        capacity = len(self._energy)
+        while capacity < size:
+            capacity *= 2
+        energy = np.zeros(capacity, "f8")
+        energy[: self._complete_msec + 1] = self._energy[
+            : self._complete_msec + 1
+        ]
+        self._energy = energy
+
+    def extend(self, data: bytes | bytearray | memoryview) -> None:
+        """Appends the PCM-encoded frames (the same `pcm_params`) to the end
+        of the profile."""
+        sample_width = self.pcm_params.sample_width_bytes
+        channels = self.pcm_params.channels_count
+        frame_size = self.pcm_params.frame_size_bytes()
+        data = memoryview(data)[: len(data) - len(data) % frame_size]
+        if len(data) == 0:
+            return
+
+        samples = np.frombuffer(data, f"<i{sample_width}").astype("f8")
+        samples /= 2 ** (sample_width * 8 - 1)
+        frames_energy = np.square(samples).reshape(-1, channels).sum(axis=1)
+        cumulative = np.cumsum(frames_energy)
+        cumulative += self._total_energy
+
+        first_frame = self._frames_count
+        last_frame = first_frame + len(frames_energy)
+        max_msec = last_frame * MSEC_IN_SEC // self.pcm_params.frame_rate + 1
+        new_msec = np.arange(self._complete_msec + 1, max_msec + 1)
+        boundaries = self._msec_to_frame(new_msec)
+        fits = boundaries <= last_frame
+        new_msec, boundaries = new_msec[fits], boundaries[fits]
+
+        if len(new_msec) > 0:
+            self._reserve(new_msec[-1] + 1)
+            offsets = boundaries - first_frame - 1
+            self._energy[new_msec] = np.where(
+                offsets >= 0,
+                cumulative[np.maximum(offsets, 0)],
+                self._total_energy,
+            )
+            self._complete_msec = int(new_msec[-1])
+
+        self._frames_count = last_frame
+        self._total_energy = float(cumulative[-1])
+        self._window_rms_cache.clear()
+
+    def slice(self, start_msec: int, end_msec: int) -> "LoudnessProfile":
+        """Creates a profile of the `[start_msec, end_msec)` span (the same
+        way `pydub.AudioSegment` slicing works)."""
+        duration_msec = self.duration_msec
+        start_msec = max(0, min(start_msec, duration_msec))
+        end_msec = max(start_msec, min(end_msec, duration_msec))
+        start_frame, end_frame = self._msec_to_frame([start_msec, end_msec])
+        end_frame = min(end_frame, self._frames_count)
+
+        profile = LoudnessProfile(self.pcm_params)
+        energy = self._energy_at(np.arange(start_msec, end_msec + 1))
+        energy -= energy[0]
+        profile._reserve(len(energy))
+        profile._energy[: len(energy)] = energy
+        profile._complete_msec = min(end_msec, self._complete_msec)
+        profile._complete_msec -= min(start_msec, profile._complete_msec)
+        profile._frames_count = int(max(end_frame - start_frame, 0))
+        profile._total_energy = float(energy[-1])
+        return profile
+
+    def _window_starts(
+        self, min_silence_len: int, seek_step: int
+    ) -> np_typing.NDArray[np.int64]:
+        last_slice_start = self.duration_msec - min_silence_len
+        starts = np.arange(0, last_slice_start + 1, seek_step)
+        if last_slice_start % seek_step:
+            starts = np.append(starts, last_slice_start)
+        return starts
+
+    def window_rms(
+        self, min_silence_len: int, seek_step: int
+    ) -> Tuple[np_typing.NDArray[np.int64], np_typing.NDArray[np.float64]]:
+        """The starts (msec) of the windows of `min_silence_len` length,
+        checked with the `seek_step` step, and their `rms` (the same as
+        `pydub.AudioSegment.rms`).
+
+        The result is cached until the profile is extended, so the presets
+        sharing the same window geometry are evaluated only once."""
+        key = (min_silence_len, seek_step)
+        if key not in self._window_rms_cache:
+            starts = self._window_starts(min_silence_len, seek_step)
+            rms = self._rms(starts, starts + min_silence_len)
+            self._window_rms_cache[key] = (starts, rms)
+        return self._window_rms_cache[key]
+
+    def _rms(
+        self, starts: np.ndarray, ends: np.ndarray
+    ) -> np_typing.NDArray[np.float64]:
+        energy = self._energy_at(ends) - self._energy_at(starts)
+        samples_count = (
+            self._msec_to_frame(ends) - self._msec_to_frame(starts)
+        ) * self.pcm_params.channels_count
+        max_amplitude = 2 ** (self.pcm_params.sample_width_bytes * 8 - 1)
+        rms = np.sqrt(energy / np.maximum(samples_count, 1))
+        return np.floor(rms * max_amplitude)  # `audioop.rms` is integer
+
+    def silent_window_starts(
+        self,
+        min_silence_len: int,
+        silence_thresh: float,
+        seek_step: int,
+    ) -> np_typing.NDArray[np.int64]:
+        """The starts (msec) of all the silent windows of `min_silence_len`
+        length, checked with the `seek_step` step."""
+        if self.duration_msec < min_silence_len:
+            return np.empty(0, np.int64)
+        starts, rms = self.window_rms(min_silence_len, seek_step)
+        max_amplitude = 2 ** (self.pcm_params.sample_width_bytes * 8 - 1)
+        thresh = 10 ** (silence_thresh / 20) * max_amplitude
+        return starts[rms <= thresh]
+
+    def energy(self, start_msec: int, end_msec: int) -> float:
+        """The sum of squared (normalized) samples within the time span."""
+        energy = self._energy_at(np.array([start_msec, end_msec]))
+        return float(energy[1] - energy[0])
+
+    def nonsilent_span(
+        self,
+        window_msec: int,
+        silence_thresh: float,
+        seek_step: int,
+        start_msec: int = 0,
+        end_msec: int | None = None,
+    ) -> Tuple[int, int] | None:
+        """The span (msec) from the start of the first non-silent window of
+        `window_msec` length to the end of the last one. Only the windows
+        within `[start_msec, end_msec)` are checked (a shorter time span is
+        checked as a single window). `None` if all the windows are silent.
+        """
+        if end_msec is None:
+            end_msec = self.duration_msec
+        window_msec = min(window_msec, end_msec - start_msec)
+        if window_msec <= 0:
+            return None
+        starts = np.arange(start_msec, end_msec - window_msec + 1, seek_step)
+        rms = self._rms(starts, starts + window_msec)
+        max_amplitude = 2 ** (self.pcm_params.sample_width_bytes * 8 - 1)
+        thresh = 10 ** (silence_thresh / 20) * max_amplitude
+        nonsilent_starts = starts[rms > thresh]
+        if len(nonsilent_starts) == 0:
+            return None
+        first, last = nonsilent_starts[0], nonsilent_starts[-1]
+        return int(first), int(last + window_msec)
+
+    def quietest_msec(
+        self, start_msec: int, end_msec: int, window_msec: int
+    ) -> int:
+        """The middle (msec) of the quietest `window_msec` long span within
+        `[start_msec, end_msec)`."""
+        last_start = max(end_msec - window_msec, start_msec)
+        starts = np.arange(start_msec, last_start + 1)
+        energy = self._energy_at(starts + window_msec) - self._energy_at(
+            starts
+        )
+        return int(starts[np.argmin(energy)]) + window_msec // 2
+
+    def detect_silence(
+        self,
+        min_silence_len: int = 1000,
+        silence_thresh: float = -16,
+        seek_step: int = 1,
+    ) -> List[List[int]]:
+        """Same as `pydub.silence.detect_silence`."""
+        silence_starts = self.silent_window_starts(
+            min_silence_len, silence_thresh, seek_step
+        )
+        if len(silence_starts) == 0:
+            return []
+
+        # a new range begins where the previous silent window is neither
+        # continuous nor overlapping with the current one
+        gaps = np.diff(silence_starts)
+        breaks = np.flatnonzero((gaps != seek_step) & (gaps > min_silence_len))
+        range_starts = silence_starts[np.concatenate(([0], breaks + 1))]
+        range_ends = (
+            silence_starts[np.concatenate((breaks, [-1]))] + min_silence_len
+        )
+        return [
+            [int(start), int(end)]
+            for start, end in zip(range_starts, range_ends)
+        ]
+
+    def detect_nonsilent(
+        self,
+        min_silence_len: int = 1000,
+        silence_thresh: float = -16,
+        seek_step: int = 1,
+    ) -> List[List[int]]:
+        """Same as `pydub.silence.detect_nonsilent`."""
+        silent_ranges = self.detect_silence(
+            min_silence_len, silence_thresh, seek_step
+        )
+        len_seg = self.duration_msec
+
+        if not silent_ranges:
+            return [[0, len_seg]]
+
+        if silent_ranges[0][0] == 0 and silent_ranges[0][1] == len_seg:
+            return []
+
+        prev_end_i = 0
+        nonsilent_ranges = []
+        for start_i, end_i in silent_ranges:
+            nonsilent_ranges.append([prev_end_i, start_i])
+            prev_end_i = end_i
+
+        if end_i != len_seg:
+            nonsilent_ranges.append([prev_end_i, len_seg])
+
+        if nonsilent_ranges[0] == [0, 0]:
+            nonsilent_ranges.pop(0)
+
+        return nonsilent_ranges
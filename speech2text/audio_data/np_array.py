@@ -6,6 +6,7 @@ import numpy as np
 import numpy.typing as np_typing
 from torch.cuda import is_available as is_cuda_available
 
+from . import np_effects
 from .audio_data import IAudioData, PcmParams
 from .pydub_audioseg import PdData
 from .wave_data import WavData
@@ -15,7 +16,12 @@ NP_DTYPE = "f2" if is_cuda_available() else "f4"
 
 @dataclass
 class NpData(IAudioData):
-    """An `IAudioData` implementation for `np.float`-arrays (2 or 4 bytes)."""
+    """An `IAudioData` implementation for `np.float`-arrays (2 or 4 bytes).
+
+    Provides the same effects as `PdData` does (`normalize`, `apply_gain`,
+    `high_pass_filter`, `low_pass_filter`, `speedup`), but implemented with
+    NumPy (see `np_effects`). The effects return a new object.
+    """
 
     _pcm_params: PcmParams
     _data: np_typing.NDArray[np.float32]
@@ -30,21 +36,36 @@ class NpData(IAudioData):
             data = wav_file.raw_data
         else:
             pcm_params, data = NpData._load_from_wav_file(wav_file)
-
-        dtype = f"<i{pcm_params.sample_width_bytes}"
-        np_array: np_typing.NDArray = np.frombuffer(data, dtype)
-        max_val = 2 ** (pcm_params.sample_width_bytes * 8 - 1)
-        np_array = np_array.astype(NP_DTYPE) / max_val
-
-        return NpData(pcm_params, np_array)
+        return NpData.load_from_raw(data, pcm_params)
 
     @staticmethod
     def load_from_pd_data(audio: PdData) -> "NpData":
-        return NpData.load_from_wav_file(audio.create_io_stream())
+        return NpData.load_from_raw(audio.raw_data, audio.pcm_params)
+
+    @staticmethod
+    def load_from_raw(
+        data: bytes | bytearray | memoryview, pcm_params: PcmParams
+    ) -> "NpData":
+        """Converts PCM-encoded frames straight from the buffer: the samples
+        are read through a `np.frombuffer` view, and the only copy made is
+        the resulting float array."""
+        sample_width_bytes = pcm_params.sample_width_bytes
+        np_array: np_typing.NDArray = np.frombuffer(
+            data, f"<i{sample_width_bytes}"
+        )
+        max_val = 2 ** (sample_width_bytes * 8 - 1)
+        np_array = np.multiply(np_array, 1 / max_val, dtype=NP_DTYPE)
+
+        return NpData(pcm_params, np_array)
 
     def create_io_stream(self) -> BytesIO:
-        wav_data = WavData(self.pcm_params, self.raw_data)
-        return wav_data.create_io_stream()
+        return self.create_wav_data().create_io_stream()
+
+    def create_wav_data(self) -> WavData:
+        return WavData(self.pcm_params, self.raw_data)
+
+    def create_pd_data(self) -> PdData:
+        return PdData.load_from_raw(self.raw_data, self.pcm_params)
 
     @property
     def pcm_params(self) -> PcmParams:
@@ -52,10 +73,45 @@ class NpData(IAudioData):
 
     @property
     def raw_data(self) -> bytes:
-        np_array: np_typing.NDArray = np.copy(self._data)
         sample_width_bytes = self.pcm_params.sample_width_bytes
         max_val = 2 ** (sample_width_bytes * 8 - 1)
-        np_array *= max_val
-        np.clip(np_array, -max_val, max_val - 1)
+        float_dtype = "f8" if sample_width_bytes > 2 else "f4"
+        np_array = np.multiply(self._data, max_val, dtype=float_dtype)
+        np.clip(np_array, -max_val, max_val - 1, out=np_array)
         data = np_array.astype(f"<i{sample_width_bytes}").tobytes()
         return data
+
+    @property
+    def frames(self) -> np_typing.NDArray:
+        """The samples shaped as `(frames, channels)` (a view)."""
+        return self._data.reshape(-1, self.pcm_params.channels_count)
+
+    def _spawn(self, frames: np_typing.NDArray) -> "NpData":
+        return NpData(self.pcm_params, frames.reshape(-1))
+
+    def normalize(self, headroom: float = 0.1) -> "NpData":
+        return self._spawn(np_effects.normalize(self.frames, headroom))
+
+    def apply_gain(self, volume_change: float) -> "NpData":
+        return self._spawn(np_effects.apply_gain(self.frames, volume_change))
+
+    def high_pass_filter(self, cutoff: float) -> "NpData":
+        frames, _ = np_effects.high_pass_filter(
+            self.frames, self.pcm_params.frame_rate, cutoff
+        )
+        return self._spawn(frames)
+
+    def low_pass_filter(self, cutoff: float) -> "NpData":
+        frames, _ = np_effects.low_pass_filter(
+            self.frames, self.pcm_params.frame_rate, cutoff
+        )
+        return self._spawn(frames)
+
+    def speedup(self, playback_speed: float) -> "NpData":
+        assert playback_speed >= 1.0
+        if playback_speed == 1.0:
+            return self
+        frames = np_effects.speedup(
+            self.frames, self.pcm_params.frame_rate, playback_speed
+        )
+        return self._spawn(frames)
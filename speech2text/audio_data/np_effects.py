@@ -0,0 +1,200 @@
+"""NumPy implementations of the `pydub.effects` used in `speech2text`.
+
+The functions take an array of (normalized) float samples, shaped as
+`(frames, channels)`, and return a new array of the same shape.
+
+- `low_pass_filter`, `high_pass_filter` — the same first-order IIR filters
+as in `pydub.effects`. The recursion `y[n] = pole * y[n-1] + gain * u[n]` is
+evaluated in blocks of `IIR_BLOCK_SIZE` frames with matrix products (instead
+of a per-sample Python loop). The filters also return their `FilterState`,
+which allows continuing the filtering with the next portion of samples.
+- `apply_gain`, `normalize` — the same as in `pydub`
+- `speedup` — a WSOLA (waveform similarity overlap-add) time compression,
+which keeps the pitch
+"""
+
+from dataclasses import dataclass
+from math import ceil, pi
+
+import numpy as np
+import numpy.typing as np_typing
+
+IIR_BLOCK_SIZE = 64
+
+WSOLA_WINDOW_MSEC = 30
+WSOLA_TOLERANCE_MSEC = 10
+
+MSEC_IN_SEC = 1000
+
+Samples = np_typing.NDArray[np.floating]
+
+
+@dataclass
+class FilterState:
+    """The delay line of a first-order filter (a value per channel)."""
+
+    last_input: np_typing.NDArray[np.float64]
+    last_output: np_typing.NDArray[np.float64]
+
+
+def db_to_float(db: float) -> float:
+    return 10 ** (db / 20)
+
+
+def _first_order_iir(
+    u: np_typing.NDArray[np.float64],
+    pole: float,
+    gain: float,
+    last_output: np_typing.NDArray[np.float64],
+) -> np_typing.NDArray[np.float64]:
+    """`y[n] = pole * y[n-1] + gain * u[n]`, where `y[-1] = last_output`."""
+    frames_count, channels_count = u.shape
+    if frames_count == 0:
+        return np.empty_like(u)
+    block_size = min(IIR_BLOCK_SIZE, frames_count)
+    blocks_count = ceil(frames_count / block_size)
+
+    u_blocks = np.zeros((blocks_count * block_size, channels_count))
+    u_blocks[:frames_count] = u
+    u_blocks = u_blocks.reshape(blocks_count, block_size, channels_count)
+
+    # the response of each block with the zero initial state
+    lags = np.subtract.outer(np.arange(block_size), np.arange(block_size))
+    impulse_response = np.where(
+        lags >= 0, gain * pole ** np.maximum(lags, 0), 0.0
+    )
+    y_blocks = (
+        (
+            impulse_response
+            @ u_blocks.transpose(1, 0, 2).reshape(block_size, -1)
+        )
+        .reshape(block_size, blocks_count, channels_count)
+        .transpose(1, 0, 2)
+    )
+
+    # the outputs at the ends of the blocks follow the same recursion
+    prev_ends = last_output[np.newaxis, :]
+    if blocks_count > 1:
+        block_ends = _first_order_iir(
+            y_blocks[:-1, -1, :], pole**block_size, 1.0, last_output
+        )
+        prev_ends = np.vstack([prev_ends, block_ends])
+    decay = pole ** np.arange(1, block_size + 1)
+    y_blocks += decay[np.newaxis, :, np.newaxis] * prev_ends[:, np.newaxis]
+
+    return y_blocks.reshape(-1, channels_count)[:frames_count]
+
+
+def low_pass_filter(
+    samples: Samples,
+    frame_rate: int,
+    cutoff: float,
+    state: FilterState | None = None,
+) -> tuple[Samples, FilterState]:
+    """cutoff - Frequency (in Hz) where higher frequency signal will begin to
+    be reduced by 6dB per octave (doubling in frequency) above this point"""
+    if len(samples) == 0:
+        return samples, state
+    rc = 1.0 / (cutoff * 2 * pi)
+    dt = 1.0 / frame_rate
+    alpha = dt / (rc + dt)
+
+    x = samples.astype(np.float64)
+    last_output = x[0] if state is None else state.last_output
+    y = _first_order_iir(x, 1.0 - alpha, alpha, last_output)
+    return y.astype(samples.dtype), FilterState(x[-1], y[-1])
+
+
+def high_pass_filter(
+    samples: Samples,
+    frame_rate: int,
+    cutoff: float,
+    state: FilterState | None = None,
+) -> tuple[Samples, FilterState]:
+    """cutoff - Frequency (in Hz) where lower frequency signal will begin to
+    be reduced by 6dB per octave (doubling in frequency) below this point"""
+    if len(samples) == 0:
+        return samples, state
+    rc = 1.0 / (cutoff * 2 * pi)
+    dt = 1.0 / frame_rate
+    alpha = rc / (rc + dt)
+
+    x = samples.astype(np.float64)
+    if state is None:
+        # the first frame is passed as is (as in `pydub`)
+        state = FilterState(x[0], x[0] / alpha)
+        x_prev = np.vstack([x[:1], x[:-1]])
+    else:
+        x_prev = np.vstack([state.last_input[np.newaxis, :], x[:-1]])
+    y = _first_order_iir(x - x_prev, alpha, alpha, state.last_output)
+    np.clip(y, -1.0, 1.0, out=y)
+    return y.astype(samples.dtype), FilterState(x[-1], y[-1])
+
+
+def apply_gain(samples: Samples, volume_change: float) -> Samples:
+    """volume_change - in dB"""
+    result = samples * samples.dtype.type(db_to_float(volume_change))
+    return np.clip(result, -1.0, 1.0, out=result)
+
+
+def normalize(
+    samples: Samples, headroom: float = 0.1, peak: float | None = None
+) -> Samples:
+    """headroom is how close to the maximum volume to boost the signal up to
+    (specified in dB)
+
+    peak - the peak to normalize against (by default: the peak of `samples`)
+    """
+    peak_sample_val = peak
+    if peak_sample_val is None:
+        peak_sample_val = np.max(np.abs(samples), initial=0.0)
+    if peak_sample_val == 0:
+        return samples
+    target_peak = db_to_float(-headroom)
+    return apply_gain(samples, 20 * np.log10(target_peak / peak_sample_val))
+
+
+def speedup(
+    samples: Samples,
+    frame_rate: int,
+    playback_speed: float,
+    window_msec: int = WSOLA_WINDOW_MSEC,
+    tolerance_msec: int = WSOLA_TOLERANCE_MSEC,
+) -> Samples:
+    """Makes the audio `playback_speed` times shorter. Each next window is
+    taken from around its nominal position, at the offset where it matches
+    the natural continuation of the previous window the best."""
+    assert playback_speed >= 1.0
+    if playback_speed == 1.0 or len(samples) == 0:
+        return samples
+    window = int(frame_rate * window_msec / MSEC_IN_SEC) // 2 * 2
+    synthesis_hop = window // 2
+    analysis_hop = synthesis_hop * playback_speed
+    tolerance = int(frame_rate * tolerance_msec / MSEC_IN_SEC)
+
+    frames_count, channels_count = samples.shape
+    out_frames_count = int(frames_count / playback_speed)
+    windows_count = ceil(out_frames_count / synthesis_hop) + 1
+
+    padding = 2 * (ceil(analysis_hop) + tolerance + window)
+    x = np.zeros((frames_count + padding, channels_count))
+    x[tolerance : tolerance + frames_count] = samples
+    x_mono = x.mean(axis=1)
+    hann = np.hanning(window + 1)[:window, np.newaxis]  # sums up to 1
+
+    y = np.zeros(((windows_count + 1) * synthesis_hop, channels_count))
+    pos = tolerance
+    for k in range(windows_count):
+        nominal = tolerance + int(k * analysis_hop)
+        if k > 0:
+            natural = pos + synthesis_hop
+            template = x_mono[natural : natural + window]
+            region = x_mono[nominal - tolerance : nominal + tolerance + window]
+            similarity = np.correlate(region, template, "valid")
+            pos = nominal - tolerance + int(np.argmax(similarity))
+        else:
+            pos = nominal
+        out_pos = k * synthesis_hop
+        y[out_pos : out_pos + window] += x[pos : pos + window] * hann
+
+    return y[:out_frames_count].astype(samples.dtype)
@@ -18,6 +18,7 @@ How to make an instance:
   - `__init__`: `PdData(data)`
 - `IAudioData` methods
   - `PdData.load_from_wav_file` -- takes: path | file descriptor | `WavData`
+  - `PdData.load_from_raw` -- takes: PCM-encoded frames + `PcmParams`
 """
 
 from io import BytesIO
@@ -27,6 +28,7 @@ from pydub import AudioSegment, effects, silence
 
 from .audio_data import IAudioData, PcmParams
 from .pcm_params import WHISPER_PCM_PARAMS
+from .resampler import convert_pcm_params
 from .wave_data import WavData
 
 
@@ -36,9 +38,27 @@ class PdData(AudioSegment, IAudioData):
         wav_file: str | bytes | PathLike | WavData,
     ) -> "PdData":
         if isinstance(wav_file, WavData):
-            wav_file = wav_file.create_io_stream()
+            return PdData.load_from_raw(wav_file.raw_data, wav_file.pcm_params)
         return PdData.from_wav(wav_file)
 
+    @staticmethod
+    def load_from_raw(
+        data: bytes | bytearray | memoryview, pcm_params: PcmParams
+    ) -> "PdData":
+        """Wraps PCM-encoded frames without building a WAVE file.
+
+        `bytes` are used as is, mutable buffers are copied once (otherwise
+        the new object won't be immutable).
+        """
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        return PdData(
+            data,
+            sample_width=pcm_params.sample_width_bytes,
+            frame_rate=pcm_params.frame_rate,
+            channels=pcm_params.channels_count,
+        )
+
     def create_io_stream(self) -> BytesIO:
         in_memory_wav_file = BytesIO()
         self.export(in_memory_wav_file, "wav")
@@ -46,7 +66,7 @@ class PdData(AudioSegment, IAudioData):
         return in_memory_wav_file
 
     def create_wav_data(self) -> WavData:
-        return WavData(self.pcm_params, bytearray(self.raw_data))
+        return WavData(self.pcm_params, self.raw_data)
 
     @property
     def pcm_params(self) -> PcmParams:
@@ -61,19 +81,19 @@ class PdData(AudioSegment, IAudioData):
     ) -> "PdData":
         """Convert to new PCI parameters (changing: the amount of channels  /
         frame rate  / sample width). Creates a new object (the original object
-        stays intact.
+        stays intact). The conversion is done by `PcmConverter` (NumPy).
 
         Example:
         ```
         new = old.adjust_pcm_params(new_pci_params)
         ```
         """
-        new_audio = (
-            self.set_channels(new_pcm_params.channels_count)
-            .set_frame_rate(new_pcm_params.frame_rate)
-            .set_sample_width(new_pcm_params.sample_width_bytes)
+        if new_pcm_params == self.pcm_params:
+            return self
+        data = convert_pcm_params(
+            self.raw_data, self.pcm_params, new_pcm_params
         )
-        return new_audio
+        return PdData.load_from_raw(data, new_pcm_params)
 
     def normalize(self, headroom: float = 0.1) -> "PdData":
         return effects.normalize(self, headroom)
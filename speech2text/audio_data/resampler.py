@@ -0,0 +1,216 @@
+"""Converting PCM-encoded audio to other `PcmParams` chunk by chunk.
+
+`PcmConverter` changes the amount of channels (downmixing to mono by
+averaging, or duplicating a mono channel), the frame rate and the sample
+width. It keeps the state between the chunks, so converting a stream chunk
+by chunk gives the same frames as converting it at once:
+```
+converter = PcmConverter(mic_pcm_params, WHISPER_PCM_PARAMS)
+for chunk in chunks:
+    whisper_chunk = converter.convert(chunk)
+...
+tail = converter.flush()  # the last few delayed frames
+```
+
+The frame rate is changed by `StreamResampler`: a polyphase FIR resampler
+(a windowed-sinc low-pass filter evaluated only at the output positions),
+vectorized with NumPy. Unlike `pydub` (`audioop.ratecv`), it doesn't alias
+when the frame rate is lowered.
+"""
+
+from math import gcd
+
+import numpy as np
+import numpy.typing as np_typing
+
+from .pcm_params import WHISPER_PCM_PARAMS, PcmParams
+
+ZERO_CROSSINGS = 16  # the half-length of the filter (in input frames)
+ROLLOFF = 0.95  # the cutoff relative to the lower Nyquist frequency
+KAISER_BETA = 8.6
+
+
+class StreamResampler:
+    """Changes the frame rate of float frames, shaped as
+    `(frames, channels)`, from `in_rate` to `out_rate`.
+
+    The output frame `n` is positioned at the input time `n * in_rate /
+    out_rate`. It can be computed as soon as `ZERO_CROSSINGS` (or so)
+    input frames after that position are known, so the output is delayed
+    by a few frames until `flush` is called.
+    """
+
+    def __init__(self, in_rate: int, out_rate: int, channels_count: int):
+        ratio_gcd = gcd(in_rate, out_rate)
+        self.up = out_rate // ratio_gcd
+        self.down = in_rate // ratio_gcd
+        self.channels_count = channels_count
+
+        # the filter on the (virtually) upsampled grid: `h[j]`, `|j| <= M`
+        cutoff = ROLLOFF * 0.5 / max(self.up, self.down)
+        half_len = ZERO_CROSSINGS * max(self.up, self.down)
+        j = np.arange(-half_len, half_len + 1)
+        h = 2 * cutoff * np.sinc(2 * cutoff * j)
+        h *= np.kaiser(len(j), KAISER_BETA)
+
+        # `_coeffs[s, k]` is the weight of the input frame `m0 + k` for the
+        # output frames with `(n * down - M) ≡ -s (mod up)`, where `m0` is
+        # the first input frame within the filter's reach
+        self._half_len = half_len
+        self._taps_count = (2 * half_len) // self.up + 1
+        shifts = np.arange(self.up)[:, np.newaxis]
+        taps = np.arange(self._taps_count)[np.newaxis, :]
+        idx = 2 * half_len - shifts - taps * self.up
+        coeffs = np.where(idx >= 0, h[np.maximum(idx, 0)], 0.0)
+        self._coeffs = coeffs / coeffs.sum(axis=1, keepdims=True)
+
+        # the input frames, which are still needed; `_buffer[0]` is the
+        # input frame `_buffer_start` (the frames before 0 are silence)
+        self._buffer = np.zeros((self._taps_count, channels_count))
+        self._buffer_start = -self._taps_count
+        self._next_output = 0
+        self._input_count = 0
+
+    def _first_input(self, n: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """`m0` and `s` for the output frames `n` (see `_coeffs`)."""
+        pos = n * self.down - self._half_len
+        shift = (-pos) % self.up
+        return (pos + shift) // self.up, shift
+
+    def _resample(self, outputs_end: int) -> np_typing.NDArray[np.float64]:
+        n = np.arange(self._next_output, outputs_end)
+        first_input, shift = self._first_input(n)
+        windows = np.lib.stride_tricks.sliding_window_view(
+            self._buffer, self._taps_count, axis=0
+        )  # (frames, channels, taps), no copying
+        y = np.empty((len(n), self.channels_count))
+        for phase in range(min(self.up, len(n))):
+            # every `up`-th output frame has the same `shift`, and its first
+            # input frame advances by `down`
+            outputs = y[phase :: self.up]
+            start = first_input[phase] - self._buffer_start
+            phase_windows = windows[start :: self.down][: len(outputs)]
+            outputs[:] = phase_windows @ self._coeffs[shift[phase]]
+        self._next_output = outputs_end
+
+        # drop the input frames, which won't be needed anymore
+        next_first_input, _ = self._first_input(np.array(outputs_end))
+        drop = max(
+            0, min(next_first_input - self._buffer_start, len(self._buffer))
+        )
+        self._buffer = self._buffer[drop:]
+        self._buffer_start += drop
+        return y
+
+    def resample(
+        self, frames: np_typing.NDArray
+    ) -> np_typing.NDArray[np.float64]:
+        """Takes the next input frames, returns the output frames, which
+        can be computed so far."""
+        self._buffer = np.concatenate([self._buffer, frames], axis=0)
+        self._input_count += len(frames)
+        buffer_end = self._buffer_start + len(self._buffer)
+        # the last output frame, which has all its input frames known
+        last = (
+            (buffer_end - self._taps_count) * self.up + self._half_len
+        ) // self.down
+        while last >= self._next_output:
+            first_input, _ = self._first_input(np.array(last))
+            if first_input + self._taps_count <= buffer_end:
+                break
+            last -= 1
+        return self._resample(max(last + 1, self._next_output))
+
+    def flush(self) -> np_typing.NDArray[np.float64]:
+        """Returns the rest of the output frames (the input is considered
+        to be followed by silence)."""
+        outputs_end = -(-self._input_count * self.up // self.down)
+        if outputs_end <= self._next_output:
+            return np.zeros((0, self.channels_count))
+        padding = np.zeros((self._taps_count + 1, self.channels_count))
+        self._buffer = np.concatenate([self._buffer, padding], axis=0)
+        return self._resample(outputs_end)
+
+
+class PcmConverter:
+    """Converts PCM-encoded frames from `in_pcm_params` to `out_pcm_params`
+    chunk by chunk (see the module's docstring)."""
+
+    def __init__(
+        self,
+        in_pcm_params: PcmParams,
+        out_pcm_params: PcmParams = WHISPER_PCM_PARAMS,
+    ) -> None:
+        in_channels = in_pcm_params.channels_count
+        out_channels = out_pcm_params.channels_count
+        if in_channels != out_channels and 1 not in (
+            in_channels,
+            out_channels,
+        ):
+            raise ValueError(
+                f"Can't convert {in_channels} channels to {out_channels}"
+            )
+        self.in_pcm_params = in_pcm_params
+        self.out_pcm_params = out_pcm_params
+        self._resampler = None
+        if in_pcm_params.frame_rate != out_pcm_params.frame_rate:
+            self._resampler = StreamResampler(
+                in_pcm_params.frame_rate,
+                out_pcm_params.frame_rate,
+                min(in_channels, out_channels),
+            )
+        self._partial_frame = b""
+
+    def _decode(self, data: bytes | bytearray | memoryview) -> np.ndarray:
+        params = self.in_pcm_params
+        frame_size = params.frame_size_bytes()
+        data = self._partial_frame + bytes(data)
+        tail = len(data) % frame_size
+        self._partial_frame = data[len(data) - tail :]
+        data = memoryview(data)[: len(data) - tail]
+
+        width = params.sample_width_bytes
+        samples = np.frombuffer(data, f"<i{width}") / 2 ** (width * 8 - 1)
+        frames = samples.reshape(-1, params.channels_count)
+        if self.out_pcm_params.channels_count < params.channels_count:
+            frames = frames.mean(axis=1, keepdims=True)  # downmix to mono
+        return frames
+
+    def _encode(self, frames: np.ndarray) -> bytes:
+        channels_count = self.out_pcm_params.channels_count
+        if frames.shape[1] < channels_count:
+            frames = np.repeat(frames, channels_count, axis=1)
+        width = self.out_pcm_params.sample_width_bytes
+        max_val = 2 ** (width * 8 - 1)
+        samples = np.rint(frames * max_val)
+        np.clip(samples, -max_val, max_val - 1, out=samples)
+        return samples.astype(f"<i{width}").tobytes()
+
+    def convert(self, data: bytes | bytearray | memoryview) -> bytes:
+        """Converts the next chunk. Incomplete frames are kept until the
+        next call, and the resampler delays a few frames (see `flush`)."""
+        if self.in_pcm_params == self.out_pcm_params:
+            return bytes(data)
+        frames = self._decode(data)
+        if self._resampler:
+            frames = self._resampler.resample(frames)
+        return self._encode(frames)
+
+    def flush(self) -> bytes:
+        """Returns the frames delayed by the resampler."""
+        if (
+            self._resampler is None
+            or self.in_pcm_params == self.out_pcm_params
+        ):
+            return b""
+        return self._encode(self._resampler.flush())
+
+
+def convert_pcm_params(
+    data: bytes | bytearray | memoryview,
+    in_pcm_params: PcmParams,
+    out_pcm_params: PcmParams = WHISPER_PCM_PARAMS,
+) -> bytes:
+    """Converts a whole piece of audio at once."""
+    converter = PcmConverter(in_pcm_params, out_pcm_params)
+    return converter.convert(data) + converter.flush()
@@ -0,0 +1,190 @@
+"""`VoiceActivityDetector` tells speech from noise in a PCM-encoded stream,
+so that the blocks with no speech in them aren't transcribed (`whisper`
+makes text up for a steady noise).
+
+The audio is cut into `frame_msec` long frames, and a frame is a speech
+candidate if it's:
+- louder than the noise floor by `snr_db` (and than `min_energy_db`), and
+- not noise-like: its spectral flatness (the geometric mean of the power
+spectrum over the arithmetic one) is below `max_flatness`, and its zero
+crossing rate is below `max_zero_crossing_rate`.
+
+The noise floor adapts: it's the `noise_percentile` of the energies of the
+last `noise_window_msec` of frames (a minimum statistics estimate, which
+follows a changing noise without being fooled by the speech pauses).
+
+Speech begins after `min_speech_msec` of candidates in a row (so that the
+clicks are ignored), and lasts for `hangover_msec` after the last ones (so
+that the quiet endings of the words aren't cut off). The decisions are
+kept per block, in a `VoiceActivity`, and made only for the new frames:
+```
+detector = VoiceActivityDetector(pcm_params)
+activity = VoiceActivity(detector.frame_msec)
+detector.update(activity, raw_data)  # the frames not checked yet
+activity.has_speech
+```
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque
+
+import numpy as np
+import numpy.typing as np_typing
+
+from .pcm_params import PcmParams
+
+MSEC_IN_SEC = 1000
+POWER_EPS = 1e-10  # -100 dB
+NO_SPEECH_INDEX = -(2**40)
+
+
+@dataclass
+class VoiceActivity:
+    """The decisions for the frames of a block (from its beginning)."""
+
+    frame_msec: int
+    speech: np_typing.NDArray[np.bool_] = field(
+        default_factory=lambda: np.empty(0, np.bool_)
+    )
+    candidates_run: int = 0  # the speech candidates at the end, in a row
+    frames_since_speech: int | None = None  # `None`: no speech so far
+
+    @property
+    def frames_count(self) -> int:
+        return len(self.speech)
+
+    @property
+    def has_speech(self) -> bool:
+        return bool(self.speech.any())
+
+    def slice(self, start_msec: int, end_msec: int) -> "VoiceActivity":
+        """The decisions for the `[start_msec, end_msec)` span (to go with a
+        block cut out of this one)."""
+        start = start_msec // self.frame_msec
+        end = min(end_msec // self.frame_msec, self.frames_count)
+        activity = VoiceActivity(self.frame_msec, self.speech[start:end])
+        if end == self.frames_count:  # the end of the block is kept
+            activity.candidates_run = self.candidates_run
+            activity.frames_since_speech = self.frames_since_speech
+        return activity
+
+
+class VoiceActivityDetector:
+    def __init__(
+        self,
+        pcm_params: PcmParams,
+        frame_msec: int = 30,
+        snr_db: float = 6.0,
+        min_energy_db: float = -55.0,
+        max_flatness: float = 0.3,
+        max_zero_crossing_rate: float = 0.35,
+        min_speech_msec: int = 90,
+        hangover_msec: int = 300,
+        noise_window_msec: int = 5000,
+        noise_percentile: float = 10.0,
+    ) -> None:
+        self.pcm_params = pcm_params
+        self.frame_msec = frame_msec
+        self.frame_len = pcm_params.frame_rate * frame_msec // MSEC_IN_SEC
+        self.snr_db = snr_db
+        self.min_energy_db = min_energy_db
+        self.max_flatness = max_flatness
+        self.max_zero_crossing_rate = max_zero_crossing_rate
+        self.min_speech_frames = max(1, -(-min_speech_msec // frame_msec))
+        self.hangover_frames = hangover_msec // frame_msec
+        self.noise_percentile = noise_percentile
+        # the energies (dB) of the last frames, for the noise floor
+        self._energies: Deque[float] = deque(
+            maxlen=max(1, noise_window_msec // frame_msec)
+        )
+        self._window = np.hanning(self.frame_len)
+
+    @property
+    def noise_floor_db(self) -> float | None:
+        if not self._energies:
+            return None
+        return float(np.percentile(self._energies, self.noise_percentile))
+
+    def _frames(self, data: bytes | bytearray | memoryview) -> np.ndarray:
+        """The whole frames of the (mono) samples, `(frames, frame_len)`."""
+        sample_width = self.pcm_params.sample_width_bytes
+        channels = self.pcm_params.channels_count
+        frame_size = self.pcm_params.frame_size_bytes()
+        data = memoryview(data)
+        data = data[: len(data) - len(data) % frame_size]
+        samples = np.frombuffer(data, f"<i{sample_width}").astype("f8")
+        samples /= 2 ** (sample_width * 8 - 1)
+        samples = samples.reshape(-1, channels).mean(axis=1)
+        frames_count = len(samples) // self.frame_len
+        return samples[: frames_count * self.frame_len].reshape(
+            frames_count, self.frame_len
+        )
+
+    def features(self, frames: np.ndarray) -> tuple:
+        """The energy (dBFS), spectral flatness and zero crossing rate of
+        every frame."""
+        energy_db = 10 * np.log10(np.mean(frames**2, axis=1) + POWER_EPS)
+        power = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+        power = power[:, 1:] + POWER_EPS  # without DC
+        flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(
+            power, axis=1
+        )
+        signs = np.signbit(frames)
+        zero_crossing_rate = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+        return energy_db, flatness, zero_crossing_rate
+
+    def update(
+        self,
+        activity: VoiceActivity,
+        data: bytes | bytearray | memoryview,
+        learn: bool = True,
+    ) -> VoiceActivity:
+        """Makes the decisions for the frames of the block's `data`, which
+        follow the ones in the `activity`. `learn` - whether the frames
+        update the noise floor (they shouldn't, if they were seen before).
+        """
+        frame_bytes = self.frame_len * self.pcm_params.frame_size_bytes()
+        frames = self._frames(
+            memoryview(data)[activity.frames_count * frame_bytes :]
+        )
+        if len(frames) == 0:
+            return activity
+        energy_db, flatness, zero_crossing_rate = self.features(frames)
+        if learn:
+            self._energies.extend(energy_db.tolist())
+        noise_floor_db = self.noise_floor_db
+        if noise_floor_db is None:
+            noise_floor_db = float(
+                np.percentile(energy_db, self.noise_percentile)
+            )
+
+        candidates = (
+            (energy_db > noise_floor_db + self.snr_db)
+            & (energy_db > self.min_energy_db)
+            & (flatness < self.max_flatness)
+            & (zero_crossing_rate < self.max_zero_crossing_rate)
+        )
+        # the length of the run of candidates every frame ends
+        indices = np.arange(len(candidates))
+        run_starts = np.maximum.accumulate(np.where(candidates, -1, indices))
+        runs = indices - run_starts
+        runs[run_starts == -1] += activity.candidates_run
+        onsets = runs >= self.min_speech_frames
+
+        # the frames within the hangover after the last onset frame
+        last_onsets = np.maximum.accumulate(
+            np.where(onsets, indices, NO_SPEECH_INDEX)
+        )
+        if activity.frames_since_speech is not None:
+            last_onsets = np.maximum(
+                last_onsets, -1 - activity.frames_since_speech
+            )
+        since_onsets = indices - last_onsets
+        speech = since_onsets <= self.hangover_frames
+
+        activity.speech = np.concatenate((activity.speech, speech))
+        activity.candidates_run = int(runs[-1])
+        if onsets.any() or activity.frames_since_speech is not None:
+            activity.frames_since_speech = int(since_onsets[-1])
+        return activity
@@ -4,30 +4,44 @@ from io import BytesIO
 from os import PathLike
 from typing import List
 
+from speech2text.utils.sample_types import SampleBuffer, SampleDType
+
 from .audio_data import IAudioData
 from .pcm_params import WHISPER_PCM_PARAMS, PcmParams
 
 
 @dataclass
 class WavData(IAudioData):
-    """An `IAudioData` implementation for `wave` module driven WAVE data."""
+    """An `IAudioData` implementation for `wave` module driven WAVE data.
+
+    The frames are stored in a `SampleBuffer`, so appending a chunk doesn't
+    copy the frames appended before, and `raw_data` is a view (no copying
+    either)."""
 
     _pcm_params: PcmParams = WHISPER_PCM_PARAMS
-    _data: bytearray = field(default_factory=bytearray)
+    _data: SampleBuffer | bytes | bytearray = field(default_factory=bytearray)
+
+    def __post_init__(self):
+        if not isinstance(self._data, SampleBuffer):
+            self._data = SampleBuffer(SampleDType.BYTES_2, self._data)
 
     @staticmethod
     def load_from_wav_file(wav_file: str | bytes | PathLike) -> "WavData":
         return WavData(*WavData._load_from_wav_file(wav_file))
 
-    def append_chunk(self, chunk: bytes | bytearray) -> None:
-        if isinstance(self._data, bytes):
-            self._data = bytearray(self._data)
+    def append_chunk(self, chunk: bytes | bytearray | memoryview) -> None:
         self._data.extend(chunk)
 
+    def trim_front(self, frames_count: int) -> None:
+        """Drops the first `frames_count` frames."""
+        self._data.trim_front(
+            frames_count * self.pcm_params.frame_size_bytes()
+        )
+
     def save_as_wav_file(self, wav_file: str | bytes | PathLike) -> None:
         with wave.open(wav_file, "wb") as file:
             file.setparams(self.pcm_params.wav_params)
-            file.writeframes(self._data)
+            file.writeframes(self.raw_data)
 
     def create_io_stream(self) -> BytesIO:
         in_memory_wav_file = BytesIO()
@@ -40,15 +54,16 @@ class WavData(IAudioData):
         return self._pcm_params
 
     @property
-    def raw_data(self) -> bytes:
-        return self._data
+    def raw_data(self) -> memoryview:
+        return self._data.view()
 
-    def split_in_chunks(self, chunk_len_sec: float = 0.5) -> List[bytearray]:
+    def split_in_chunks(self, chunk_len_sec: float = 0.5) -> List[memoryview]:
+        """Splits the frames into chunks (views, no copying)."""
         chunk_len_bytes = self.pcm_params.seconds_to_byte_count(chunk_len_sec)
-        data_len = len(self._data)
-        if data_len == 0:
-            return [bytearray()]
+        data = self.raw_data
+        if len(data) == 0:
+            return [data]
         return [
-            self._data[pos : pos + chunk_len_bytes]
-            for pos in range(0, data_len, chunk_len_bytes)
+            data[pos : pos + chunk_len_bytes]
+            for pos in range(0, len(data), chunk_len_bytes)
         ]
@@ -1,5 +1,5 @@
-QUEUE_CHECK_DELAY_SEC = 0.05
 CHUNK_SIZE_SEC = 0.5
+RING_BUFFER_SEC = 10.0  # the chunks a listener keeps for a slow consumer
 
 SILENCE_MIN_LEN_MSEC = 1000
 SILENCE_THRESHOLD_DBFS = -16
@@ -63,6 +63,9 @@ def demo_console_realtime(in_file_path=None):
             print("\033[A\033[0K", end="")  # clear the last line
             for line in wfq.get_finalized_text(flush_blocks=True):
                 print("::", line)
-            print(">>", wfq.get_ongoing_text())
+            if wfq.is_ready:
+                print(">>", wfq.get_ongoing_text())
+            else:
+                print(">> (loading the models...)")
     except KeyboardInterrupt:
         pass
@@ -0,0 +1,69 @@
+"""The real-time factor (the transcription time / the audio duration) of the
+whisper models with every backend (see `transcriber/whisper.py`):
+```
+python -m speech2text.experiments.benchmark_backends [model_name ...]
+```
+
+Every audio sample (the first 30 sec) is transcribed greedily, the way the
+final blocks are. The first run of every model is a warm-up (not counted).
+"""
+
+import sys
+import time
+
+from speech2text.audio_data import WHISPER_PCM_PARAMS, NpData, WavData
+from speech2text.audio_data.resampler import convert_pcm_params
+from speech2text.settings import APP_DIR
+from speech2text.transcriber.whisper import Backend, model_registry, transcribe
+
+AUDIO_SAMPLES_DIR = APP_DIR / "tests" / "audio_samples"
+DEFAULT_MODEL_NAMES = ["tiny.en", "small.en"]
+MAX_DURATION_SEC = 30
+
+
+def load_samples() -> dict[str, NpData]:
+    samples = {}
+    for path in sorted(AUDIO_SAMPLES_DIR.glob("en_*.wav")):
+        wav = WavData.load_from_wav_file(path.as_posix())
+        data = convert_pcm_params(wav.raw_data, wav.pcm_params)
+        max_bytes = WHISPER_PCM_PARAMS.seconds_to_byte_count(MAX_DURATION_SEC)
+        samples[path.name] = NpData.load_from_raw(
+            data[:max_bytes], WHISPER_PCM_PARAMS
+        )
+    return samples
+
+
+def benchmark(model_name: str, backend: Backend, samples: dict) -> None:
+    load_start = time.perf_counter()
+    model_registry.get(model_name, backend)
+    load_time = time.perf_counter() - load_start
+    (info,) = model_registry.loaded()
+    print(
+        f"{model_name} / {backend.value}: loaded in {load_time:.1f} sec, "
+        f"{info.size_bytes / 2**20:.0f} MB"
+    )
+
+    first_sample = next(iter(samples.values()))
+    transcribe(first_sample, model_name, backend, temperature=0.0)
+    total_time = total_duration = 0.0
+    for file_name, sample in samples.items():
+        start = time.perf_counter()
+        text = transcribe(sample, model_name, backend, temperature=0.0)
+        elapsed = time.perf_counter() - start
+        duration = len(sample._data) / WHISPER_PCM_PARAMS.frame_rate
+        total_time += elapsed
+        total_duration += duration
+        print(
+            f"  {file_name}: RTF {elapsed / duration:.3f} "
+            f"| {text['text'].strip()[:60]}"
+        )
+    print(f"  total RTF {total_time / total_duration:.3f}")
+    model_registry.unload(model_name, backend)
+
+
+if __name__ == "__main__":
+    model_names = sys.argv[1:] or DEFAULT_MODEL_NAMES
+    samples = load_samples()
+    for model_name in model_names:
+        for backend in Backend:
+            benchmark(model_name, backend, samples)
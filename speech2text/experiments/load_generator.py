@@ -0,0 +1,178 @@
+"""Replays the audio samples (`tests/audio_samples/en_*.wav`, one after
+another) to the server (`speech2text/server.py`) as several simulated
+streams, and reports the latency of every stream:
+```
+python -m speech2text.server
+python -m speech2text.experiments.load_generator [streams_count]
+```
+
+Every stream sends its audio in real time (a chunk, once it would have
+been recorded). The latency of a text is how long after the audio it
+covers (its `audio_sec`) was sent it came back.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from speech2text.audio_data import WHISPER_PCM_PARAMS, WavData
+from speech2text.audio_data.resampler import convert_pcm_params
+from speech2text.settings import APP_DIR, ServerSettings, app_settings
+
+AUDIO_SAMPLES_DIR = APP_DIR / "tests" / "audio_samples"
+
+
+def load_samples() -> list[tuple[str, bytes]]:
+    """The names of the samples, and their PCM the server takes."""
+    samples = []
+    for path in sorted(AUDIO_SAMPLES_DIR.glob("en_*.wav")):
+        wav = WavData.load_from_wav_file(path.as_posix())
+        samples.append(
+            (path.name, convert_pcm_params(wav.raw_data, wav.pcm_params))
+        )
+    return samples
+
+
+async def _connect(
+    settings: ServerSettings,
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    if settings.unix_socket:
+        return await asyncio.open_unix_connection(settings.unix_socket)
+    return await asyncio.open_connection(settings.host, settings.port)
+
+
+async def _send(
+    writer: asyncio.StreamWriter,
+    data: bytes,
+    chunk_size_sec: float,
+    started_at: float,
+) -> None:
+    chunk_size = WHISPER_PCM_PARAMS.seconds_to_byte_count(chunk_size_sec)
+    for start in range(0, len(data), chunk_size):
+        chunk = data[start : start + chunk_size]
+        end_sec = WHISPER_PCM_PARAMS.frame_count_to_seconds(
+            (start + len(chunk)) // WHISPER_PCM_PARAMS.frame_size_bytes()
+        )
+        # the chunk is sent, when its recording would have ended
+        await asyncio.sleep(max(started_at + end_sec - time.monotonic(), 0))
+        writer.write(chunk)
+        await writer.drain()
+    writer.write_eof()
+
+
+async def replay(
+    settings: ServerSettings,
+    data: bytes,
+    chunk_size_sec: float,
+) -> dict:
+    """Streams the `data`, returns the latencies of the `"ongoing"` and
+    `"final"` texts, and the final lines."""
+    reader, writer = await _connect(settings)
+    started_at = time.monotonic()
+    sending = asyncio.create_task(
+        _send(writer, data, chunk_size_sec, started_at)
+    )
+    report = {"ongoing": [], "final": [], "lines": []}
+    try:
+        async for line in reader:
+            message = json.loads(line)
+            if message["type"] == "error":
+                raise RuntimeError(message["text"])
+            latency = time.monotonic() - started_at - message["audio_sec"]
+            report[message["type"]].append(latency)
+            if message["type"] == "final":
+                report["lines"].append(message["text"])
+        await sending
+    finally:
+        sending.cancel()
+        writer.close()
+    return report
+
+
+def _latencies(latencies: list[float]) -> str:
+    if not latencies:
+        return "-"
+    median, p90 = np.percentile(latencies, [50, 90])
+    return f"{median:.2f} / {p90:.2f} / {max(latencies):.2f}"
+
+
+async def generate_load(
+    settings: ServerSettings,
+    streams_count: int,
+    chunk_size_sec: float,
+    stagger_sec: float,
+) -> None:
+    samples = load_samples()
+    data = b"".join(sample for _, sample in samples)
+    duration_sec = WHISPER_PCM_PARAMS.frame_count_to_seconds(
+        len(data) // WHISPER_PCM_PARAMS.frame_size_bytes()
+    )
+    print(
+        f"{streams_count} streams of {duration_sec:.1f} sec "
+        f"({', '.join(name for name, _ in samples)})"
+    )
+
+    async def start_stream(index: int) -> dict:
+        await asyncio.sleep(index * stagger_sec)
+        return await replay(settings, data, chunk_size_sec)
+
+    reports = await asyncio.gather(
+        *(start_stream(index) for index in range(streams_count)),
+        return_exceptions=True,
+    )
+    print("latency, sec: median / p90 / max")
+    for index, report in enumerate(reports):
+        if isinstance(report, Exception):
+            print(f"  stream {index}: {report!r}")
+            continue
+        text = " ".join(report["lines"]).strip()
+        print(
+            f"  stream {index}: ongoing {_latencies(report['ongoing'])}"
+            f" | final {_latencies(report['final'])}"
+            f" | {len(report['lines'])} lines: {text[:40]}"
+        )
+    reports = [report for report in reports if isinstance(report, dict)]
+    for message_type in ("ongoing", "final"):
+        latencies = [
+            latency for report in reports for latency in report[message_type]
+        ]
+        print(f"  all streams: {message_type} {_latencies(latencies)}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = app_settings.server or ServerSettings()
+    parser = argparse.ArgumentParser(
+        prog=f"python -m {__name__}",
+        description="Streams the audio samples to the server.",
+    )
+    parser.add_argument("streams_count", nargs="?", type=int, default=4)
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument("--unix-socket", default=settings.unix_socket)
+    parser.add_argument(
+        "--chunk-size-sec",
+        type=float,
+        default=app_settings.listener.chunk_size_sec,
+    )
+    parser.add_argument(
+        "--stagger-sec",
+        type=float,
+        default=0.0,
+        help="between the starts of the streams",
+    )
+    args = parser.parse_args(argv)
+    settings = ServerSettings(
+        host=args.host, port=args.port, unix_socket=args.unix_socket
+    )
+    asyncio.run(
+        generate_load(
+            settings, args.streams_count, args.chunk_size_sec, args.stagger_sec
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
-from multiprocessing import Process, Queue
-from typing import Callable, Generator
+from math import ceil
+from multiprocessing import Process
+from typing import AsyncGenerator, Callable, Generator, Tuple
 
 import speech2text.config as cfg
 from speech2text.audio_data import WHISPER_PCM_PARAMS, PcmParams
+from speech2text.utils.ring_buffer import SharedRingBuffer
 from speech2text.utils.tick import Ticker
 
 logger = logging.getLogger(__name__)
@@ -18,11 +21,24 @@ class Listener:
         self._recorder_proc: Callable | None = None
         self._chunks_iterator: Generator | None = None
         self._latency_ratio: float | None = None
+        self._delivery_latency_sec: float | None = None
+        self._overruns = 0
 
     @property
     def latency_ratio(self) -> float:
         return self._latency_ratio or 0.0
 
+    @property
+    def delivery_latency_sec(self) -> float:
+        """How long the last chunk took from the recorder to the consumer."""
+        return self._delivery_latency_sec or 0.0
+
+    @property
+    def overruns(self) -> int:
+        """How many chunks the recorder dropped, because the consumer was
+        behind by the whole ring buffer (`cfg.RING_BUFFER_SEC`)."""
+        return self._overruns
+
     def _get_recorder_proc_kwargs(self):
         raise NotImplementedError
 
@@ -35,16 +51,22 @@ class Listener:
         if self._chunks_iterator:
             self._chunks_iterator.close()
             self._latency_ratio = None
+            self._delivery_latency_sec = None
+            self._overruns = 0
 
     def relaunch_chunks_iterator(self, *args, **kwargs):
         self.close_chunks_iterator()
         return self.get_chunks_iterator(*args, **kwargs)
 
-    def _get_chunks_iterator(self, chunk_size_sec: float = None):
-        audio_chunks_queue = Queue()
-        chunk_size_sec = chunk_size_sec or cfg.CHUNK_SIZE_SEC
+    def _start_recording(
+        self, chunk_size_sec: float
+    ) -> Tuple[Process, SharedRingBuffer]:
+        ring = SharedRingBuffer(
+            slot_size=self.pcm_params.seconds_to_byte_count(chunk_size_sec),
+            slots_count=max(2, ceil(cfg.RING_BUFFER_SEC / chunk_size_sec)),
+        )
         args = (
-            audio_chunks_queue,
+            ring,
             chunk_size_sec,
             self.pcm_params,
         )
@@ -56,20 +78,104 @@ class Listener:
         )
         stream_recorder_proc.start()
         logger.info("Start recording")
+        return stream_recorder_proc, ring
+
+    def _stop_recording(
+        self, stream_recorder_proc: Process, ring: SharedRingBuffer
+    ) -> None:
+        stream_recorder_proc.terminate()
+        stream_recorder_proc.join(5.0)
+        stream_recorder_proc.close()
+        ring.close()
+        logger.info("Stop recording")
+
+    def _receive(self, ring: SharedRingBuffer, sent_at: float) -> None:
+        """Notes the measurements of the chunk, which is just received."""
+        self._delivery_latency_sec = time.monotonic() - sent_at
+        if ring.overruns > self._overruns:
+            logger.warning(
+                f"{ring.overruns - self._overruns} chunks are dropped: the "
+                f"processing is behind by {cfg.RING_BUFFER_SEC} sec"
+            )
+            self._overruns = ring.overruns
+
+    def _tick(self, ticker: Ticker) -> None:
+        """Notes how far behind the recording the consumer is (after it's
+        done with the chunk)."""
+        ticker.tick(wait=False)
+        self._latency_ratio = ticker.latency / ticker.tick_duration_sec
+
+    def _get_chunks_iterator(self, chunk_size_sec: float = None):
+        """Yields the chunks as `memoryview`s of the ring buffer the recorder
+        process writes them to: a chunk is valid until the next one is
+        requested (copy it to keep it longer)."""
+        chunk_size_sec = chunk_size_sec or cfg.CHUNK_SIZE_SEC
+        stream_recorder_proc, ring = self._start_recording(chunk_size_sec)
         try:
             with Ticker(chunk_size_sec) as ticker:
                 while True:
-                    if not audio_chunks_queue.empty():
-                        yield audio_chunks_queue.get()
-                        ticker.tick(wait=False)
-                        self._latency_ratio = ticker.latency / chunk_size_sec
-                    else:
-                        time.sleep(cfg.QUEUE_CHECK_DELAY_SEC)
+                    # checked before waiting: the chunks of a stopped
+                    # recorder are all in the ring already
+                    recording = stream_recorder_proc.is_alive()
+                    # wakes up as soon as a chunk arrives
+                    received = ring.get(timeout=chunk_size_sec)
+                    if received is None:
+                        if recording:
+                            continue
+                        logger.warning("The recorder has stopped")
+                        break
+                    chunk, sent_at = received
+                    self._receive(ring, sent_at)
+                    yield chunk
+                    ring.release()
+                    self._tick(ticker)
         except (KeyboardInterrupt, GeneratorExit):
             pass
         finally:
             self._chunks_iterator = None
-            stream_recorder_proc.terminate()
-            stream_recorder_proc.join(5.0)
-            stream_recorder_proc.close()
-            logger.info("Stop recording")
+            self._stop_recording(stream_recorder_proc, ring)
+
+    async def get_async_chunks_iterator(
+        self, chunk_size_sec: float = None
+    ) -> AsyncGenerator[memoryview, None]:
+        """The same as `get_chunks_iterator`, but the chunks are awaited:
+        the event loop watches the ring buffer, so no thread is blocked
+        while waiting (the loop has to support `add_reader`)."""
+        loop = asyncio.get_running_loop()
+        chunk_size_sec = chunk_size_sec or cfg.CHUNK_SIZE_SEC
+        stream_recorder_proc, ring = self._start_recording(chunk_size_sec)
+        try:
+            with Ticker(chunk_size_sec) as ticker:
+                while True:
+                    recording = stream_recorder_proc.is_alive()
+                    received = ring.get(timeout=0)
+                    if received is None:
+                        if not recording:
+                            logger.warning("The recorder has stopped")
+                            break
+                        await _wait_readable(loop, ring, chunk_size_sec)
+                        continue
+                    chunk, sent_at = received
+                    self._receive(ring, sent_at)
+                    yield chunk
+                    ring.release()
+                    self._tick(ticker)
+        finally:
+            self._stop_recording(stream_recorder_proc, ring)
+
+
+async def _wait_readable(
+    loop: asyncio.AbstractEventLoop, ring: SharedRingBuffer, timeout: float
+) -> None:
+    """Waits (up to the `timeout`) for the next chunk in the ring."""
+    readable = loop.create_future()
+    loop.add_reader(
+        ring.fileno(),
+        lambda: readable.done() or readable.set_result(None),
+    )
+    try:
+        await asyncio.wait_for(readable, timeout)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        loop.remove_reader(ring.fileno())
@@ -1,9 +1,8 @@
-from multiprocessing import Queue
-
 import pyaudio as pa
 
 import speech2text.config as cfg
 from speech2text.audio_data import PcmParams
+from speech2text.utils.ring_buffer import SharedRingBuffer
 
 from .listener import Listener
 
@@ -27,7 +26,7 @@ class PyAudioWrapper(pa.PyAudio):
 
 
 def _mic_recorder_proc(
-    queue: Queue,
+    ring: SharedRingBuffer,
     chunk_size_sec: float,
     pcm_params: PcmParams,
     *,
@@ -48,7 +47,7 @@ def _mic_recorder_proc(
         try:
             while True:
                 chunk = stream.read(num_frames=chunk_size_frames)
-                queue.put(chunk)
+                ring.put(chunk)
         except KeyboardInterrupt:
             pass
         finally:
@@ -1,66 +1,56 @@
-from multiprocessing import Queue
 from typing import Generator
 
-from pydub import AudioSegment
-
 import speech2text.config as cfg
-from speech2text.audio_data import PcmParams
+from speech2text.audio_data import PcmConverter, PcmParams, WavData
 from speech2text.utils import Ticker
+from speech2text.utils.ring_buffer import SharedRingBuffer
 
 from .listener import Listener
 
-MSEC_IN_SEC = 1000
+
+def _read_converted_chunks(
+    path_to_wave_file: str,
+    chunk_size_sec: float,
+    pcm_params: PcmParams,
+) -> Generator[bytes, None, None]:
+    """Reads the file and converts it to `pcm_params` chunk by chunk. All the
+    chunks are `chunk_size_sec` long (the last one is padded with silence).
+    """
+    wav_data = WavData.load_from_wav_file(path_to_wave_file)
+    converter = PcmConverter(wav_data.pcm_params, pcm_params)
+    chunk_size_bytes = pcm_params.seconds_to_byte_count(chunk_size_sec)
+    buffer = bytearray()
+    for chunk in wav_data.split_in_chunks(chunk_size_sec):
+        buffer.extend(converter.convert(chunk))
+        while len(buffer) >= chunk_size_bytes:
+            yield bytes(buffer[:chunk_size_bytes])
+            del buffer[:chunk_size_bytes]
+    buffer.extend(converter.flush())
+    while len(buffer) > 0:
+        buffer.extend(bytes(max(0, chunk_size_bytes - len(buffer))))
+        yield bytes(buffer[:chunk_size_bytes])
+        del buffer[:chunk_size_bytes]
 
 
 def _wav_recorder_proc(
-    queue: Queue,
+    ring: SharedRingBuffer,
     chunk_size_sec: float,
     pcm_params: PcmParams,
     *,
     path_to_wave_file: str,
 ) -> Generator:
-    chunk_size_frames = pcm_params.seconds_to_frame_count(chunk_size_sec)
-
-    wav_file: AudioSegment = (
-        AudioSegment.from_wav(path_to_wave_file)
-        .set_channels(pcm_params.channels_count)
-        .set_frame_rate(pcm_params.frame_rate)
-    )
-    samples = wav_file.get_array_of_samples()
-    position = 0
-    audio_is_playing = True
+    silence = bytes(pcm_params.seconds_to_byte_count(chunk_size_sec))
     try:
         with Ticker(chunk_size_sec) as ticker:
-            while audio_is_playing:
-                chunk = samples[position : position + chunk_size_frames]
-                position += chunk_size_frames
-                if len(chunk) < chunk_size_frames:
-                    audio_is_playing = False
-                    added_silence_frames = chunk_size_frames - len(chunk)
-                    added_silence_sec = (
-                        added_silence_frames / chunk_size_frames
-                    ) * chunk_size_sec
-                    added_silence_msec = int(MSEC_IN_SEC * added_silence_sec)
-                    silence_samples = AudioSegment.silent(
-                        added_silence_msec,
-                        pcm_params.frame_rate,
-                    ).get_array_of_samples()
-                    chunk.extend(silence_samples)
-                # see https://docs.python.org/3/library/array.html
-                chunk = chunk.tobytes()
+            for chunk in _read_converted_chunks(
+                path_to_wave_file, chunk_size_sec, pcm_params
+            ):
                 ticker.tick()
-                queue.put(chunk)
-
-            silence_samples = AudioSegment.silent(
-                chunk_size_sec * MSEC_IN_SEC,
-                pcm_params.frame_rate,
-            ).get_array_of_samples()
+                ring.put(chunk)
 
             while True:
-                chunk = silence_samples[:]
-                chunk = chunk.tobytes()
                 ticker.tick()
-                queue.put(chunk)
+                ring.put(silence)
     except KeyboardInterrupt:
         pass
 
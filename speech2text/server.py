@@ -0,0 +1,207 @@
+"""A server, which transcribes many audio streams at once with a single set
+of the whisper models (every stream has an `AsyncWorkflow`, so a `State`
+of its own):
+```
+python -m speech2text.server  # see `server` in config.yaml
+python -m speech2text.experiments.load_generator 8  # 8 streams
+```
+
+The protocol (TCP, or a Unix socket):
+- a client sends raw PCM (`WHISPER_PCM_PARAMS`: 16 kHz, 16 bit, mono), and
+shuts down the writing at the end of the stream
+- the server sends the text back as JSON lines: `{"type": "ongoing" |
+"final", "text": ..., "audio_sec": ...}` (`audio_sec` is how much audio
+was processed, when the text came out); the connection is closed after
+the last final line
+- a stream above `server.max_streams` gets `{"type": "error", ...}`
+
+The streams are processed in threads of their own (a chunk of
+`listener.chunk_size_sec` at a time), so the ongoing blocks of different
+streams come to the decoder at about the same time, and are decoded
+together (see `batching` in the settings of the ongoing transcription;
+only the blocks with the same prompt are, so `local_agreement`, which
+prompts every block with its committed words, should be off).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from speech2text.audio_data import WHISPER_PCM_PARAMS
+from speech2text.settings import ServerSettings, app_settings
+from speech2text.transcriber import AsyncWorkflow
+from speech2text.transcriber.strategy import DEFAULT_STRATEGY, IStrategy
+from speech2text.transcriber.whisper import decode_batcher
+from speech2text.utils import Ticker
+
+logger = logging.getLogger(__name__)
+
+
+class _Stream:
+    def __init__(
+        self, workflow: AsyncWorkflow, writer: asyncio.StreamWriter
+    ) -> None:
+        self.workflow = workflow
+        self.writer = writer
+        self.audio_sec = 0.0  # processed
+
+    async def send(self, message_type: str, text: str) -> None:
+        message = {"type": message_type, "text": text}
+        message["audio_sec"] = round(self.audio_sec, 3)
+        self.writer.write(json.dumps(message).encode() + b"\n")
+        await self.writer.drain()
+
+    async def send_finalized(self) -> None:
+        async for line in self.workflow.finalized_lines():
+            await self.send("final", line)
+
+    async def send_ongoing(self) -> None:
+        async for text in self.workflow.ongoing_texts():
+            await self.send("ongoing", text)
+
+
+class TranscriptionServer:
+    def __init__(
+        self,
+        settings: ServerSettings | None = None,
+        strategy: IStrategy = DEFAULT_STRATEGY,
+    ) -> None:
+        self.settings = settings or app_settings.server or ServerSettings()
+        self.strategy = strategy
+        # a thread per stream: their decodes can meet in `decode_batcher`
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.settings.max_streams,
+            thread_name_prefix="stream",
+        )
+        self.streams_count = 0
+
+    async def start(self) -> asyncio.AbstractServer:
+        if self.settings.unix_socket:
+            return await asyncio.start_unix_server(
+                self._serve, path=self.settings.unix_socket
+            )
+        return await asyncio.start_server(
+            self._serve, self.settings.host, self.settings.port
+        )
+
+    async def _serve(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        if self.streams_count >= self.settings.max_streams:
+            message = {"type": "error", "text": "Too many streams"}
+            writer.write(json.dumps(message).encode() + b"\n")
+            await self._close(writer)
+            return
+        self.streams_count += 1
+        decode_batcher.add_stream()
+        try:
+            await self._transcribe(reader, writer)
+        except ConnectionError as error:
+            logger.warning(f"The stream is broken: {error!r}")
+        finally:
+            decode_batcher.remove_stream()
+            self.streams_count -= 1
+            await self._close(writer)
+        logger.info(
+            f"A stream is done ({self.streams_count} left), the decodes "
+            f"are batched by {decode_batcher.mean_batch_size:.2f} on average"
+        )
+
+    async def _transcribe(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        workflow = AsyncWorkflow(
+            strategy=self.strategy,
+            input_pcm_params=WHISPER_PCM_PARAMS,
+            executor=self._executor,
+        )
+        stream = _Stream(workflow, writer)
+        sending = [
+            asyncio.create_task(stream.send_finalized()),
+            asyncio.create_task(stream.send_ongoing()),
+        ]
+        chunk_size_sec = app_settings.listener.chunk_size_sec
+        chunk_size = WHISPER_PCM_PARAMS.seconds_to_byte_count(chunk_size_sec)
+        frame_size = WHISPER_PCM_PARAMS.frame_size_bytes()
+        latency_ratio = 0.0
+        try:
+            with Ticker(chunk_size_sec) as ticker:
+                while True:
+                    try:
+                        chunk = await reader.readexactly(chunk_size)
+                    except asyncio.IncompleteReadError as error:
+                        chunk = error.partial
+                        chunk = chunk[: len(chunk) - len(chunk) % frame_size]
+                    if chunk:
+                        await workflow.process_chunk(chunk, latency_ratio)
+                        stream.audio_sec += (
+                            WHISPER_PCM_PARAMS.frame_count_to_seconds(
+                                len(chunk) // frame_size
+                            )
+                        )
+                    if len(chunk) < chunk_size:
+                        break  # the end of the stream
+                    # how far behind the audio (sent in real time) it is
+                    ticker.tick(wait=False)
+                    latency_ratio = ticker.latency / ticker.tick_duration_sec
+            await workflow.close()
+            await asyncio.gather(*sending)
+        finally:
+            for task in sending:
+                task.cancel()
+            await workflow.close()
+
+    @staticmethod
+    async def _close(writer: asyncio.StreamWriter) -> None:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+async def serve(settings: ServerSettings | None = None) -> None:
+    server = TranscriptionServer(settings)
+    async with await server.start() as listening:
+        for socket in listening.sockets:
+            logger.info(f"Listening on {socket.getsockname()}")
+        await listening.serve_forever()
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = app_settings.server or ServerSettings()
+    parser = argparse.ArgumentParser(
+        prog="python -m speech2text.server",
+        description="Transcribes the PCM streams sent to it.",
+    )
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument(
+        "--unix-socket",
+        default=settings.unix_socket,
+        help="replaces --host and --port",
+    )
+    parser.add_argument(
+        "--max-streams", type=int, default=settings.max_streams
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s \t|\t%(message)s",
+    )
+    settings = ServerSettings(
+        host=args.host,
+        port=args.port,
+        unix_socket=args.unix_socket,
+        max_streams=args.max_streams,
+    )
+    try:
+        asyncio.run(serve(settings))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
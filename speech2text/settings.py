@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Tuple
+from typing import Literal, Tuple
 
 import annotated_types
 import yaml
@@ -44,6 +44,7 @@ class PyDubSettings(BaseModel):
     volume_up: PositiveFloat | None = None
     speed_up: Ge1Float | None = None
     normalize: bool = False
+    engine: Literal["pydub", "numpy"] = "pydub"  # "numpy" — see `NpData`
 
     @root_validator(pre=True)
     def validate_date(cls, values):
@@ -79,6 +80,7 @@ class NoisereduceSettings(BaseModel):
 
 class WhisperSettings(BaseModel):
     model_name: str
+    backend: Literal["default", "cpu_int8"] = "default"  # see whisper.py
     temperature: PositiveNormFloat | Tuple[PositiveNormFloat, ...] = (
         0,
         0.2,
@@ -123,37 +125,189 @@ class SplitStageSettings(BaseModel):
     pydub_split_on_silence: SplitOnSilence
 
 
+class VadSettings(BaseModel):
+    """See `audio_data/vad.py`."""
+
+    frame_msec: PositiveInt = 30
+    snr_db: PositiveFloat = 6.0  # above the noise floor
+    min_energy_db: float = -55.0  # dBFS
+    max_flatness: PositiveNormFloat = 0.3
+    max_zero_crossing_rate: PositiveNormFloat = 0.35
+    min_speech_msec: PositiveInt = 90
+    hangover_msec: PositiveInt = 300
+    noise_window_msec: PositiveInt = 5000
+    noise_percentile: Annotated[
+        float, annotated_types.Ge(0.0), annotated_types.Le(100.0)
+    ] = 10.0
+
+
+class DetectStageSettings(BaseModel):
+    vad: VadSettings
+
+
+class NoiseProfileSettings(BaseModel):
+    """The noise of the stream is learned from the silence, which the split
+    stage cuts off (see `transcriber/noisereduce.py`)."""
+
+    n_fft: Annotated[
+        int, annotated_types.Ge(64), annotated_types.MultipleOf(4)
+    ] = 1024
+    memory_sec: PositiveFloat = 30.0  # the older noise is forgotten
+    min_noise_msec: PositiveInt = 500  # before it, no `spectral_gate`
+
+
+class SpectralGateSettings(BaseModel):
+    """The stationary spectral gating against the noise profile (instead
+    of `noisereduce`, once the profile is ready)."""
+
+    n_std_thresh: PositiveFloat = 1.5
+    prop_decrease: PositiveNormFloat = 0.95
+    freq_mask_smooth_hz: PositiveInt = 500
+    time_mask_smooth_ms: PositiveInt = 50
+
+
 class RefineStageSettings(BaseModel):
     class SubSection(BaseModel):
         pydub: PyDubSettings | None
         noisereduce: NoisereduceSettings | None
+        spectral_gate: SpectralGateSettings | None = None
+
+        @root_validator(skip_on_failure=True)
+        def validate_spectral_gate(cls, values):
+            pydub = values["pydub"]
+            if (
+                values["spectral_gate"] is not None
+                and pydub is not None
+                and pydub.engine == "pydub"
+            ):
+                raise ValueError(
+                    "`spectral_gate` requires the `numpy` engine of `pydub` "
+                    "(the noise profile is learned without the effects)"
+                )
+            return values
 
     ongoing: SubSection
     final: SubSection
+    noise_profile: NoiseProfileSettings | None = None
+    # the processes refining the blocks split off at once (0: no pool)
+    workers: Annotated[int, annotated_types.Ge(0)] = 0
+
+
+class SkipUnchangedSettings(BaseModel):
+    """Transcribing the ongoing block is skipped (the previous text is kept)
+    if the speech in it hasn't changed: the speech is the span between the
+    first and the last `window_msec` long window louder than
+    `silence_thresh` (dBFS)."""
+
+    window_msec: PositiveInt = 100
+    silence_thresh: int = -35
+    seek_step: PositiveInt = 10
+
+
+class LatencyBudgetSettings(BaseModel):
+    """Bounds the decoding of the ongoing block: the amount of tokens (by
+    the block's duration), the wall-clock time (from the chunk's arrival),
+    and the temperature fallback (not done, if the transcription lags)."""
+
+    tokens_per_sec: PositiveFloat = 8.0
+    min_tokens: PositiveInt = 8
+    deadline_ratio: PositiveFloat = 0.8  # of `listener.chunk_size_sec`
+    max_latency_ratio: PositiveFloat = 1.0  # only the 1st temperature above
+
+
+class DecodeBatchingSettings(BaseModel):
+    """The ongoing blocks of several streams, which come to the decoder
+    within `window_msec` of each other, are decoded together (up to
+    `max_batch_size`, see `DecodeBatcher` in `transcriber/whisper.py`)."""
+
+    window_msec: PositiveInt = 30
+    max_batch_size: PositiveInt = 8
+
+
+class ServerSettings(BaseModel):
+    """See `speech2text/server.py`."""
+
+    host: str = "127.0.0.1"
+    port: Annotated[int, annotated_types.Ge(0), annotated_types.Le(65535)] = (
+        8765
+    )
+    unix_socket: str | None = None  # replaces `host` and `port`
+    max_streams: PositiveInt = 8  # the ones above are refused
+
+
+class LocalAgreementSettings(BaseModel):
+    """The words, which begin `hypotheses_count` transcriptions of the
+    ongoing block in a row in the same way, are committed: only the audio
+    after them is transcribed further (see `transcriber/agreement.py`)."""
+
+    hypotheses_count: Annotated[int, annotated_types.Ge(2)] = 2
 
 
 class TranscribeStageSettings(BaseModel):
     class SubSection(BaseModel):
         whisper: WhisperSettings
+        skip_unchanged: SkipUnchangedSettings | None = None
 
-    ongoing: SubSection
-    final: SubSection
+    class OngoingSubSection(SubSection):
+        mel_cache: bool = False  # keep the block's log-mel spectrogram
+        latency_budget: LatencyBudgetSettings | None = None
+        local_agreement: LocalAgreementSettings | None = None
+        batching: DecodeBatchingSettings | None = None  # across streams
+
+    class FinalSubSection(SubSection):
+        background: bool = False  # transcribe in a background thread
+        batch_size: PositiveInt = 1  # blocks decoded together (see whisper.py)
+
+    ongoing: OngoingSubSection
+    final: FinalSubSection
 
 
 class AllStageSettings(BaseModel):
     increment: IncrementStageSettings | None
     adjust: AdjustStageSettings
     split: SplitStageSettings
+    detect: DetectStageSettings | None = None  # `None`: no voice detection
     refine: RefineStageSettings
     transcribe: TranscribeStageSettings
 
 
+class ModelsSettings(BaseModel):
+    # the least recently used models are unloaded to fit (`None`: no limit)
+    memory_budget_mb: PositiveInt | None = None
+    torch_threads: PositiveInt | None = None  # intra-op (`None`: torch's)
+    torch_interop_threads: PositiveInt | None = None
+    # see `transcriber/weights_cache.py` (`None`: not used)
+    weights_cache_dir: str | None = None
+    weights_cache_dtype: Literal["float32", "float16"] = "float32"
+
+
+class QualityControlSettings(BaseModel):
+    """See `transcriber/controller.py`."""
+
+    window_chunks: PositiveInt = 8
+    step_down_ratio: PositiveFloat = 1.0
+    step_up_ratio: PositiveFloat = 0.5
+    cooldown_chunks: PositiveInt = 4
+    max_level: Annotated[int, annotated_types.Ge(0), annotated_types.Le(3)] = 3
+
+    @root_validator(skip_on_failure=True)
+    def validate_hysteresis(cls, values):
+        if values["step_up_ratio"] >= values["step_down_ratio"]:
+            raise ValueError(
+                "`step_up_ratio` must be less than `step_down_ratio`"
+            )
+        return values
+
+
 class Settings(BaseSettings):
     class StagesSubSection(BaseModel):
+        models: ModelsSettings = ModelsSettings()
+        quality_control: QualityControlSettings | None = None
         stages: AllStageSettings
 
     listener: ListenerSettings | None
     transcriber: StagesSubSection | None
+    server: ServerSettings | None = None
 
 
 APP_DIR = Path(__file__).parent.parent
@@ -1,3 +1,4 @@
+from .async_workflow import AsyncWorkflow
 from .workflow import Workflow
 
-__all__ = ["Workflow"]
+__all__ = ["AsyncWorkflow", "Workflow"]
@@ -0,0 +1,84 @@
+"""`LocalAgreement` bounds the transcription of a growing ongoing block by
+the part of it, which is still uncertain.
+
+Every transcription of the block (a hypothesis) comes with the timestamps
+of its words. The words, which begin the last `hypotheses_count`
+hypotheses in the same way, are committed: they are not transcribed
+anymore, their audio is dropped from the window being transcribed, and
+their text becomes the prompt for the rest of the block:
+```
+agreement = LocalAgreement(hypotheses_count=2)
+agreement.insert(words)  # the words of the window, from the block's start
+agreement.window_start  # the samples of the block not transcribed anymore
+agreement.text  # the committed text + the rest of the last hypothesis
+```
+"""
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List
+
+from whisper.audio import HOP_LENGTH, SAMPLE_RATE
+
+
+@dataclass
+class Word:
+    text: str  # as `whisper` gives it (with the leading space)
+    start: float  # sec, from the start of the block
+    end: float
+
+    def agrees_with(self, other: "Word") -> bool:
+        return self.text.strip() == other.text.strip()
+
+
+@dataclass
+class LocalAgreement:
+    hypotheses_count: int = 2
+    committed: List[Word] = field(default_factory=list)
+    # the uncommitted words of the last hypotheses (the last one at the end)
+    hypotheses: Deque[List[Word]] = field(default_factory=deque)
+    window_start: int = 0  # samples (16 kHz), a multiple of `HOP_LENGTH`
+
+    @property
+    def committed_text(self) -> str:
+        return "".join(word.text for word in self.committed)
+
+    @property
+    def text(self) -> str:
+        tail = self.hypotheses[-1] if self.hypotheses else []
+        return self.committed_text + "".join(word.text for word in tail)
+
+    @property
+    def window_start_sec(self) -> float:
+        return self.window_start / SAMPLE_RATE
+
+    def insert(self, words: List[Word]) -> List[Word]:
+        """Takes the words of a new hypothesis of the window, returns the
+        ones, which got committed (and moves the window past them)."""
+        self.hypotheses.append(list(words))
+        while len(self.hypotheses) > self.hypotheses_count:
+            self.hypotheses.popleft()
+        if len(self.hypotheses) < self.hypotheses_count:
+            return []
+
+        agreed = 0
+        for position, word in enumerate(words):
+            if not all(
+                position < len(hypothesis)
+                and hypothesis[position].agrees_with(word)
+                for hypothesis in self.hypotheses
+            ):
+                break
+            agreed = position + 1
+        if agreed == 0:
+            return []
+
+        newly_committed = words[:agreed]
+        self.committed.extend(newly_committed)
+        for hypothesis in self.hypotheses:
+            del hypothesis[:agreed]
+        end_sample = round(newly_committed[-1].end * SAMPLE_RATE)
+        self.window_start = max(
+            self.window_start, end_sample // HOP_LENGTH * HOP_LENGTH
+        )
+        return newly_committed
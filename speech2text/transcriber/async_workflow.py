@@ -0,0 +1,158 @@
+"""`AsyncWorkflow` is a `Workflow` for asyncio: a single event loop can
+serve many streams, an `AsyncWorkflow` each.
+
+The chunks are processed in an executor (the loop's default one, unless
+another is given), one at a time per workflow, so the loop isn't blocked
+by the transcription. The text comes out as async streams:
+```
+workflow = AsyncWorkflow()
+async for chunk in listener.get_async_chunks_iterator():
+    await workflow.process_chunk(chunk, listener.latency_ratio)
+await workflow.close()  # publishes the last lines, ends the streams
+
+# in other tasks:
+async for line in workflow.finalized_lines():
+    ...
+async for text in workflow.ongoing_texts():  # whenever it changes
+    ...
+```
+The finalized lines are published as soon as their blocks are transcribed
+(in the background too), not only after the next chunk.
+"""
+
+import asyncio
+from concurrent.futures import Executor, Future
+from functools import partial
+from typing import AsyncIterator, Set
+
+from speech2text.audio_data import WHISPER_PCM_PARAMS, PcmParams
+
+from .strategy import DEFAULT_STRATEGY, IStrategy
+from .workflow import Workflow
+
+
+class AsyncWorkflow:
+    def __init__(
+        self,
+        *,
+        strategy: IStrategy = DEFAULT_STRATEGY,
+        input_pcm_params: PcmParams = WHISPER_PCM_PARAMS,
+        executor: Executor | None = None,
+    ) -> None:
+        self.workflow = Workflow(
+            strategy=strategy, input_pcm_params=input_pcm_params
+        )
+        self._executor = executor
+        # the chunks are processed in order, and the text isn't collected
+        # while a chunk is being processed
+        self._lock = asyncio.Lock()
+        self._finalized: asyncio.Queue[str | None] = asyncio.Queue()
+        self._ongoing_text = ""
+        self._ongoing_changed = asyncio.Event()
+        self._watched: Set[Future] = set()  # the blocks being finalized
+        self._tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+    @property
+    def is_ready(self) -> bool:
+        return self.workflow.is_ready
+
+    async def wait_until_ready(self) -> None:
+        """Raises the exception, if the loading of the models failed."""
+        await asyncio.wrap_future(self.workflow.ready)
+
+    async def process_chunk(
+        self,
+        chunk: bytes | bytearray | memoryview,
+        latency_ratio: float = 0.0,
+    ) -> None:
+        """A `memoryview` chunk is copied first (its buffer can be reused,
+        while the chunk waits for the executor)."""
+        if self._closed:
+            raise RuntimeError("The workflow is closed")
+        if isinstance(chunk, memoryview):
+            chunk = bytes(chunk)
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            await loop.run_in_executor(
+                self._executor,
+                self.workflow.process_chunk,
+                chunk,
+                latency_ratio,
+            )
+            self._publish(loop)
+
+    def _publish(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Publishes the new text, and watches the new blocks being
+        finalized (with the lock held)."""
+        for line in self.workflow.get_finalized_text(flush_blocks=True):
+            self._finalized.put_nowait(line)
+        ongoing_text = self.workflow.get_ongoing_text()
+        if ongoing_text != self._ongoing_text:
+            self._ongoing_text = ongoing_text
+            self._ongoing_changed.set()
+        for future in self.workflow.state.finalizing:
+            if future not in self._watched:
+                self._watched.add(future)
+                future.add_done_callback(partial(self._on_finalized, loop))
+
+    def _on_finalized(
+        self, loop: asyncio.AbstractEventLoop, future: Future
+    ) -> None:
+        """Called by the thread, which has finalized the blocks."""
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self._collect_finalized, future)
+
+    def _collect_finalized(self, future: Future) -> None:
+        self._watched.discard(future)
+        if self._closed:
+            return  # `close` collects the rest
+        task = asyncio.get_running_loop().create_task(self._collect())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _collect(self) -> None:
+        async with self._lock:
+            self._publish(asyncio.get_running_loop())
+
+    async def close(self) -> None:
+        """Waits for the blocks being finalized, publishes their lines, and
+        ends the text streams."""
+        if self._closed:
+            return
+        self._closed = True
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            lines = await loop.run_in_executor(
+                self._executor,
+                partial(
+                    self.workflow.get_finalized_text,
+                    flush_blocks=True,
+                    wait=True,
+                ),
+            )
+        for line in lines:
+            self._finalized.put_nowait(line)
+        self._finalized.put_nowait(None)  # the end of the stream
+        self._ongoing_changed.set()
+
+    async def finalized_lines(self) -> AsyncIterator[str]:
+        """The finalized lines in order, until `close` (for one consumer)."""
+        while True:
+            line = await self._finalized.get()
+            if line is None:
+                return
+            yield line
+
+    async def ongoing_texts(self) -> AsyncIterator[str]:
+        """The ongoing text, whenever it changes, until `close` (a consumer,
+        which is behind, gets only the latest one)."""
+        text = None
+        while True:
+            await self._ongoing_changed.wait()
+            self._ongoing_changed.clear()
+            if self._ongoing_text != text:
+                text = self._ongoing_text
+                yield text
+            if self._closed:
+                return
@@ -0,0 +1,89 @@
+"""`QualityController` keeps the transcription real-time on an overloaded
+host: when the processing falls behind, the ongoing block is processed
+with a lower quality, and when there's headroom again, the quality goes
+back up.
+
+The pressure of a chunk is the bigger of:
+- the `latency_ratio` (how many chunks behind the listener the processing
+is), and
+- the load (how long the chunk took to process, relative to its duration).
+
+The controller averages the pressure over a moving window of chunks. The
+level is stepped down if the average exceeds `step_down_ratio`, and up if
+it's below `step_up_ratio`. After every step the window starts over, and
+the next step is possible only `cooldown_chunks` later (the hysteresis).
+
+Only the ongoing block is affected: the final blocks are transcribed in
+full quality anyway.
+"""
+
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Deque
+
+from speech2text.settings import QualityControlSettings, app_settings
+
+logger = logging.getLogger(__name__)
+
+
+class QualityLevel(IntEnum):
+    FULL = 0
+    LIGHT_REFINE = 1  # no noise reduction and normalize for the ongoing block
+    SMALLER_MODEL = 2  # + a smaller whisper model for the ongoing block
+    SKIP_CHUNKS = 3  # + the ongoing block is transcribed every other chunk
+
+
+@dataclass
+class QualityController:
+    level: QualityLevel = QualityLevel.FULL
+    chunks_count: int = 0
+    _pressure: Deque[float] = field(default_factory=deque)
+    _chunks_since_step: int = 0
+
+    @staticmethod
+    def settings() -> QualityControlSettings | None:
+        return app_settings.transcriber.quality_control
+
+    def observe(
+        self, latency_ratio: float, processing_sec: float, chunk_sec: float
+    ) -> QualityLevel:
+        """Takes the measurements of the last chunk, returns the level for
+        the next one."""
+        self.chunks_count += 1
+        settings = self.settings()
+        if settings is None:
+            return self.level
+
+        load = processing_sec / chunk_sec if chunk_sec > 0 else 0.0
+        self._pressure.append(max(latency_ratio, load))
+        while len(self._pressure) > settings.window_chunks:
+            self._pressure.popleft()
+        self._chunks_since_step += 1
+        if (
+            self._chunks_since_step < settings.cooldown_chunks
+            or len(self._pressure) < settings.window_chunks
+        ):
+            return self.level
+
+        pressure = sum(self._pressure) / len(self._pressure)
+        level = self.level
+        if pressure > settings.step_down_ratio:
+            level = QualityLevel(min(level + 1, settings.max_level))
+        elif pressure < settings.step_up_ratio:
+            level = QualityLevel(max(level - 1, QualityLevel.FULL))
+        if level != self.level:
+            logger.info(
+                f"Quality level: {self.level.name} -> {level.name} "
+                f"(average pressure {pressure:.2f})"
+            )
+            self.level = level
+            self._pressure.clear()
+            self._chunks_since_step = 0
+        return self.level
+
+    def should_transcribe_ongoing(self) -> bool:
+        if self.level < QualityLevel.SKIP_CHUNKS:
+            return True
+        return self.chunks_count % 2 == 0
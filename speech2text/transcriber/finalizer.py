@@ -0,0 +1,28 @@
+"""Final transcriptions can be done in the background, so that a burst of
+splits doesn't stall the processing of the ongoing block.
+
+Both functions return a `Future` of the transcribed `Block`s. The futures
+are kept in `State.finalizing` in the order the blocks were split off, and
+`State.collect_finalized` moves the finished ones to `State.finalized`
+(only from the head of the queue, so the order is kept).
+
+All the background transcriptions go through a single worker thread (the
+whisper models are shared between the workflows).
+"""
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+
+from .state import Block
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finalizer")
+
+
+def finalize_in_background(finalize: Callable[[], List[Block]]) -> Future:
+    return _executor.submit(finalize)
+
+
+def finalize_now(finalize: Callable[[], List[Block]]) -> Future:
+    future = Future()
+    future.set_result(finalize())
+    return future
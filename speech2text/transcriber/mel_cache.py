@@ -0,0 +1,140 @@
+"""`MelCache` keeps the log-mel spectrogram of a growing audio block, so
+that the ongoing block doesn't get its whole spectrogram recomputed by
+`whisper` every time it's transcribed.
+
+The spectrogram is the same `whisper.transcribe` computes: an STFT with
+`N_FFT`-long (Hann) windows every `HOP_LENGTH` samples, centered (the
+beginning of the audio is reflected), and the audio followed by silence.
+Every STFT frame depends only on `N_FFT` samples around it, so when the
+audio changes, only the frames touching the changed samples (and the few
+last ones, which touched the silence after the old end) are recomputed:
+```
+cache = MelCache(n_mels=80)
+cache.update(samples)  # the STFT of the new (or changed) samples only
+mel = cache.mel()  # (n_mels, N_FRAMES), ready for `model.decode`
+```
+
+The dynamic range compression (which depends on the loudest frame) is
+applied by `mel`, the cache itself keeps the plain `log10` values.
+"""
+
+import numpy as np
+import numpy.typing as np_typing
+import torch
+from whisper.audio import HOP_LENGTH, N_FFT, N_FRAMES, N_SAMPLES, mel_filters
+
+SILENCE_LOG_SPEC = -10.0  # `log10` of the clamped silence
+
+
+class MelCache:
+    def __init__(self, n_mels: int) -> None:
+        self.n_mels = n_mels
+        self._samples: np_typing.NDArray[np.float32] = np.empty(0, "f4")
+        # `_log_spec[:, i]` is the frame, centered at the sample
+        # `i * HOP_LENGTH`; the frames touching the samples are kept
+        self._log_spec: torch.Tensor = torch.empty(n_mels, 0)
+        self._clean_frames: int = 0  # the frames, which are known to be valid
+        self._window = torch.hann_window(N_FFT)
+
+    @property
+    def samples_count(self) -> int:
+        return len(self._samples)
+
+    @staticmethod
+    def _frames_touching(samples_count: int) -> int:
+        # the frame `i` covers `[i * HOP_LENGTH - N_FFT // 2, ... + N_FFT)`
+        if samples_count == 0:
+            return 0
+        return -(-(samples_count + N_FFT // 2) // HOP_LENGTH)
+
+    @staticmethod
+    def _first_frame_reading(sample: int) -> int:
+        """The first frame, which reads the `sample` (or later ones)."""
+        return max(0, (sample - N_FFT // 2) // HOP_LENGTH + 1)
+
+    def _compute(self, start_frame: int, end_frame: int) -> torch.Tensor:
+        """The `log10` mel frames `[start_frame, end_frame)`."""
+        half_fft = N_FFT // 2
+        start = start_frame * HOP_LENGTH - half_fft
+        end = (end_frame - 1) * HOP_LENGTH + half_fft
+        # `whisper` pads the audio with silence first, then reflects it
+        positions = np.arange(start, end)
+        reflected = np.abs(positions)
+        inside = reflected < len(self._samples)
+        audio = np.zeros(len(positions), "f4")
+        audio[inside] = self._samples[reflected[inside]]
+
+        stft = torch.stft(
+            torch.from_numpy(audio),
+            N_FFT,
+            HOP_LENGTH,
+            window=self._window,
+            center=False,
+            return_complex=True,
+        )
+        magnitudes = stft.abs() ** 2
+        mel_spec = mel_filters(magnitudes.device, self.n_mels) @ magnitudes
+        return torch.clamp(mel_spec, min=1e-10).log10()
+
+    def update(self, samples: np_typing.NDArray) -> None:
+        """Makes the cache describe the `samples` (the whole block). Only
+        the frames touching the samples, which differ from the cached ones,
+        are recomputed (the appended ones, usually)."""
+        samples = np.asarray(samples, "f4")
+        common = min(len(samples), len(self._samples))
+        changed = np.flatnonzero(samples[:common] != self._samples[:common])
+        first_changed = changed[0] if len(changed) else common
+        if len(samples) != len(self._samples) or first_changed != common:
+            self._samples = samples.copy()
+
+        frames_count = self._frames_touching(len(samples))
+        first_dirty = min(
+            self._clean_frames,
+            self._first_frame_reading(first_changed),
+            frames_count,
+        )
+        if first_dirty == frames_count == self._log_spec.shape[1]:
+            return
+        parts = [self._log_spec[:, :first_dirty]]
+        if first_dirty < frames_count:
+            parts.append(self._compute(first_dirty, frames_count))
+        self._log_spec = torch.cat(parts, dim=1)
+        self._clean_frames = frames_count
+
+    def trim_front(self, samples_count: int) -> None:
+        """Drops the first `samples_count` samples (when a block is split
+        off). The frames are kept if they stay aligned with `HOP_LENGTH`,
+        (the first ones, which read the reflected beginning, are recomputed).
+        """
+        if samples_count % HOP_LENGTH or samples_count > len(self._samples):
+            self.__init__(self.n_mels)
+            return
+        self._samples = self._samples[samples_count:]
+        self._log_spec = self._log_spec[:, samples_count // HOP_LENGTH :]
+        self._clean_frames = max(
+            0, self._clean_frames - samples_count // HOP_LENGTH
+        )
+        reflected_frames = min(
+            -(-(N_FFT // 2) // HOP_LENGTH), self._clean_frames
+        )
+        if reflected_frames > 0:
+            self._log_spec[:, :reflected_frames] = self._compute(
+                0, reflected_frames
+            )
+
+    def mel(self) -> torch.Tensor:
+        """The normalized spectrogram of the first 30 sec (`N_FRAMES`),
+        padded as `whisper.transcribe` does for its first segment."""
+        if len(self._samples) > N_SAMPLES:
+            raise ValueError("The audio is longer than the whisper's window")
+        log_spec = self._log_spec
+        max_log_spec = max(
+            log_spec.max().item() if log_spec.numel() else SILENCE_LOG_SPEC,
+            SILENCE_LOG_SPEC,  # the silence after the audio
+        )
+        content = log_spec[:, : len(self._samples) // HOP_LENGTH]
+        content = torch.maximum(content, torch.tensor(max_log_spec - 8.0))
+        content = (content + 4.0) / 4.0
+        mel = torch.zeros(self.n_mels, N_FRAMES)
+        mel[:, : content.shape[1]] = content
+        return mel
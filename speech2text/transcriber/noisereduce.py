@@ -1,10 +1,33 @@
+"""Noise reduction of the refine stage.
+
+`reduce_noise` runs the non-stationary `noisereduce` on a block: the noise
+is estimated from the block itself, every time.
+
+`spectral_gate` is the stationary spectral gating (the same, as
+`noisereduce` does with `stationary=True`) against a `NoiseProfile` of the
+whole stream. The profile is learned from the silence, which the split
+stage cuts off, so the gating of a block is a single STFT pass over it:
+```
+profile = NoiseProfile(frame_rate)
+profile.learn(silent_samples)  # mono float samples
+if profile.is_ready(min_noise_msec=500):
+    np_data = spectral_gate(np_data, profile)
+```
+"""
+
 from dataclasses import asdict, dataclass, replace
 
 import noisereduce  # can take quite some time
+import numpy as np
+import numpy.typing as np_typing
+from numpy.lib.stride_tricks import sliding_window_view
 from torch.cuda import is_available as is_cuda_available
 
 from speech2text.audio_data import NpData
 
+MSEC_IN_SEC = 1000
+POWER_EPS = 1e-10  # -100 dB
+
 
 @dataclass(frozen=True)
 class NoiseReduceParameters:
@@ -50,3 +73,148 @@ def reduce_noise(
         **params.as_dict(),
     )
     return NpData(np_data.pcm_params, new_data)
+
+
+def _stft(
+    samples: np_typing.NDArray, n_fft: int, center: bool = True
+) -> np_typing.NDArray[np.complex128]:
+    """The spectrum of the `n_fft` long frames (a Hann window, every
+    `n_fft // 4` samples), shaped as `(frames, n_fft // 2 + 1)`. `center`
+    pads the samples, so that the frames cover the edges the same way as
+    the middle (for `_istft`)."""
+    hop = n_fft // 4
+    samples = np.asarray(samples, "f8")
+    if center:
+        tail = -len(samples) % hop
+        samples = np.pad(samples, (n_fft - hop, n_fft - hop + tail))
+    if len(samples) < n_fft:
+        return np.empty((0, n_fft // 2 + 1), np.complex128)
+    frames = sliding_window_view(samples, n_fft)[::hop]
+    return np.fft.rfft(frames * np.hanning(n_fft + 1)[:-1], axis=1)
+
+
+def _istft(
+    spectrum: np_typing.NDArray[np.complex128], n_fft: int, length: int
+) -> np_typing.NDArray[np.float64]:
+    """The `length` samples back from the `_stft(..., center=True)`: the
+    frames are added up in place (overlap-add), `n_fft // hop` shifted
+    copies at a time."""
+    hop = n_fft // 4
+    overlaps = n_fft // hop
+    window = np.hanning(n_fft + 1)[:-1]
+    frames = np.fft.irfft(spectrum, n_fft, axis=1) * window
+    frames = frames.reshape(len(frames), overlaps, hop)
+    weights = np.broadcast_to((window**2).reshape(overlaps, hop), frames.shape)
+    output = np.zeros((len(frames) + overlaps - 1, hop))
+    norm = np.zeros_like(output)
+    for shift in range(overlaps):
+        output[shift : shift + len(frames)] += frames[:, shift]
+        norm[shift : shift + len(frames)] += weights[:, shift]
+    output = output.reshape(-1) / np.maximum(norm.reshape(-1), POWER_EPS)
+    return output[n_fft - hop :][:length]
+
+
+def _power_db(
+    spectrum: np_typing.NDArray[np.complex128],
+) -> np_typing.NDArray[np.float64]:
+    return 10 * np.log10(np.abs(spectrum) ** 2 + POWER_EPS)
+
+
+class NoiseProfile:
+    """The statistics of the noise power (dB) at every frequency of the
+    STFT. The older noise is forgotten gradually: the statistics never
+    weigh more than the last `memory_sec` of it."""
+
+    def __init__(
+        self, frame_rate: int, n_fft: int = 1024, memory_sec: float = 30.0
+    ) -> None:
+        self.frame_rate = frame_rate
+        self.n_fft = n_fft
+        self.max_frames = memory_sec * frame_rate / (n_fft // 4)
+        self._frames = 0.0  # the (weighted) amount of the frames learned
+        self._sum = np.zeros(n_fft // 2 + 1)
+        self._sum_sq = np.zeros(n_fft // 2 + 1)
+
+    @property
+    def duration_msec(self) -> float:
+        return self._frames * (self.n_fft // 4) * MSEC_IN_SEC / self.frame_rate
+
+    def is_ready(self, min_noise_msec: int) -> bool:
+        return self._frames > 1 and self.duration_msec >= min_noise_msec
+
+    def learn(self, samples: np_typing.NDArray) -> None:
+        """Takes the (mono) samples, which are known to be a noise."""
+        power_db = _power_db(_stft(samples, self.n_fft, center=False))
+        if len(power_db) == 0:
+            return
+        self._frames += len(power_db)
+        self._sum += power_db.sum(axis=0)
+        self._sum_sq += (power_db**2).sum(axis=0)
+        if self._frames > self.max_frames:
+            scale = self.max_frames / self._frames
+            self._frames *= scale
+            self._sum *= scale
+            self._sum_sq *= scale
+
+    def threshold_db(self, n_std_thresh: float) -> np_typing.NDArray:
+        """The power (dB) at every frequency, below which it's a noise."""
+        mean = self._sum / self._frames
+        variance = np.maximum(self._sum_sq / self._frames - mean**2, 0.0)
+        return mean + n_std_thresh * np.sqrt(variance)
+
+
+def _triangle(half_width: int) -> np_typing.NDArray[np.float64]:
+    """The normalized triangular smoothing kernel (`2 * half_width + 1`)."""
+    kernel = np.concatenate(
+        (
+            np.linspace(0, 1, half_width + 1, endpoint=False),
+            np.linspace(1, 0, half_width + 2),
+        )
+    )[1:-1]
+    return kernel / kernel.sum()
+
+
+def _smooth(
+    mask: np_typing.NDArray, kernel: np_typing.NDArray, axis: int
+) -> np_typing.NDArray:
+    """Convolves the `mask` with the (symmetric) `kernel` along the `axis`
+    (zero-padded, keeping the shape)."""
+    if len(kernel) == 1:
+        return mask
+    padding = [(0, 0)] * mask.ndim
+    padding[axis] = (len(kernel) // 2, len(kernel) // 2)
+    windows = sliding_window_view(np.pad(mask, padding), len(kernel), axis)
+    return windows @ kernel
+
+
+def spectral_gate(
+    np_data: NpData,
+    profile: NoiseProfile,
+    n_std_thresh: float = 1.5,
+    prop_decrease: float = 0.95,
+    freq_mask_smooth_hz: int = 500,
+    time_mask_smooth_ms: int = 50,
+) -> NpData:
+    """Attenuates (by `prop_decrease`) the STFT bins, which aren't louder
+    than the noise of the `profile` by `n_std_thresh` of its deviation. The
+    mask is smoothed over `freq_mask_smooth_hz` and `time_mask_smooth_ms`,
+    so that the speech isn't chopped."""
+    n_fft = profile.n_fft
+    frame_rate = np_data.pcm_params.frame_rate
+    threshold_db = profile.threshold_db(n_std_thresh)
+    # the kernels span `freq_mask_smooth_hz` and `time_mask_smooth_ms`
+    bin_hz = frame_rate / n_fft
+    hop_msec = MSEC_IN_SEC * (n_fft // 4) / frame_rate
+    freq_kernel = _triangle(int(freq_mask_smooth_hz / bin_hz / 2))
+    time_kernel = _triangle(int(time_mask_smooth_ms / hop_msec / 2))
+
+    frames = np_data.frames
+    channels = []
+    for samples in frames.T:
+        spectrum = _stft(samples, n_fft)
+        mask = (_power_db(spectrum) > threshold_db).astype("f8")
+        mask = _smooth(_smooth(mask, freq_kernel, 1), time_kernel, 0)
+        gain = mask * prop_decrease + (1.0 - prop_decrease)
+        channels.append(_istft(spectrum * gain, n_fft, len(samples)))
+    gated = np.stack(channels, axis=1).astype(frames.dtype)
+    return np_data._spawn(gated)
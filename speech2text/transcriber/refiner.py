@@ -0,0 +1,163 @@
+"""Refining turns a block's `PdData` into the `NpData` whisper takes (the
+effects, the resampling to 16 kHz mono, the noise reduction).
+
+A burst of blocks split off at once can be refined in parallel by a pool
+of `refine.workers` processes. The pool lives as long as the program does,
+so the workers are started (and import the libraries) only once. The audio
+goes to the workers through a single `SharedMemory` block instead of being
+pickled with every task, and the `NpData` arrays come back in the order of
+the blocks:
+```
+arr_datas = refine_in_pool(seg_datas, settings, noise_profile, workers=4)
+```
+
+The pool is started at the cold start, before the whisper models are
+loaded in the background (so the workers aren't forked from a process busy
+with the whisper threads).
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import List, Tuple
+
+from speech2text.audio_data import (
+    WHISPER_PCM_PARAMS,
+    NpData,
+    PcmParams,
+    PdData,
+)
+from speech2text.settings import PyDubSettings, RefineStageSettings
+
+from .noisereduce import NoiseProfile, reduce_noise, spectral_gate
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+
+
+def apply_effects(
+    audio: PdData | NpData, pydub_params: PyDubSettings
+) -> PdData | NpData:
+    """Applies the effects enabled in `pydub_params` (both `PdData` and
+    `NpData` provide them)."""
+    if pydub_params.low_pass_filter:
+        audio = audio.low_pass_filter(pydub_params.low_pass_filter)
+    if pydub_params.high_pass_filter:
+        audio = audio.high_pass_filter(pydub_params.high_pass_filter)
+    if pydub_params.volume_up:
+        audio = audio.apply_gain(pydub_params.volume_up)
+    if pydub_params.speed_up and pydub_params.speed_up > 1.0:
+        audio = audio.speedup(pydub_params.speed_up)
+    if pydub_params.normalize:
+        audio = audio.normalize()
+    return audio
+
+
+def refine_audio(
+    seg_data: PdData,
+    settings: RefineStageSettings.SubSection,
+    noise_profile: NoiseProfile | None = None,
+) -> Tuple[PdData, NpData]:
+    """Returns the block's `seg_data` (with the `pydub` engine effects) and
+    its `arr_data`. With a ready `noise_profile`, the `spectral_gate`
+    replaces `noisereduce`, and it comes before the `numpy` effects (the
+    profile is learned from the audio without them, so the settings don't
+    combine it with the `pydub` engine)."""
+    pydub_params = settings.pydub
+    if pydub_params and pydub_params.engine == "pydub":
+        seg_data = apply_effects(seg_data, pydub_params)
+    arr_data = NpData.load_from_pd_data(
+        seg_data.adjust_pcm_params(WHISPER_PCM_PARAMS)
+    )
+    gated = settings.spectral_gate is not None and noise_profile is not None
+    if gated:
+        arr_data = spectral_gate(
+            arr_data, noise_profile, **settings.spectral_gate.model_dump()
+        )
+    if pydub_params and pydub_params.engine == "numpy":
+        arr_data = apply_effects(arr_data, pydub_params)
+    if settings.noisereduce and not gated:
+        arr_data = reduce_noise(arr_data)
+    return seg_data, arr_data
+
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """The pool of `workers` processes (it's replaced, if the size
+    changes)."""
+    global _pool, _pool_workers
+    if _pool is None or _pool_workers != workers:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        # the workers share the tracker of the shared memory (otherwise
+        # every one would start its own, which unlinks the memory it has
+        # seen, when the worker exits)
+        resource_tracker.ensure_running()
+        _pool = ProcessPoolExecutor(workers)
+        _pool_workers = workers
+    return _pool
+
+
+def _is_ready() -> bool:
+    return True
+
+
+def warm_up_pool(workers: int) -> None:
+    """Starts the workers (before the first burst of blocks)."""
+    pool = get_pool(workers)
+    for _ in range(workers):
+        pool.submit(_is_ready)
+
+
+def _refine_shared(
+    shared_name: str,
+    start: int,
+    end: int,
+    pcm_params: PcmParams,
+    settings: RefineStageSettings.SubSection,
+    noise_profile: NoiseProfile | None,
+) -> NpData:
+    """Refines the block, which is `[start, end)` of the shared memory (runs
+    in a worker)."""
+    shared = SharedMemory(shared_name)
+    try:
+        data = bytes(shared.buf[start:end])
+    finally:
+        shared.close()
+    _, arr_data = refine_audio(
+        PdData.load_from_raw(data, pcm_params), settings, noise_profile
+    )
+    return arr_data
+
+
+def refine_in_pool(
+    seg_datas: List[PdData],
+    settings: RefineStageSettings.SubSection,
+    noise_profile: NoiseProfile | None,
+    workers: int,
+) -> List[NpData]:
+    """The `arr_data` of every block (the `pydub` engine effects aren't
+    applied to the `seg_datas`: the final blocks need only `arr_data`)."""
+    ends = list(accumulate(len(seg_data.raw_data) for seg_data in seg_datas))
+    shared = SharedMemory(create=True, size=max(ends[-1], 1))
+    try:
+        starts = [0, *ends[:-1]]
+        for seg_data, start, end in zip(seg_datas, starts, ends):
+            shared.buf[start:end] = seg_data.raw_data
+        pool = get_pool(workers)
+        futures = [
+            pool.submit(
+                _refine_shared,
+                shared.name,
+                start,
+                end,
+                seg_data.pcm_params,
+                settings,
+                noise_profile,
+            )
+            for seg_data, start, end in zip(seg_datas, starts, ends)
+        ]
+        return [future.result() for future in futures]
+    finally:
+        shared.close()
+        shared.unlink()
@@ -1,8 +1,25 @@
+from collections import deque
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List
-
-from speech2text.audio_data import NpData, PcmParams, PdData, WavData
+from typing import Deque, List
+
+from speech2text.audio_data import (
+    LoudnessProfile,
+    NpData,
+    PcmParams,
+    PdData,
+    VoiceActivity,
+    VoiceActivityDetector,
+    WavData,
+)
+from speech2text.audio_data.np_effects import FilterState
+from speech2text.utils.sample_types import SampleBuffer, SampleDType
+
+from .agreement import LocalAgreement
+from .controller import QualityController
+from .mel_cache import MelCache
+from .noisereduce import NoiseProfile
 
 
 class InvalidWorkflowStateException(Exception):
@@ -18,6 +35,8 @@ class Status(Enum):
     ADJUSTED --------+
     ↓                |
     SPLITTED         |
+    ↓                |
+    DETECTED ------->+
     ↓                ↓
     REFINED       SKIPPED
     ↓                |
@@ -32,18 +51,38 @@ class Status(Enum):
     INCREMENTED = 1  #  INPUT_UPDATED
     ADJUSTED = 2  # getting PdData
     SPLITTED = 3  #
-    REFINED = 4  # getting np.array
-    TRANSCRIBED = 5
+    DETECTED = 4  # telling speech from noise
+    REFINED = 5  # getting np.array
+    TRANSCRIBED = 6
     SKIPPED = 100
     INVALID = 999
 
 
+@dataclass
+class AdjustState:
+    """What the incremental adjust stage keeps between the chunks."""
+
+    frames_count: int = 0  # of `Block.raw_data`, which are adjusted already
+    data: SampleBuffer = field(  # the adjusted frames
+        default_factory=lambda: SampleBuffer(SampleDType.BYTES_2)
+    )
+    low_pass: FilterState | None = None
+    high_pass: FilterState | None = None
+    peak: float = 0.0  # the running peak (for normalizing)
+
+
 @dataclass
 class Block:
     raw_data: WavData | None = None
     seg_data: PdData | None = None
     arr_data: NpData | None = None
     text: str | None = None
+    loudness: LoudnessProfile | None = None  # of `seg_data`, grows with it
+    adjust: AdjustState | None = None  # of `raw_data`, grows with it
+    fingerprint: tuple | None = None  # of the speech `text` was taken from
+    mel: MelCache | None = None  # of `arr_data`, grows with it
+    voice: VoiceActivity | None = None  # of `seg_data`, grows with it
+    agreement: LocalAgreement | None = None  # of `text` (the ongoing block)
 
     def _has_raw(self):
         return isinstance(self.raw_data, WavData)
@@ -57,6 +96,11 @@ class Block:
     def _has_text(self):
         return isinstance(self.text, str)
 
+    @property
+    def is_speech(self) -> bool:
+        """Whether the block is to be transcribed (`True`, if unknown)."""
+        return self.voice is None or self.voice.has_speech
+
     @staticmethod
     def load_from_seg_data(
         seg_data: PdData, input_pcm_params: PcmParams = None
@@ -69,19 +113,59 @@ class Block:
         return Block(raw_data=raw_data, seg_data=seg_data)
 
 
+@dataclass
+class TranscriptionCounters:
+    """How many times whisper was called (and how many ongoing
+    transcriptions were skipped, because the speech hasn't changed)."""
+
+    final: int = 0
+    ongoing: int = 0
+    ongoing_skipped: int = 0
+    ongoing_deadline_exceeded: int = 0
+    ongoing_throttled: int = 0  # skipped by the `QualityController`
+    # not transcribed, because no speech was detected in them
+    final_no_speech: int = 0
+    ongoing_no_speech: int = 0
+
+
 @dataclass
 class State:
     input_pcm_params: PcmParams
     latency_ratio: float = 0.0
+    chunk_received_at: float | None = None  # `time.monotonic()`
     _status: Status = Status.FINALIZED
     ongoing: Block = field(default_factory=lambda: Block(WavData()))
     ongoing_init_prompt: str | None = None
     to_be_finalized: List[Block] = field(default_factory=list)
     finalized: List[Block] = field(default_factory=list)
+    # `Future`s of the lists of blocks being finalized (in the order of
+    # splitting)
+    finalizing: Deque[Future] = field(default_factory=deque)
+    counters: TranscriptionCounters = field(
+        default_factory=TranscriptionCounters
+    )
+    quality: QualityController = field(default_factory=QualityController)
+    vad: VoiceActivityDetector | None = None  # keeps the noise floor
+    noise_profile: NoiseProfile | None = None  # learned from the silence
+    # how long every stage of the last chunk took (sec)
+    stage_timings: dict[Status, float] = field(default_factory=dict)
 
     def __post_init__(self):
         self.ongoing.raw_data._pcm_params = self.input_pcm_params
 
+    def collect_finalized(self, wait: bool = False) -> None:
+        """Moves the blocks, which are already transcribed, from `finalizing`
+        to `finalized` (keeping the order). The last one's text becomes the
+        prompt for the ongoing block.
+
+        wait - wait for all the blocks being finalized
+        """
+        while self.finalizing and (wait or self.finalizing[0].done()):
+            blocks = self.finalizing.popleft().result()
+            self.finalized.extend(blocks)
+            if blocks:
+                self.ongoing_init_prompt = blocks[-1].text
+
     def _validate_finalized(self) -> None:
         assert self.ongoing._has_raw()
         assert self.to_be_finalized == []
@@ -95,9 +179,12 @@ class State:
     def _validate_splitted(self) -> None:
         assert self.ongoing._has_seg()
 
+    def _validate_detected(self) -> None:
+        assert self.ongoing._has_seg()
+
     def _validate_refined(self) -> None:
         assert self.ongoing._has_seg()
-        assert self.ongoing._has_arr()
+        assert self.ongoing._has_arr() or not self.ongoing.is_speech
 
     def _validate_transcribed(self) -> None:
         assert self.ongoing._has_text()
@@ -115,6 +202,7 @@ class State:
                 Status.INCREMENTED: self._validate_incremented,
                 Status.ADJUSTED: self._validate_adjusted,
                 Status.SPLITTED: self._validate_splitted,
+                Status.DETECTED: self._validate_detected,
                 Status.REFINED: self._validate_refined,
                 Status.TRANSCRIBED: self._validate_transcribed,
                 Status.SKIPPED: self._validate_skipped,
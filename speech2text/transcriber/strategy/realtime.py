@@ -1,22 +1,94 @@
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+from functools import partial
+from itertools import chain
+from math import ceil
+from time import monotonic
+from typing import List, Tuple
+
+import numpy as np
 from pydub.generators import WhiteNoise
 
-from speech2text.audio_data import WHISPER_PCM_PARAMS, NpData, PdData
+from speech2text.audio_data import (
+    WHISPER_PCM_PARAMS,
+    LoudnessProfile,
+    NpData,
+    PcmParams,
+    PdData,
+    VoiceActivity,
+    VoiceActivityDetector,
+    np_effects,
+)
 from speech2text.audio_data.wave_data import WavData
 from speech2text.settings import (
     PyDubSettings,
     PyDubSplitOnSilenceSettings,
+    RefineStageSettings,
+    TranscribeStageSettings,
+    VadSettings,
     WhisperSettings,
     app_settings,
 )
+from speech2text.utils.sample_types import SampleBuffer, SampleDType
 
-from ..noisereduce import reduce_noise
-from ..state import Block, State, Status
-from ..whisper import transcribe
+from ..agreement import LocalAgreement, Word
+from ..controller import QualityLevel
+from ..finalizer import finalize_in_background, finalize_now
+from ..mel_cache import MelCache
+from ..noisereduce import NoiseProfile
+from ..refiner import apply_effects, refine_audio, refine_in_pool, warm_up_pool
+from ..state import AdjustState, Block, State, Status
+from ..whisper import (
+    fitting_model,
+    load_in_background,
+    mel_bins,
+    model_registry,
+    smaller_model,
+    transcribe,
+    transcribe_batch,
+    transcribe_mel_cache,
+)
 from .strategy import IStrategy
 
+logger = logging.getLogger(__name__)
+
+FORCE_SPLIT_WINDOW_MSEC = 100
+
 
 class RealtimeProcessing(IStrategy):
-    def cold_start(self):
+    _cold_start: Future | None = None
+    _cold_start_executor = ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix="cold-start"
+    )
+
+    def cold_start(self) -> Future:
+        """Starts loading every model named in the transcribe stage settings
+        (in the order they are needed: the ongoing one first), then warms
+        them up in the background. Done once per strategy object.
+
+        A model, which doesn't fit in `transcriber.models.memory_budget_mb`,
+        is replaced with a smaller one (see `fitting_model`), and the models
+        of both stages are kept loaded."""
+        if self._cold_start is None:
+            workers = app_settings.transcriber.stages.refine.workers
+            if workers:
+                warm_up_pool(workers)
+            settings = app_settings.transcriber.stages.transcribe
+            for subsection in (settings.ongoing, settings.final):
+                whisper_settings = subsection.whisper
+                model_name = fitting_model(whisper_settings.model_name)
+                if model_name.value != whisper_settings.model_name:
+                    logger.warning(
+                        f"{whisper_settings.model_name} doesn't fit in the "
+                        f"memory budget, {model_name.value} is used instead"
+                    )
+                model_registry.keep(model_name, whisper_settings.backend)
+                load_in_background(model_name, whisper_settings.backend)
+            self._cold_start = self._cold_start_executor.submit(self._warm_up)
+        return self._cold_start
+
+    def _warm_up(self) -> None:
         temp_pcm_params = WHISPER_PCM_PARAMS
         temp_state = State(temp_pcm_params)
 
@@ -37,6 +109,7 @@ class RealtimeProcessing(IStrategy):
         temp_state.to_be_finalized = [get_white_noise_block()]
         temp_state.ongoing = get_white_noise_block()
         self._transcribe(temp_state)
+        temp_state.collect_finalized(wait=True)
 
     def process_chunk(
         self,
@@ -53,6 +126,8 @@ class RealtimeProcessing(IStrategy):
         |  ADJUSTED
         |  ↓  split() ------+
         |  SPLITTED         |
+        |  ↓  detect() ---->+
+        |  DETECTED         |
         |  ↓  refine()      ↓
         |  REFINED       SKIPPED
         |  ↓  transcribe()  |
@@ -61,39 +136,172 @@ class RealtimeProcessing(IStrategy):
         ```
         """
         state.status = Status.FINALIZED  ###############################
+        state.chunk_received_at = monotonic()
+        state.stage_timings = {}
         state.ongoing.raw_data.append_chunk(chunk)
         state.latency_ratio = latency_ratio
         state.status = Status.INCREMENTED  #############################
-        state = self._adjust(state)
+        state = self._timed(self._adjust, state, Status.ADJUSTED)
         state.status = Status.ADJUSTED  ################################
-        state = self._split(state)
+        state = self._timed(self._split, state, Status.SPLITTED)
         if state.ongoing.seg_data is None:
             state.status = Status.SKIPPED  #############################
         else:
             state.status = Status.SPLITTED  ############################
-            state = self._refine(state)
-            state.status = Status.REFINED  #############################
-            state = self._transcribe(state)
-            state.status = Status.TRANSCRIBED  #########################
+            state = self._timed(self._detect, state, Status.DETECTED)
+            state.status = Status.DETECTED  ############################
+            if state.ongoing.is_speech or state.to_be_finalized:
+                state = self._timed(self._refine, state, Status.REFINED)
+                state.status = Status.REFINED  #########################
+                state = self._timed(
+                    self._transcribe, state, Status.TRANSCRIBED
+                )
+                state.status = Status.TRANSCRIBED  #####################
+            else:
+                state.status = Status.SKIPPED  #########################
+
+        pcm_params = state.input_pcm_params
+        state.quality.observe(
+            latency_ratio,
+            monotonic() - state.chunk_received_at,
+            pcm_params.frame_count_to_seconds(
+                len(chunk) // pcm_params.frame_size_bytes()
+            ),
+        )
+        return state
 
+    @staticmethod
+    def _timed(stage, state: State, status: Status) -> State:
+        """Runs the `stage`, noting its time under the `status` it leads to."""
+        start = monotonic()
+        state = stage(state)
+        state.stage_timings[status] = monotonic() - start
         return state
 
     def _adjust(self, state: State) -> State:
         settings = app_settings.transcriber.stages.adjust.pydub
-        seg_data = PdData.load_from_wav_file(state.ongoing.raw_data)
-        if settings.low_pass_filter:
-            seg_data = seg_data.low_pass_filter(settings.low_pass_filter)
-        if settings.high_pass_filter:
-            seg_data = seg_data.high_pass_filter(settings.high_pass_filter)
-        if settings.speed_up and settings.speed_up > 1.0:
-            seg_data = seg_data.speedup(settings.speed_up)
-        if settings.volume_up:
-            seg_data += settings.volume_up
-        if settings.normalize:
-            seg_data = seg_data.normalize()
+        if settings.engine == "numpy" and not settings.speed_up:
+            # `speed_up` can't continue from the previous chunk
+            return self._adjust_incrementally(state, settings)
+        if settings.engine == "numpy":
+            arr_data = NpData.load_from_wav_file(state.ongoing.raw_data)
+            seg_data = apply_effects(arr_data, settings).create_pd_data()
+        else:
+            seg_data = PdData.load_from_wav_file(state.ongoing.raw_data)
+            seg_data = apply_effects(seg_data, settings)
+        if settings.speed_up or settings.normalize:
+            # these effects alter the already profiled part of the block
+            state.ongoing.loudness = None
+            state.ongoing.voice = None
         state.ongoing.seg_data = seg_data
         return state
 
+    def _adjust_incrementally(
+        self, state: State, settings: PyDubSettings
+    ) -> State:
+        """Applies the effects only to the frames of `raw_data`, which
+        haven't been adjusted yet, and appends the result to the already
+        adjusted ones. The filters continue from their previous state, and
+        normalizing is done against the running peak of the block."""
+        block = state.ongoing
+        pcm_params = block.raw_data.pcm_params
+        frame_size = pcm_params.frame_size_bytes()
+        raw_data = block.raw_data.raw_data
+        adjust = block.adjust
+        if adjust is None or adjust.frames_count * frame_size > len(raw_data):
+            # `raw_data` doesn't continue the adjusted audio anymore
+            adjust = block.adjust = AdjustState()
+            block.loudness = None
+            block.voice = None
+
+        chunk = memoryview(raw_data)[adjust.frames_count * frame_size :]
+        chunk = chunk[: len(chunk) - len(chunk) % frame_size]
+        if len(chunk) > 0:
+            frame_rate = pcm_params.frame_rate
+            frames = NpData.load_from_raw(chunk, pcm_params).frames
+            if settings.low_pass_filter:
+                frames, adjust.low_pass = np_effects.low_pass_filter(
+                    frames,
+                    frame_rate,
+                    settings.low_pass_filter,
+                    adjust.low_pass,
+                )
+            if settings.high_pass_filter:
+                frames, adjust.high_pass = np_effects.high_pass_filter(
+                    frames,
+                    frame_rate,
+                    settings.high_pass_filter,
+                    adjust.high_pass,
+                )
+            if settings.volume_up:
+                frames = np_effects.apply_gain(frames, settings.volume_up)
+            if settings.normalize:
+                chunk_peak = float(np.max(np.abs(frames)))
+                adjust.peak = max(adjust.peak, chunk_peak)
+                frames = np_effects.normalize(frames, peak=adjust.peak)
+            adjust.data.extend(NpData(pcm_params, frames.reshape(-1)).raw_data)
+            adjust.frames_count += len(chunk) // frame_size
+
+        block.seg_data = PdData.load_from_raw(adjust.data.view(), pcm_params)
+        return state
+
+    @staticmethod
+    def _carry_adjust_state(prev_block: Block, block: Block) -> None:
+        """Passes the adjust stage state to the remainder of a split: its
+        `raw_data` is adjusted already, and the filters continue with the
+        next chunk."""
+        if prev_block.adjust is None:
+            return
+        frame_size = block.raw_data.pcm_params.frame_size_bytes()
+        block.adjust = replace(
+            prev_block.adjust,
+            frames_count=len(block.raw_data.raw_data) // frame_size,
+            data=SampleBuffer(SampleDType.BYTES_2, block.raw_data.raw_data),
+        )
+
+    @staticmethod
+    def _carry_mel_cache(
+        prev_block: Block, block: Block, trimmed_frames: int
+    ) -> None:
+        """Passes the spectrogram of the ongoing block to the remainder of
+        a split (the frames after the split point are mostly kept)."""
+        if prev_block.mel is None:
+            return
+        prev_block.mel.trim_front(trimmed_frames)
+        block.mel = prev_block.mel
+
+    def _remainder_block(self, state: State, start_msec: int) -> Block:
+        """The new ongoing block after a split: the tail of the ongoing
+        block starting from `start_msec`.
+
+        If the block is adjusted incrementally (the adjusted frames match
+        `raw_data` one to one), its buffers are trimmed from the front, and
+        the rest is kept as is. Otherwise the block is re-created from the
+        tail of `seg_data`."""
+        block = state.ongoing
+        seg_data = block.seg_data[start_msec:]
+        frame_size = block.seg_data.pcm_params.frame_size_bytes()
+        trimmed_bytes = len(block.seg_data.raw_data) - len(seg_data.raw_data)
+        adjust = block.adjust
+        if adjust is None or len(adjust.data) != len(block.seg_data.raw_data):
+            remainder = Block.load_from_seg_data(
+                seg_data, state.input_pcm_params
+            )
+            self._carry_adjust_state(block, remainder)
+            self._carry_mel_cache(
+                block, remainder, trimmed_bytes // frame_size
+            )
+            return remainder
+
+        block.raw_data.trim_front(trimmed_bytes // frame_size)
+        adjust.data.trim_front(trimmed_bytes)
+        adjust.frames_count -= trimmed_bytes // frame_size
+        remainder = Block(
+            raw_data=block.raw_data, seg_data=seg_data, adjust=adjust
+        )
+        self._carry_mel_cache(block, remainder, trimmed_bytes // frame_size)
+        return remainder
+
     def _split(self, state: State) -> State:
         settings = app_settings.transcriber.stages.split
         threshold = settings.agressive_threshold
@@ -101,142 +309,584 @@ class RealtimeProcessing(IStrategy):
             state.latency_ratio > threshold.latency_ratio
             or state.ongoing.seg_data.duration_seconds > threshold.duration_sec
         )
+        presets = [settings.pydub_split_on_silence.default]
         if agressive:
-            for preset_name, preset_params in settings.pydub_split_on_silence:
-                state = self._apply_split(state, preset_params)
-                if (
-                    state.ongoing.seg_data is None
-                    or len(state.to_be_finalized) > 0
-                ):
-                    break
-            else:
-                state = self._apply_force_split(state)
+            presets = [params for _, params in settings.pydub_split_on_silence]
+
+        # all the presets are evaluated against the same loudness profile
+        profile = self._update_loudness(state.ongoing)
+        for split_params in presets:
+            ranges = self._split_ranges(profile, split_params)
+            if self._is_split(profile, split_params, ranges):
+                break
         else:
-            state = self._apply_split(
-                state, settings.pydub_split_on_silence.default
+            if agressive:
+                return self._apply_force_split(state, profile)
+        return self._apply_split(state, profile, split_params, ranges)
+
+    def _update_loudness(self, block: Block) -> LoudnessProfile:
+        """Extends the block's loudness profile with the frames of
+        `seg_data`, which haven't been profiled yet."""
+        seg_data = block.seg_data
+        profile = block.loudness
+        if profile is None or profile.frames_count > seg_data.frame_count():
+            # `seg_data` doesn't continue the profiled audio anymore
+            profile = block.loudness = LoudnessProfile(seg_data.pcm_params)
+        frame_size = profile.pcm_params.frame_size_bytes()
+        profile.extend(seg_data.raw_data[profile.frames_count * frame_size :])
+        return profile
+
+    def _split_ranges(
+        self,
+        profile: LoudnessProfile,
+        split_params: PyDubSplitOnSilenceSettings,
+    ) -> List[Tuple[int, int]]:
+        """The same as `pydub.silence.split_on_silence`, but returns the
+        ranges (msec) instead of the segments, and finds the silence using
+        the cached loudness profile instead of scanning the audio."""
+        keep_silence = split_params.keep_silence
+        output_ranges = [
+            [start - keep_silence, end + keep_silence]
+            for start, end in profile.detect_nonsilent(
+                split_params.min_silence_len,
+                split_params.silence_thresh,
+                split_params.seek_step,
             )
-        return state
+        ]
+        for range_i, range_ii in zip(output_ranges, output_ranges[1:]):
+            last_end = range_i[1]
+            next_start = range_ii[0]
+            if next_start < last_end:
+                range_i[1] = (last_end + next_start) // 2
+                range_ii[0] = range_i[1]
+
+        length = profile.duration_msec
+        return [
+            (max(start, 0), min(end, length)) for start, end in output_ranges
+        ]
+
+    @staticmethod
+    def _trim_threshold(split_params: PyDubSplitOnSilenceSettings) -> int:
+        return max(
+            split_params.min_silence_len - split_params.keep_silence // 2,
+            500,
+        )
+
+    def _is_split(
+        self,
+        profile: LoudnessProfile,
+        split_params: PyDubSplitOnSilenceSettings,
+        ranges: List[Tuple[int, int]],
+    ) -> bool:
+        """Whether applying the `ranges` changes the ongoing block: it's
+        either split, or found to be silent, or definitely trimmed."""
+        if len(ranges) != 1:
+            return True
+        start, end = ranges[0]
+        trimmed_length = profile.duration_msec - (end - start)
+        return trimmed_length > self._trim_threshold(split_params)
 
     def _apply_split(
-        self, state: State, split_params: PyDubSplitOnSilenceSettings
+        self,
+        state: State,
+        profile: LoudnessProfile,
+        split_params: PyDubSplitOnSilenceSettings,
+        ranges: List[Tuple[int, int]],
     ) -> State:
+        prev_block = state.ongoing
         init_length = len(state.ongoing.seg_data)
-        segments = state.ongoing.seg_data.split_on_silence(
-            **split_params.model_dump()
-        )
+        segments = [state.ongoing.seg_data[start:end] for start, end in ranges]
         if len(segments) == 0:  # only silence was found
+            self._learn_noise(
+                state, prev_block.seg_data, profile, split_params
+            )
             state.to_be_finalized = []
             state.ongoing.seg_data = None
             state.ongoing.raw_data = WavData(state.input_pcm_params)
+            state.ongoing.loudness = None
+            state.ongoing.voice = None
+            self._carry_adjust_state(prev_block, state.ongoing)
         elif len(segments) == 1:  # no splitting, but maybe trimming
             segment = segments[0]
-            trim_threshold = max(
-                split_params.min_silence_len - split_params.keep_silence // 2,
-                500,
-            )
+            trim_threshold = self._trim_threshold(split_params)
             if (
                 init_length - len(segment) > trim_threshold
             ):  # it was definitely trimmed
+                self._learn_noise(
+                    state, prev_block.seg_data, profile, split_params
+                )
                 state.to_be_finalized = [Block.load_from_seg_data(segment)]
                 empty_wav = WavData(
                     state.input_pcm_params, b"\x00\x00\x00\x00"
                 )
                 empty_seg = PdData.load_from_wav_file(empty_wav)
                 state.ongoing = Block(empty_wav, empty_seg)
+                self._carry_adjust_state(prev_block, state.ongoing)
             else:
                 state.to_be_finalized = []
                 state.ongoing.seg_data = segment
         elif len(segments) > 1:
-            blocks = [
-                Block.load_from_seg_data(segment) for segment in segments
+            self._learn_noise(
+                state, prev_block.seg_data, profile, split_params
+            )
+            state.to_be_finalized = [
+                Block.load_from_seg_data(segment) for segment in segments[:-1]
             ]
-            state.to_be_finalized = blocks[:-1]
-            state.ongoing = blocks[-1]
+            last_start, last_end = ranges[-1]
+            if last_end == profile.duration_msec:
+                state.ongoing = self._remainder_block(state, last_start)
+            else:
+                state.ongoing = Block.load_from_seg_data(segments[-1])
+                self._carry_adjust_state(prev_block, state.ongoing)
+            state.ongoing.loudness = profile.slice(last_start, last_end)
+            if prev_block.voice is not None:
+                state.ongoing.voice = prev_block.voice.slice(
+                    last_start, last_end
+                )
         return state
 
-    def _apply_force_split(self, state: State) -> State:
-        l = len(state.ongoing.seg_data)
+    def _apply_force_split(
+        self, state: State, profile: LoudnessProfile
+    ) -> State:
+        l = profile.duration_msec
 
-        # cut in half:
-        left = state.ongoing.seg_data[: l // 2]
-        right = state.ongoing.seg_data[l // 2 :]
+        # cut at the quietest point of the middle half:
+        cut = profile.quietest_msec(
+            l // 4, l - l // 4, FORCE_SPLIT_WINDOW_MSEC
+        )
+        left = state.ongoing.seg_data[:cut]
 
         state.to_be_finalized = [
             Block.load_from_seg_data(left, state.input_pcm_params)
         ]
-        state.ongoing.seg_data = right
+        prev_block = state.ongoing
+        state.ongoing = self._remainder_block(state, cut)
+        state.ongoing.loudness = profile.slice(cut, l)
+        if prev_block.voice is not None:
+            state.ongoing.voice = prev_block.voice.slice(cut, l)
         return state
 
-    def _refine(self, state: State) -> State:
-        settings_final = app_settings.transcriber.stages.refine.final
+    @staticmethod
+    def _noise_profile(state: State) -> NoiseProfile | None:
+        """The noise profile of the stream (`None`, if it's not used)."""
+        settings = app_settings.transcriber.stages.refine.noise_profile
+        if settings is None:
+            state.noise_profile = None
+        elif state.noise_profile is None:
+            state.noise_profile = NoiseProfile(
+                WHISPER_PCM_PARAMS.frame_rate,
+                settings.n_fft,
+                settings.memory_sec,
+            )
+        return state.noise_profile
 
-        def apply_pydub(block: Block, pydub_params: PyDubSettings):
-            if pydub_params.low_pass_filter:
-                block.seg_data = block.seg_data.low_pass_filter(
-                    pydub_params.low_pass_filter
-                )
-            if pydub_params.high_pass_filter:
-                block.seg_data = block.seg_data.high_pass_filter(
-                    pydub_params.high_pass_filter
+    def _learn_noise(
+        self,
+        state: State,
+        seg_data: PdData,
+        profile: LoudnessProfile,
+        split_params: PyDubSplitOnSilenceSettings,
+    ) -> None:
+        """Learns the noise from the silence found in the block being split
+        (it's cut off, or goes to the finalized blocks, so it's learned only
+        once)."""
+        noise_profile = self._noise_profile(state)
+        if noise_profile is None:
+            return
+        nonsilent = profile.detect_nonsilent(
+            split_params.min_silence_len,
+            split_params.silence_thresh,
+            split_params.seek_step,
+        )
+        bounds = [0, *chain.from_iterable(nonsilent), profile.duration_msec]
+        for start, end in zip(bounds[::2], bounds[1::2]):
+            if end <= start:
+                continue
+            silence = NpData.load_from_pd_data(
+                seg_data[start:end].adjust_pcm_params(WHISPER_PCM_PARAMS)
+            )
+            noise_profile.learn(silence._data)
+
+    @staticmethod
+    def _voice_detector(
+        state: State, settings: VadSettings, pcm_params: PcmParams
+    ) -> VoiceActivityDetector:
+        """The detector of the stream (it keeps the noise floor)."""
+        if state.vad is None or state.vad.pcm_params != pcm_params:
+            state.vad = VoiceActivityDetector(
+                pcm_params, **settings.model_dump()
+            )
+        return state.vad
+
+    def _detect(self, state: State) -> State:
+        """Drops the blocks to be finalized, which have no speech in them,
+        and empties the text of the ongoing one, if it has no speech (it's
+        neither refined nor transcribed then)."""
+        settings = app_settings.transcriber.stages.detect
+        if settings is None:
+            return state
+        block = state.ongoing
+        detector = self._voice_detector(
+            state, settings.vad, block.seg_data.pcm_params
+        )
+
+        speech_blocks = []
+        for final_block in state.to_be_finalized:
+            if final_block.voice is None:
+                # its audio was a part of the ongoing block (already learned)
+                final_block.voice = detector.update(
+                    VoiceActivity(detector.frame_msec),
+                    final_block.seg_data.raw_data,
+                    learn=False,
                 )
-            if pydub_params.volume_up:
-                block.seg_data += pydub_params.volume_up
-            if pydub_params.speed_up:
-                block.seg_data = block.seg_data.speedup(pydub_params.speed_up)
-            if pydub_params.normalize:
-                block.seg_data = block.seg_data.normalize()
-
-        # to_be_finalized
-        if settings_final.pydub:
-            for block in state.to_be_finalized:
-                apply_pydub(block, settings_final.pydub)
-        for block in state.to_be_finalized:
-            block.arr_data = NpData.load_from_pd_data(
-                block.seg_data.adjust_pcm_params(WHISPER_PCM_PARAMS)
-            )
-        if settings_final.noisereduce:
-            for block in state.to_be_finalized:
-                block.arr_data = reduce_noise(block.arr_data)
-
-        # ongoing
-        settings_ongoing = app_settings.transcriber.stages.refine.ongoing
-        if settings_ongoing.pydub:
-            apply_pydub(state.ongoing, settings_ongoing.pydub)
-        state.ongoing.arr_data = NpData.load_from_pd_data(
-            state.ongoing.seg_data.adjust_pcm_params(WHISPER_PCM_PARAMS)
-        )
-        if settings_ongoing.noisereduce:
-            state.ongoing.arr_data = reduce_noise(state.ongoing.arr_data)
+            if final_block.is_speech:
+                speech_blocks.append(final_block)
+            else:
+                state.counters.final_no_speech += 1
+        state.to_be_finalized = speech_blocks
 
+        checked_frames = (
+            block.voice.frames_count * detector.frame_len
+            if block.voice is not None
+            else 0
+        )
+        if (
+            block.voice is None
+            or checked_frames > block.seg_data.frame_count()
+        ):
+            # `seg_data` doesn't continue the checked audio anymore
+            block.voice = VoiceActivity(detector.frame_msec)
+        detector.update(block.voice, block.seg_data.raw_data)
+        if not block.is_speech:
+            block.text = ""
+            state.counters.ongoing_no_speech += 1
         return state
 
-    def _transcribe(self, state: State) -> State:
-        settings_final = app_settings.transcriber.stages.transcribe.final
+    def _refine_block(
+        self,
+        block: Block,
+        settings: RefineStageSettings.SubSection,
+        noise_profile: NoiseProfile | None = None,
+    ) -> None:
+        block.seg_data, block.arr_data = refine_audio(
+            block.seg_data, settings, noise_profile
+        )
+
+    @staticmethod
+    def _light_refine(
+        settings: RefineStageSettings.SubSection,
+    ) -> RefineStageSettings.SubSection:
+        """The settings without the costly effects (for an overloaded host,
+        see `QualityController`)."""
+        pydub_params = settings.pydub
+        if pydub_params is not None:
+            pydub_params = pydub_params.model_copy(update={"normalize": False})
+        return settings.model_copy(
+            update={
+                "pydub": pydub_params,
+                "noisereduce": None,
+                "spectral_gate": None,
+            }
+        )
+
+    def _refine(self, state: State) -> State:
+        settings = app_settings.transcriber.stages.refine
+        noise_profile = self._noise_profile(state)
+        if noise_profile is not None and not noise_profile.is_ready(
+            settings.noise_profile.min_noise_msec
+        ):
+            noise_profile = None
+        blocks = state.to_be_finalized
+        if settings.workers and len(blocks) > 1:
+            arr_datas = refine_in_pool(
+                [block.seg_data for block in blocks],
+                settings.final,
+                noise_profile,
+                settings.workers,
+            )
+            for block, arr_data in zip(blocks, arr_datas):
+                block.arr_data = arr_data
+        else:
+            for block in blocks:
+                self._refine_block(block, settings.final, noise_profile)
+        if not state.ongoing.is_speech:
+            return state
+        settings_ongoing = settings.ongoing
+        if state.quality.level >= QualityLevel.LIGHT_REFINE:
+            settings_ongoing = self._light_refine(settings_ongoing)
+        self._refine_block(state.ongoing, settings_ongoing, noise_profile)
+        return state
+
+    def _apply_whisper(
+        self, block: Block, whisper_params: WhisperSettings, **kwargs
+    ) -> Block:
+        whisper_params = whisper_params.model_dump()
+        whisper_params.update(**kwargs)
+        whisper_output = transcribe(block.arr_data, **whisper_params)
+        block.text = whisper_output["text"]
+        return block
+
+    def _latency_budget(
+        self,
+        state: State,
+        settings: TranscribeStageSettings.OngoingSubSection,
+        window: NpData,
+    ) -> dict:
+        """The `transcribe_mel_cache` options, which bound the decoding of
+        the ongoing block's `window` (see `LatencyBudgetSettings`)."""
+        budget = settings.latency_budget
+        if budget is None:
+            return {}
+        duration_sec = window.pcm_params.frame_count_to_seconds(
+            len(window.frames)
+        )
+        kwargs = {
+            "sample_len": budget.min_tokens
+            + ceil(budget.tokens_per_sec * duration_sec)
+        }
+        temperature = settings.whisper.temperature
+        if state.latency_ratio > budget.max_latency_ratio and isinstance(
+            temperature, tuple
+        ):
+            kwargs["temperature"] = temperature[0]
+        listener = app_settings.listener
+        if listener and state.chunk_received_at is not None:
+            kwargs["deadline"] = (
+                state.chunk_received_at
+                + budget.deadline_ratio * listener.chunk_size_sec
+            )
+        return kwargs
+
+    @staticmethod
+    def _agreement(
+        block: Block, settings: TranscribeStageSettings.OngoingSubSection
+    ) -> LocalAgreement | None:
+        params = settings.local_agreement
+        if params is None:
+            block.agreement = None
+        elif block.agreement is None or block.agreement.window_start > len(
+            block.arr_data.frames
+        ):
+            block.agreement = LocalAgreement(params.hypotheses_count)
+        return block.agreement
+
+    def _transcribe_ongoing(
+        self,
+        state: State,
+        settings: TranscribeStageSettings.OngoingSubSection,
+        model_name: str,
+    ) -> dict:
+        """Transcribes the ongoing block with the model. With
+        `local_agreement`, only the window after the committed words is, and
+        the committed text is the prompt (after the one of the block)."""
+        block = state.ongoing
+        agreement = self._agreement(block, settings)
+        window = block.arr_data
+        initial_prompt = state.ongoing_init_prompt
+        if agreement is not None:
+            window = window._spawn(window.frames[agreement.window_start :])
+            initial_prompt = (
+                initial_prompt or ""
+            ) + agreement.committed_text or None
+        whisper_params = settings.whisper.model_dump()
+        whisper_params.update(
+            model_name=model_name,
+            condition_on_previous_text=False,
+            initial_prompt=initial_prompt,
+            word_timestamps=agreement is not None,
+            **self._latency_budget(state, settings, window),
+        )
+        if settings.mel_cache:
+            n_mels = mel_bins(
+                whisper_params["model_name"], settings.whisper.backend
+            )
+            if block.mel is None or block.mel.n_mels != n_mels:
+                block.mel = MelCache(n_mels)
+            whisper_output = transcribe_mel_cache(
+                window, block.mel, **whisper_params
+            )
+        else:
+            whisper_params.pop("deadline", None)
+            whisper_output = transcribe(window, **whisper_params)
+        if agreement is None:
+            # a decoding, which was too late to begin, has no text
+            if whisper_output["text"] or not whisper_output.get(
+                "deadline_exceeded"
+            ):
+                block.text = whisper_output["text"]
+        else:
+            self._commit_agreed(block, agreement, whisper_output)
+        return whisper_output
 
-        def apply_whisper(
-            block: Block, whisper_params: WhisperSettings, **kwargs
+    @staticmethod
+    def _ongoing_model_name(
+        state: State, settings: TranscribeStageSettings.OngoingSubSection
+    ) -> str:
+        """The model of the ongoing block: a smaller one on the
+        `SMALLER_MODEL` quality level, if it fits in the memory budget
+        beside the models of the stages (and once it's loaded)."""
+        model_name = fitting_model(settings.whisper.model_name)
+        if state.quality.level < QualityLevel.SMALLER_MODEL:
+            return model_name.value
+        smaller = smaller_model(model_name)
+        if smaller == model_name or not model_registry.fits(
+            smaller, settings.whisper.backend, beside_kept=True
         ):
-            whisper_params = whisper_params.model_dump()
-            whisper_params.update(**kwargs)
-            whisper_output = transcribe(block.arr_data, **whisper_params)
+            return model_name.value
+        # it's used once loaded (the first call starts the loading)
+        loading = load_in_background(smaller, settings.whisper.backend)
+        if loading.done() and loading.exception() is None:
+            return smaller.value
+        return model_name.value
+
+    @staticmethod
+    def _commit_agreed(
+        block: Block, agreement: LocalAgreement, whisper_output: dict
+    ) -> None:
+        """Commits the words the hypotheses agree on, and drops their audio
+        from the window (and its spectrogram). A decoding cut short by its
+        deadline isn't a hypothesis (its last words can be cut, or missing),
+        the block's text is kept."""
+        if whisper_output.get("deadline_exceeded"):
+            return
+        offset_sec = agreement.window_start_sec
+        words = [
+            Word(
+                word["word"],
+                word["start"] + offset_sec,
+                word["end"] + offset_sec,
+            )
+            for segment in whisper_output["segments"]
+            for word in segment.get("words", [])
+        ]
+        window_start = agreement.window_start
+        agreement.insert(words)
+        if block.mel is not None and agreement.window_start > window_start:
+            block.mel.trim_front(agreement.window_start - window_start)
+        block.text = agreement.text
+
+    def _apply_whisper_batch(
+        self, blocks: List[Block], whisper_params: WhisperSettings, **kwargs
+    ) -> List[Block]:
+        if len(blocks) == 1:
+            return [self._apply_whisper(blocks[0], whisper_params, **kwargs)]
+        whisper_params = whisper_params.model_dump()
+        whisper_params.update(**kwargs)
+        whisper_outputs = transcribe_batch(
+            [block.arr_data for block in blocks], **whisper_params
+        )
+        for block, whisper_output in zip(blocks, whisper_outputs):
             block.text = whisper_output["text"]
+        return blocks
+
+    def _transcribe(self, state: State) -> State:
+        settings_final = app_settings.transcriber.stages.transcribe.final
+        finalize_func = finalize_now
+        if settings_final.background:
+            finalize_func = finalize_in_background
 
-        for block in state.to_be_finalized:
-            apply_whisper(
-                block, settings_final.whisper, condition_on_previous_text=True
+        blocks = state.to_be_finalized
+        batch_size = settings_final.batch_size
+        for batch_start in range(0, len(blocks), batch_size):
+            finalize = partial(
+                self._apply_whisper_batch,
+                blocks[batch_start : batch_start + batch_size],
+                settings_final.whisper,
+                model_name=fitting_model(settings_final.whisper.model_name),
+                condition_on_previous_text=True,
             )
-            state.finalized.append(block)
+            state.finalizing.append(finalize_func(finalize))
+        state.counters.final += len(blocks)
         state.to_be_finalized = []
+        state.collect_finalized()
 
-        settings_final = app_settings.transcriber.stages.transcribe.ongoing
-        if len(state.finalized) > 0:
-            state.ongoing_init_prompt = state.finalized[-1].text
-
-        apply_whisper(
+        settings_ongoing = app_settings.transcriber.stages.transcribe.ongoing
+        if not state.ongoing.is_speech:  # see `_detect`
+            return state
+        if (
+            state.ongoing.text is not None
+            and not state.quality.should_transcribe_ongoing()
+        ):
+            state.counters.ongoing_throttled += 1
+            return state
+        model_name = self._ongoing_model_name(state, settings_ongoing)
+        if self._is_speech_unchanged(
             state.ongoing,
-            settings_final.whisper,
-            condition_on_previous_text=False,
-            initial_prompt=state.ongoing_init_prompt,
+            state.ongoing_init_prompt,
+            model_name,
+            settings_ongoing,
+        ):
+            state.counters.ongoing_skipped += 1
+            return state
+
+        whisper_output = self._transcribe_ongoing(
+            state, settings_ongoing, model_name
         )
+        state.counters.ongoing += 1
+        if whisper_output.get("deadline_exceeded"):
+            state.counters.ongoing_deadline_exceeded += 1
+            state.ongoing.fingerprint = None  # the text is incomplete
+        else:
+            state.ongoing.fingerprint = self._speech_fingerprint(
+                state.ongoing,
+                state.ongoing_init_prompt,
+                model_name,
+                settings_ongoing,
+            )
 
         return state
+
+    def _speech_fingerprint(
+        self,
+        block: Block,
+        initial_prompt: str | None,
+        model_name: str,
+        settings: TranscribeStageSettings.SubSection,
+        end_msec: int | None = None,
+    ) -> tuple | None:
+        """Describes the speech in the first `end_msec` of the block: its
+        span and energy (taken from the block's loudness profile), and the
+        prompt and the model it's transcribed with. `None` means the block
+        can't be checked (so it's always transcribed)."""
+        skip_params = settings.skip_unchanged
+        if skip_params is None or block.loudness is None:
+            return None
+        if end_msec is None:
+            end_msec = block.loudness.duration_msec
+        span = block.loudness.nonsilent_span(
+            skip_params.window_msec,
+            skip_params.silence_thresh,
+            skip_params.seek_step,
+            end_msec=end_msec,
+        )
+        energy = block.loudness.energy(*span) if span else 0.0
+        return (end_msec, span, energy, initial_prompt, model_name)
+
+    def _is_speech_unchanged(
+        self,
+        block: Block,
+        initial_prompt: str | None,
+        model_name: str,
+        settings: TranscribeStageSettings.SubSection,
+    ) -> bool:
+        """Whether only silence was appended to the block since it was
+        transcribed (so its text can be kept): the transcribed part has the
+        same fingerprint, and the rest of the block has no speech."""
+        if block.fingerprint is None or block.loudness is None:
+            return False
+        transcribed_msec = block.fingerprint[0]
+        if block.loudness.duration_msec < transcribed_msec:
+            return False
+        fingerprint = self._speech_fingerprint(
+            block, initial_prompt, model_name, settings, transcribed_msec
+        )
+        if fingerprint != block.fingerprint:
+            return False
+        skip_params = settings.skip_unchanged
+        tail_span = block.loudness.nonsilent_span(
+            skip_params.window_msec,
+            skip_params.silence_thresh,
+            skip_params.seek_step,
+            start_msec=transcribed_msec,
+        )
+        return tail_span is None
@@ -1,8 +1,13 @@
+from concurrent.futures import Future
+
 from ..state import State
 
 
 class IStrategy:
-    def cold_start(self, state: State):
+    def cold_start(self) -> Future:
+        """Starts loading (and warming up) the models in the background.
+        The `Future` is done, when the strategy is ready to process chunks.
+        """
         raise NotImplementedError
 
     def process_chunk(
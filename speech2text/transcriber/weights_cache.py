@@ -0,0 +1,208 @@
+"""A cache of the whisper models, which is loaded without reading the files.
+
+`whisper.load_model` reads the whole checkpoint, deserializes it, and
+creates the model with randomly initialized weights before copying the
+checkpoint's ones in. The cache keeps every model as a plain set of
+tensors (already cast to the `dtype`, with the alignment heads set), which
+`torch.load` maps into memory (`mmap`): the weights are read from disk only
+when they are used, and the pages are shared with the OS file cache.
+
+The cache is built from the standard whisper checkpoints (they are
+downloaded first, if they aren't on disk yet):
+```
+python -m speech2text.transcriber.weights_cache [model_name ...]
+```
+The models, which aren't in the cache, are loaded by `whisper.load_model`.
+"""
+
+import argparse
+import logging
+from dataclasses import asdict
+from itertools import chain
+from pathlib import Path
+
+import torch
+import whisper  # can take quite some time
+from whisper.model import AudioEncoder, ModelDimensions, TextDecoder
+
+from speech2text.settings import app_settings
+
+logger = logging.getLogger(__name__)
+
+CACHE_FORMAT_VERSION = 1
+DTYPES = {"float32": torch.float32, "float16": torch.float16}
+# `whisper` casts the weights of these layers to the input's dtype
+_CASTABLE_MODULES = (whisper.model.Linear, whisper.model.Conv1d)
+
+
+def cache_dir() -> Path | None:
+    path = app_settings.transcriber.models.weights_cache_dir
+    return None if path is None else Path(path).expanduser()
+
+
+def cache_dtype() -> str:
+    return app_settings.transcriber.models.weights_cache_dtype
+
+
+def _checkpoint_sha256(model_name: str) -> str | None:
+    """The checksum of the standard checkpoint (a part of its URL)."""
+    url = whisper._MODELS.get(model_name)
+    return url.split("/")[-2] if url else None
+
+
+def cache_path(model_name: str, dtype: str, directory: Path) -> Path:
+    return directory / f"{model_name}.{dtype}.pt"
+
+
+def build(model_name: str, directory: Path, dtype: str = "float32") -> Path:
+    """Converts the standard checkpoint of the model to the cache."""
+    model = whisper.load_model(model_name, device="cpu")
+    castable = {
+        f"{module_name}.{name}"
+        for module_name, module in model.named_modules()
+        if isinstance(module, _CASTABLE_MODULES)
+        for name, _ in module.named_parameters(recurse=False)
+    }
+    tensors = {}
+    for name, tensor in chain(model.named_parameters(), model.named_buffers()):
+        tensor = tensor.detach()
+        if tensor.is_sparse:
+            tensor = tensor.to_dense()
+        if name in castable:
+            tensor = tensor.to(DTYPES[dtype])
+        tensors[name] = tensor.contiguous()
+
+    path = cache_path(model_name, dtype, directory)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = path.with_suffix(".tmp")
+    torch.save(
+        {
+            "version": CACHE_FORMAT_VERSION,
+            "checkpoint_sha256": _checkpoint_sha256(model_name),
+            "dims": asdict(model.dims),
+            "tensors": tensors,
+        },
+        temp_path,
+    )
+    temp_path.replace(path)  # the loaders never see a partial file
+    return path
+
+
+def _empty_model(dims: ModelDimensions) -> whisper.Whisper:
+    """A `Whisper` with no weights allocated (on the "meta" device). The
+    same as `Whisper.__init__`, except for the sparse `alignment_heads`,
+    which "meta" tensors don't support (it comes from the cache, too)."""
+    model = whisper.Whisper.__new__(whisper.Whisper)
+    torch.nn.Module.__init__(model)
+    model.dims = dims
+    with torch.device("meta"):
+        model.encoder = AudioEncoder(
+            dims.n_mels,
+            dims.n_audio_ctx,
+            dims.n_audio_state,
+            dims.n_audio_head,
+            dims.n_audio_layer,
+        )
+        model.decoder = TextDecoder(
+            dims.n_vocab,
+            dims.n_text_ctx,
+            dims.n_text_state,
+            dims.n_text_head,
+            dims.n_text_layer,
+        )
+    model.register_buffer("alignment_heads", None, persistent=False)
+    return model
+
+
+def _assign(model: torch.nn.Module, name: str, tensor: torch.Tensor) -> None:
+    module_name, _, attr = name.rpartition(".")
+    module = model.get_submodule(module_name)
+    if attr in module._parameters:
+        module._parameters[attr] = torch.nn.Parameter(
+            tensor, requires_grad=False
+        )
+    elif attr in module._buffers:
+        module._buffers[attr] = tensor
+    else:
+        raise KeyError(f"The model has no tensor {name}")
+
+
+def load(
+    model_name: str,
+    device: torch.device | str,
+    directory: Path | None = None,
+    dtype: str | None = None,
+) -> whisper.Whisper | None:
+    """The model from the cache (`None`, if it's not there, or outdated)."""
+    directory = directory or cache_dir()
+    if directory is None:
+        return None
+    path = cache_path(model_name, dtype or cache_dtype(), directory)
+    if not path.is_file():
+        logger.info(
+            f"{path} isn't built, see `python -m {__name__}` to speed up "
+            "loading the model"
+        )
+        return None
+    cached = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    checkpoint_sha256 = _checkpoint_sha256(model_name)
+    if (
+        cached["version"] != CACHE_FORMAT_VERSION
+        or cached["checkpoint_sha256"] != checkpoint_sha256
+    ):
+        logger.warning(f"{path} is outdated, rebuild it")
+        return None
+
+    model = _empty_model(ModelDimensions(**cached["dims"]))
+    for name, tensor in cached["tensors"].items():
+        if name == "alignment_heads":
+            tensor = tensor.to_sparse()
+        _assign(model, name, tensor)
+    missing = [
+        name
+        for name, tensor in chain(
+            model.named_parameters(), model.named_buffers()
+        )
+        if tensor.is_meta
+    ]
+    if missing:
+        raise KeyError(f"{path} has no tensors {missing}")
+    return model.to(device)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        prog=f"python -m {__name__}",
+        description="Builds the cache of the whisper models.",
+    )
+    parser.add_argument(
+        "model_names",
+        nargs="*",
+        default=sorted(
+            {
+                subsection.whisper.model_name
+                for subsection in (
+                    app_settings.transcriber.stages.transcribe.ongoing,
+                    app_settings.transcriber.stages.transcribe.final,
+                )
+            }
+        ),
+        help="the models named in config.yaml by default",
+    )
+    parser.add_argument("--dtype", choices=DTYPES, default=cache_dtype())
+    parser.add_argument(
+        "--dir",
+        type=Path,
+        default=cache_dir(),
+        help="transcriber.models.weights_cache_dir by default",
+    )
+    args = parser.parse_args(argv)
+    if args.dir is None:
+        parser.error("no --dir, and weights_cache_dir isn't set")
+    for model_name in args.model_names:
+        path = build(model_name, args.dir, args.dtype)
+        print(f"{model_name}: {path} ({path.stat().st_size / 2**20:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
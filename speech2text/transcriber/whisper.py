@@ -1,12 +1,30 @@
-from dataclasses import asdict, dataclass, replace
+import logging
+import math
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field, replace
 from enum import Enum
-from functools import lru_cache
-from typing import Tuple
+from queue import Empty, Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import List, Set, Tuple
 
+import numpy as np
+import torch
 import whisper  # can take quite some time
 from torch.cuda import is_available as is_cuda_available
+from whisper.audio import HOP_LENGTH, N_FRAMES, N_SAMPLES, SAMPLE_RATE
+from whisper.decoding import DecodingTask, LogitFilter
+from whisper.timing import add_word_timestamps
+from whisper.tokenizer import get_tokenizer
 
 from speech2text.audio_data import NpData
+from speech2text.settings import DecodeBatchingSettings, app_settings
+
+from . import weights_cache
+from .mel_cache import MelCache
+
+logger = logging.getLogger(__name__)
 
 
 class ModelName(Enum):
@@ -21,16 +39,317 @@ DEFAULT_WHISPER_MODEL_NAME = (
 )
 
 
-@lru_cache(3)
+# approximate parameter counts (to estimate the memory before loading)
+_PARAMETERS_COUNT = {
+    ModelName.TINY: 39_000_000,
+    ModelName.TINY_EN: 39_000_000,
+    ModelName.SMALL: 244_000_000,
+    ModelName.SMALL_EN: 244_000_000,
+}
+BYTES_IN_MB = 2**20
+
+# the model to fall back on, when the transcription can't keep up
+_SMALLER_MODEL = {
+    ModelName.SMALL: ModelName.TINY,
+    ModelName.SMALL_EN: ModelName.TINY_EN,
+}
+
+
+def smaller_model(model_name: ModelName | str) -> ModelName:
+    """The faster (less accurate) model of the same language(s), or the
+    model itself, if it's the smallest one."""
+    model_name = ModelName(model_name)
+    return _SMALLER_MODEL.get(model_name, model_name)
+
+
+class Backend(Enum):
+    DEFAULT = "default"  # as `whisper.load_model` gives (CUDA if available)
+    CPU_INT8 = "cpu_int8"  # on CPU, the linear layers quantized to int8
+
+
+ModelKey = Tuple[ModelName, Backend]
+
+
+def _model_key(
+    model_name: ModelName | str, backend: Backend | str = Backend.DEFAULT
+) -> ModelKey:
+    return ModelName(model_name), Backend(backend)
+
+
+@dataclass
+class LoadedModel:
+    name: ModelName
+    backend: Backend
+    device: torch.device
+    dtype: torch.dtype
+    size_bytes: int  # of the weights and buffers
+    last_used: float = field(default_factory=monotonic)
+
+
+def _tensors_size_bytes(value) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (tuple, list)):
+        return sum(_tensors_size_bytes(item) for item in value)
+    return 0
+
+
+def _model_size_bytes(model: torch.nn.Module) -> int:
+    # the quantized weights are packed (they aren't parameters anymore),
+    # but they are still in the `state_dict`
+    state_dict = model.state_dict()
+    return sum(_tensors_size_bytes(value) for value in state_dict.values())
+
+
+def _quantize_dynamic_int8(model: whisper.Whisper) -> whisper.Whisper:
+    """Replaces the linear layers (most of the weights and the compute of
+    both the encoder and the decoder) with int8 ones: the weights are
+    quantized once, the activations on the fly."""
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            # `whisper`'s subclass only casts the weights to the input's
+            # dtype (for fp16), which is a no-op on CPU
+            module.__class__ = torch.nn.Linear
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+_torch_threads_configured = False
+
+
+def _configure_torch_threads() -> None:
+    """Applies `transcriber.models.torch_*threads` (once, before the first
+    model is loaded)."""
+    global _torch_threads_configured
+    if _torch_threads_configured:
+        return
+    _torch_threads_configured = True
+    settings = app_settings.transcriber.models
+    if settings.torch_threads:
+        torch.set_num_threads(settings.torch_threads)
+    if settings.torch_interop_threads:
+        try:
+            torch.set_num_interop_threads(settings.torch_interop_threads)
+        except RuntimeError:  # some parallel work has been started already
+            logger.warning("Can't change the amount of inter-op threads")
+
+
+class ModelRegistry:
+    """Keeps the loaded whisper models (one instance per name and backend,
+    shared by all the stages and workflows).
+
+    The models are loaded one by one in a background thread (on the first
+    request), so importing the module or creating a `Workflow` doesn't
+    block. If `transcriber.models.memory_budget_mb` is set, the least
+    recently used models are unloaded to fit a new one in (except for the
+    ones decoding at the moment, and the ones to `keep`); they are loaded
+    again when requested.
+    """
+
+    def __init__(self) -> None:
+        self._loader = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="model-loader"
+        )
+        self._futures: dict[ModelKey, Future] = {}
+        self._loaded: dict[ModelKey, LoadedModel] = {}
+        self._kept: Set[ModelKey] = set()
+        self._over_budget_warned = False
+        self._lock = Lock()
+
+    @staticmethod
+    def budget_bytes() -> int | None:
+        budget_mb = app_settings.transcriber.models.memory_budget_mb
+        return None if budget_mb is None else budget_mb * BYTES_IN_MB
+
+    @staticmethod
+    def estimate_size_bytes(model_name: ModelName | str) -> int:
+        """The memory a model takes (float32 weights), before it's loaded
+        (the quantized ones are loaded as float32 first, too)."""
+        return _PARAMETERS_COUNT[ModelName(model_name)] * 4
+
+    def fits(
+        self,
+        model_name: ModelName | str,
+        backend: Backend | str = Backend.DEFAULT,
+        beside_kept: bool = False,
+    ) -> bool:
+        """Whether the model fits in the budget (if nothing else is loaded,
+        or, `beside_kept`, only the models to `keep`)."""
+        budget = self.budget_bytes()
+        if budget is None:
+            return True
+        size_bytes = self.estimate_size_bytes(model_name)
+        if beside_kept:
+            key = _model_key(model_name, backend)
+            with self._lock:
+                kept = [other for other in self._kept if other != key]
+            size_bytes += sum(
+                self.estimate_size_bytes(name) for name, _ in kept
+            )
+        return size_bytes <= budget
+
+    def keep(
+        self,
+        model_name: ModelName | str,
+        backend: Backend | str = Backend.DEFAULT,
+    ) -> None:
+        """The model is never unloaded to fit another one in (a stage needs
+        it all the time)."""
+        with self._lock:
+            self._kept.add(_model_key(model_name, backend))
+
+    def load_in_background(
+        self,
+        model_name: ModelName | str,
+        backend: Backend | str = Backend.DEFAULT,
+    ) -> Future:
+        """Starts loading the model (if it's not loaded or being loaded yet).
+        The `Future` is done, when the model is ready."""
+        key = _model_key(model_name, backend)
+        with self._lock:
+            if key not in self._futures:
+                self._futures[key] = self._loader.submit(self._load, key)
+            return self._futures[key]
+
+    def get(
+        self,
+        model_name: ModelName | str,
+        backend: Backend | str = Backend.DEFAULT,
+    ) -> whisper.Whisper:
+        """The loaded model (waits for it, if it's still being loaded)."""
+        key = _model_key(model_name, backend)
+        model = self.load_in_background(*key).result()
+        with self._lock:
+            if key in self._loaded:
+                self._loaded[key].last_used = monotonic()
+        return model
+
+    def _load(self, key: ModelKey) -> whisper.Whisper:
+        _configure_torch_threads()
+        model_name, backend = key
+        self._make_room(self.estimate_size_bytes(model_name), key)
+        device = "cpu"
+        if backend == Backend.DEFAULT and is_cuda_available():
+            device = "cuda"
+        model = weights_cache.load(model_name.value, device)
+        if model is None:
+            model = whisper.load_model(
+                model_name.value, device=device, in_memory=True
+            )
+        if backend == Backend.CPU_INT8:
+            # the float16 cache is for CUDA, the int8 layers take float32
+            model = _quantize_dynamic_int8(model.float())
+        parameter = next(model.parameters())
+        with self._lock:
+            self._loaded[key] = LoadedModel(
+                model_name,
+                backend,
+                parameter.device,
+                (
+                    torch.qint8
+                    if backend == Backend.CPU_INT8
+                    else parameter.dtype
+                ),
+                _model_size_bytes(model),
+            )
+        self._make_room(0, key)  # the estimate could be too low
+        return model
+
+    def _make_room(self, size_bytes: int, keep: ModelKey) -> None:
+        budget = self.budget_bytes()
+        if budget is None:
+            return
+        with self._lock:
+            used = sum(info.size_bytes for info in self._loaded.values())
+            by_last_use = sorted(
+                self._loaded.items(), key=lambda item: item[1].last_used
+            )
+            for key, info in by_last_use:
+                if used + size_bytes <= budget:
+                    break
+                if key == keep or key in self._kept:
+                    continue
+                if _model_lock(*key).locked():
+                    continue
+                self._unload(key)
+                used -= info.size_bytes
+            if used + size_bytes <= budget or self._over_budget_warned:
+                return
+            self._over_budget_warned = True
+        logger.warning(
+            f"The whisper models take {used + size_bytes} bytes, "
+            f"which exceeds the budget of {budget} bytes"
+        )
+
+    def _unload(self, key: ModelKey) -> None:
+        self._loaded.pop(key, None)
+        self._futures.pop(key, None)
+        if is_cuda_available():
+            torch.cuda.empty_cache()
+
+    def unload(
+        self,
+        model_name: ModelName | str,
+        backend: Backend | str = Backend.DEFAULT,
+    ) -> None:
+        """Forgets the model (it's freed as soon as nobody uses it)."""
+        key = _model_key(model_name, backend)
+        with self._lock:
+            if key in self._loaded:
+                self._unload(key)
+
+    def loaded(self) -> List[LoadedModel]:
+        """The models loaded at the moment (the least recently used first)."""
+        with self._lock:
+            return sorted(
+                (replace(info) for info in self._loaded.values()),
+                key=lambda info: info.last_used,
+            )
+
+    @property
+    def used_bytes(self) -> int:
+        with self._lock:
+            return sum(info.size_bytes for info in self._loaded.values())
+
+
+model_registry = ModelRegistry()
+
+
+def load_in_background(
+    model_name: ModelName | str = DEFAULT_WHISPER_MODEL_NAME,
+    backend: Backend | str = Backend.DEFAULT,
+) -> Future:
+    return model_registry.load_in_background(model_name, backend)
+
+
+def fitting_model(model_name: ModelName | str) -> ModelName:
+    """The model itself, or the largest smaller one, which fits in the
+    memory budget (the smallest one, if none does)."""
+    model_name = ModelName(model_name)
+    while not model_registry.fits(model_name):
+        if smaller_model(model_name) == model_name:
+            break
+        model_name = smaller_model(model_name)
+    return model_name
+
+
 def _pick_whisper_model(
     model_name: ModelName | str = DEFAULT_WHISPER_MODEL_NAME,
-):
-    if isinstance(model_name, str):
-        model_name = ModelName(model_name)
-    return whisper.load_model(model_name.value, in_memory=True)
+    backend: Backend | str = Backend.DEFAULT,
+) -> whisper.Whisper:
+    return model_registry.get(model_name, backend)
+
 
+_MODEL_LOCKS: defaultdict[ModelKey, Lock] = defaultdict(Lock)
 
-_pick_whisper_model()  # cold start overcoming
+
+def _model_lock(
+    model_name: ModelName | str, backend: Backend | str = Backend.DEFAULT
+) -> Lock:
+    """The same model can't decode two inputs at once (`whisper` installs
+    kv-cache hooks on the model), but different models can."""
+    return _MODEL_LOCKS[_model_key(model_name, backend)]
 
 
 @dataclass(frozen=True)
@@ -66,13 +385,562 @@ DEFAULT_TRANSCRIPTION_PARAMETERS = TranscriptionParameters(
 def transcribe(
     np_data: NpData,
     model_name: ModelName | str = DEFAULT_WHISPER_MODEL_NAME,
+    backend: Backend | str = Backend.DEFAULT,
     # params: TranscriptionParameters = DEFAULT_TRANSCRIPTION_PARAMETERS,
     **kwargs,
 ) -> dict[str, str | list]:
     # if not isinstance(model_name, ModelName):
     #     model_name = ModelName(model_name)
-    return _pick_whisper_model(model_name).transcribe(
-        np_data._data,
-        **kwargs,
-        # **params.as_dict(),
+    model = _pick_whisper_model(model_name, backend)
+    with _model_lock(model_name, backend):
+        return model.transcribe(
+            np_data._data,
+            **kwargs,
+            # **params.as_dict(),
+        )
+
+
+def _avg_logprob(result: whisper.DecodingResult) -> float:
+    """`avg_logprob`, which is -inf instead of NaN (all the logits of
+    a step were -inf)."""
+    if math.isnan(result.avg_logprob):
+        return -math.inf
+    return result.avg_logprob
+
+
+def _is_acceptable(
+    result: whisper.DecodingResult,
+    compression_ratio_threshold: float | None,
+    logprob_threshold: float | None,
+    no_speech_threshold: float | None,
+) -> bool:
+    """The same checks `whisper.transcribe` does before falling back to
+    a higher temperature (a NaN `avg_logprob` is never acceptable)."""
+    if math.isnan(result.avg_logprob):
+        return False
+    needs_fallback = (
+        compression_ratio_threshold is not None
+        and result.compression_ratio > compression_ratio_threshold
+    ) or (
+        logprob_threshold is not None
+        and result.avg_logprob < logprob_threshold
+    )
+    if (
+        no_speech_threshold is not None
+        and result.no_speech_prob > no_speech_threshold
+        and logprob_threshold is not None
+        and result.avg_logprob < logprob_threshold
+    ):
+        needs_fallback = False  # silence (whatever its compression ratio)
+    return not needs_fallback
+
+
+def _is_silence(
+    result: whisper.DecodingResult,
+    logprob_threshold: float | None,
+    no_speech_threshold: float | None,
+) -> bool:
+    if no_speech_threshold is None:
+        return False
+    if (
+        logprob_threshold is not None
+        and result.avg_logprob > logprob_threshold
+    ):
+        return False
+    return result.no_speech_prob > no_speech_threshold
+
+
+def _temperatures(temperature: float | Tuple[float, ...]) -> Tuple[float, ...]:
+    if isinstance(temperature, (int, float)):
+        return (temperature,)
+    return tuple(temperature)
+
+
+def _decoding_options(
+    model: whisper.Whisper,
+    temperature: float,
+    initial_prompt: str | None,
+    sample_len: int | None = None,
+) -> whisper.DecodingOptions:
+    if sample_len is not None:
+        sample_len = min(sample_len, model.dims.n_text_ctx // 2)
+    return whisper.DecodingOptions(
+        language=None if model.is_multilingual else "en",
+        temperature=temperature,
+        sample_len=sample_len,
+        prompt=initial_prompt,
+        without_timestamps=True,
+        fp16=model.device != torch.device("cpu"),
+    )
+
+
+class _DeadlineFilter(LogitFilter):
+    """Ends the text once the `deadline` (`time.monotonic()`) passes: the
+    end-of-text token is the only one left, so the tokens decoded so far
+    make up the result. The first token (after `sample_begin`) is always
+    decoded: whisper can't rank an empty text."""
+
+    def __init__(
+        self, deadline: float, eot: int, sample_begin: int = 0
+    ) -> None:
+        self.deadline = deadline
+        self.eot = eot
+        self.sample_begin = sample_begin
+        self.exceeded = False
+
+    def apply(self, logits: torch.Tensor, tokens: torch.Tensor) -> None:
+        if monotonic() < self.deadline:
+            return
+        self.exceeded = True
+        if tokens.shape[-1] <= self.sample_begin:
+            return
+        # the end-of-text logit can be -inf already (`SuppressBlank` at the
+        # first step), so it's set rather than kept
+        logits[:] = -np.inf
+        logits[:, self.eot] = 0.0
+
+
+def _empty_result(
+    mel: torch.Tensor, options: whisper.DecodingOptions
+) -> whisper.DecodingResult:
+    """The result of a decoding, which is late before it starts: no text,
+    as if the end-of-text came first (with the probability of 1)."""
+    return whisper.DecodingResult(
+        audio_features=mel,
+        language=options.language or "en",
+        tokens=[],
+        text="",
+        avg_logprob=0.0,
+        no_speech_prob=0.0,
+        temperature=options.temperature,
+        compression_ratio=0.0,
     )
+
+
+@torch.no_grad()
+def _decode_until(
+    model: whisper.Whisper,
+    mel: torch.Tensor,
+    options: whisper.DecodingOptions,
+    deadline: float | None,
+) -> Tuple[whisper.DecodingResult, bool]:
+    """`model.decode` of a single mel, which stops at the `deadline`.
+    Returns whether the deadline was exceeded, too."""
+    if deadline is None:
+        return model.decode(mel, options), False
+    if monotonic() >= deadline:
+        return _empty_result(mel, options), True
+    task = DecodingTask(model, options)
+    deadline_filter = _DeadlineFilter(
+        deadline, task.tokenizer.eot, task.sample_begin
+    )
+    task.logit_filters.append(deadline_filter)
+    (result,) = task.run(mel.unsqueeze(0))
+    return result, deadline_filter.exceeded
+
+
+class _RowFilters(LogitFilter):
+    """Applies a filter of its own (if any) to every row of the batch."""
+
+    def __init__(self, filters: List[LogitFilter | None]) -> None:
+        self.filters = filters
+
+    def apply(self, logits: torch.Tensor, tokens: torch.Tensor) -> None:
+        for row, logit_filter in enumerate(self.filters):
+            if logit_filter is not None:
+                logit_filter.apply(
+                    logits[row : row + 1], tokens[row : row + 1]
+                )
+
+
+@torch.no_grad()
+def _decode_together(
+    model: whisper.Whisper,
+    mels: List[torch.Tensor],
+    options: List[whisper.DecodingOptions],
+    deadlines: List[float | None],
+) -> List[Tuple[whisper.DecodingResult, bool]]:
+    """`_decode_until` of several mels at once: the encoder runs once for
+    them all, and the decoder once per the same `options` (the rows of a
+    decoder pass share the prompt). The rows late already aren't decoded."""
+    results = [None] * len(mels)
+    now = monotonic()
+    for row, deadline in enumerate(deadlines):
+        if deadline is not None and now >= deadline:
+            results[row] = _empty_result(mels[row], options[row]), True
+    rows = [row for row, result in enumerate(results) if result is None]
+    if not rows:
+        return results
+    mel = torch.stack([mels[row] for row in rows])
+    if options[0].fp16:
+        mel = mel.half()
+    audio_features = dict(zip(rows, model.embed_audio(mel)))
+    rows_by_options = defaultdict(list)
+    for row in rows:
+        rows_by_options[options[row]].append(row)
+    for row_options, option_rows in rows_by_options.items():
+        task = DecodingTask(model, row_options)
+        deadline_filters = [
+            (
+                None
+                if deadlines[row] is None
+                else _DeadlineFilter(
+                    deadlines[row], task.tokenizer.eot, task.sample_begin
+                )
+            )
+            for row in option_rows
+        ]
+        task.logit_filters.append(_RowFilters(deadline_filters))
+        decoded = task.run(
+            torch.stack([audio_features[row] for row in option_rows])
+        )
+        for row, result, deadline_filter in zip(
+            option_rows, decoded, deadline_filters
+        ):
+            exceeded = deadline_filter is not None and deadline_filter.exceeded
+            results[row] = result, exceeded
+    return results
+
+
+@dataclass
+class _DecodeRequest:
+    key: ModelKey
+    mel: torch.Tensor
+    options: whisper.DecodingOptions
+    deadline: float | None
+    future: Future = field(default_factory=Future)
+
+
+class DecodeBatcher:
+    """Decodes the ongoing blocks of several streams together (the streams
+    are processed in threads of their own, see `speech2text/server.py`).
+
+    The decodes, which come within `batching.window_msec` of the first one,
+    make up a batch (see `_decode_together`). The window closes early, once
+    every stream has come: the streams are counted by `add_stream` and
+    `remove_stream`, and a single stream is decoded right away, in its own
+    thread (as without `batching`).
+    """
+
+    def __init__(self) -> None:
+        self._requests: Queue[_DecodeRequest] = Queue()
+        self._thread: Thread | None = None
+        self._lock = Lock()
+        self._streams = 0
+        self.batches_count = 0
+        self.decodes_count = 0  # in the batches
+
+    @staticmethod
+    def settings() -> DecodeBatchingSettings | None:
+        return app_settings.transcriber.stages.transcribe.ongoing.batching
+
+    def add_stream(self) -> None:
+        with self._lock:
+            self._streams += 1
+
+    def remove_stream(self) -> None:
+        with self._lock:
+            self._streams -= 1
+
+    @property
+    def streams_count(self) -> int:
+        return self._streams
+
+    @property
+    def mean_batch_size(self) -> float:
+        return (
+            self.decodes_count / self.batches_count
+            if self.batches_count
+            else 0.0
+        )
+
+    def decode(
+        self,
+        model_name: ModelName | str,
+        backend: Backend | str,
+        mel: torch.Tensor,
+        options: whisper.DecodingOptions,
+        deadline: float | None,
+    ) -> Tuple[whisper.DecodingResult, bool]:
+        """`_decode_until`, batched with the decodes of the other streams."""
+        if self.settings() is None or self._streams < 2:
+            model = _pick_whisper_model(model_name, backend)
+            with _model_lock(model_name, backend):
+                return _decode_until(model, mel, options, deadline)
+        request = _DecodeRequest(
+            _model_key(model_name, backend), mel, options, deadline
+        )
+        with self._lock:
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="decode-batcher", daemon=True
+                )
+                self._thread.start()
+        self._requests.put(request)
+        return request.future.result()
+
+    def _next_batch(self) -> List[_DecodeRequest]:
+        batch = [self._requests.get()]
+        settings = self.settings()
+        if settings is None:
+            return batch
+        closes_at = monotonic() + settings.window_msec / 1000
+        while len(batch) < min(settings.max_batch_size, self._streams):
+            try:
+                batch.append(
+                    self._requests.get(timeout=max(closes_at - monotonic(), 0))
+                )
+            except Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            self.batches_count += 1
+            self.decodes_count += len(batch)
+            by_key = defaultdict(list)
+            for request in batch:
+                by_key[request.key].append(request)
+            for (model_name, backend), requests in by_key.items():
+                try:
+                    model = _pick_whisper_model(model_name, backend)
+                    with _model_lock(model_name, backend):
+                        results = _decode_together(
+                            model,
+                            [request.mel for request in requests],
+                            [request.options for request in requests],
+                            [request.deadline for request in requests],
+                        )
+                except Exception as error:
+                    for request in requests:
+                        request.future.set_exception(error)
+                    continue
+                for request, result in zip(requests, results):
+                    request.future.set_result(result)
+
+
+decode_batcher = DecodeBatcher()
+
+
+def _decoded_output(
+    model: whisper.Whisper,
+    result: whisper.DecodingResult,
+    logprob_threshold: float | None,
+    no_speech_threshold: float | None,
+) -> dict[str, str | list]:
+    text = ""
+    if not _is_silence(result, logprob_threshold, no_speech_threshold):
+        tokenizer = get_tokenizer(
+            model.is_multilingual,
+            num_languages=model.num_languages,
+            language=result.language,
+        )
+        text = tokenizer.decode(
+            [token for token in result.tokens if token < tokenizer.eot]
+        )
+    return {"text": text, "segments": [], "language": result.language}
+
+
+def _word_timestamps(
+    model: whisper.Whisper,
+    result: whisper.DecodingResult,
+    mel: torch.Tensor,
+    num_frames: int,
+) -> List[dict]:
+    """The decoded text as a single segment with its `"words"` (the same
+    way `whisper.transcribe` aligns them, with the cross-attention)."""
+    tokenizer = get_tokenizer(
+        model.is_multilingual,
+        num_languages=model.num_languages,
+        language=result.language,
+    )
+    segment = {
+        "seek": 0,
+        "start": 0.0,
+        "end": num_frames * HOP_LENGTH / SAMPLE_RATE,
+        "text": result.text,
+        "tokens": result.tokens,
+    }
+    add_word_timestamps(
+        segments=[segment],
+        model=model,
+        tokenizer=tokenizer,
+        mel=mel,
+        num_frames=num_frames,
+        last_speech_timestamp=0.0,
+    )
+    return [segment]
+
+
+def mel_bins(
+    model_name: ModelName | str = DEFAULT_WHISPER_MODEL_NAME,
+    backend: Backend | str = Backend.DEFAULT,
+) -> int:
+    """The `n_mels` of the log-mel spectrograms the model takes."""
+    return _pick_whisper_model(model_name, backend).dims.n_mels
+
+
+def transcribe_mel_cache(
+    np_data: NpData,
+    mel_cache: MelCache,
+    model_name: ModelName | str = DEFAULT_WHISPER_MODEL_NAME,
+    backend: Backend | str = Backend.DEFAULT,
+    temperature: float | Tuple[float, ...] = 0.0,
+    compression_ratio_threshold: float | None = 2.4,
+    logprob_threshold: float | None = -1.0,
+    no_speech_threshold: float | None = 0.6,
+    sample_len: int | None = None,
+    deadline: float | None = None,
+    **kwargs,
+) -> dict[str, str | list]:
+    """Transcribes a (growing) block, which has its log-mel spectrogram
+    cached in `mel_cache`: the cache is updated with the new samples only,
+    and the spectrogram is decoded straight away (falling back to the next
+    `temperature` the same way `whisper.transcribe` does).
+
+    The decoding can be bounded: by the amount of tokens (`sample_len`) and
+    by the `deadline` (`time.monotonic()`). After the deadline the text is
+    ended, and no more temperatures are tried: the best result so far (by
+    `avg_logprob`) is returned, and `"deadline_exceeded"` is set.
+
+    The decodes of several streams can be batched (see `DecodeBatcher`).
+    The block is transcribed with `transcribe` instead (without the
+    `deadline`), if it's longer than 30 sec. The result has no `"segments"`
+    (see `transcribe_batch`), unless `word_timestamps` are requested: then
+    the text is a single segment with its `"words"`."""
+    if len(np_data._data) > N_SAMPLES:
+        return transcribe(
+            np_data,
+            model_name,
+            backend,
+            temperature=temperature,
+            compression_ratio_threshold=compression_ratio_threshold,
+            logprob_threshold=logprob_threshold,
+            no_speech_threshold=no_speech_threshold,
+            sample_len=sample_len,
+            **kwargs,
+        )
+    model = _pick_whisper_model(model_name, backend)
+    if mel_cache.n_mels != model.dims.n_mels:
+        raise ValueError(
+            f"The model takes {model.dims.n_mels} mel bins, "
+            f"not {mel_cache.n_mels}"
+        )
+    mel_cache.update(np_data._data)
+    mel = mel_cache.mel().to(model.device)
+    results = []
+    deadline_exceeded = False
+    for temp in _temperatures(temperature):
+        options = _decoding_options(
+            model, temp, kwargs.get("initial_prompt"), sample_len
+        )
+        result, deadline_exceeded = decode_batcher.decode(
+            model_name, backend, mel, options, deadline
+        )
+        results.append(result)
+        if _is_acceptable(
+            result,
+            compression_ratio_threshold,
+            logprob_threshold,
+            no_speech_threshold,
+        ):
+            break
+        if deadline is not None and monotonic() >= deadline:
+            deadline_exceeded = True
+            result = max(results, key=_avg_logprob)
+            break
+    output = _decoded_output(
+        model, result, logprob_threshold, no_speech_threshold
+    )
+    if kwargs.get("word_timestamps") and output["text"]:
+        with _model_lock(model_name, backend):
+            output["segments"] = _word_timestamps(
+                model, result, mel, mel_cache.samples_count // HOP_LENGTH
+            )
+    output["deadline_exceeded"] = deadline_exceeded
+    return output
+
+
+def transcribe_batch(
+    np_datas: List[NpData],
+    model_name: ModelName | str = DEFAULT_WHISPER_MODEL_NAME,
+    backend: Backend | str = Backend.DEFAULT,
+    temperature: float | Tuple[float, ...] = 0.0,
+    compression_ratio_threshold: float | None = 2.4,
+    logprob_threshold: float | None = -1.0,
+    no_speech_threshold: float | None = 0.6,
+    **kwargs,
+) -> List[dict[str, str | list]]:
+    """Transcribes several audio blocks at once: their log-mel spectrograms
+    are stacked into a single batch, which goes through the encoder and the
+    greedy decoder together (instead of running them for every block).
+
+    Every block is transcribed with `transcribe` instead, if:
+    - it's longer than 30 sec (whisper's window), or
+    - its greedy result fails the checks `whisper.transcribe` does (then
+    it's decoded again with the rest of the `temperature`s), or
+    - the options require the timestamps (`word_timestamps`), or the first
+    temperature is not 0
+
+    The result has the same `"text"` as `whisper.transcribe` gives, but no
+    `"segments"`."""
+    temperatures = _temperatures(temperature)
+    fallback_kwargs = dict(
+        kwargs,
+        temperature=temperatures,
+        compression_ratio_threshold=compression_ratio_threshold,
+        logprob_threshold=logprob_threshold,
+        no_speech_threshold=no_speech_threshold,
+    )
+    results = [None] * len(np_datas)
+    batch = [
+        i
+        for i, np_data in enumerate(np_datas)
+        if len(np_data._data) <= N_SAMPLES
+    ]
+    if kwargs.get("word_timestamps") or temperatures[0] != 0:
+        batch = []
+
+    decoded_greedily = set()
+    if batch:
+        model = _pick_whisper_model(model_name, backend)
+        mel = torch.stack(
+            [
+                whisper.pad_or_trim(
+                    whisper.log_mel_spectrogram(
+                        np.asarray(np_datas[i]._data, np.float32),
+                        model.dims.n_mels,
+                    ),
+                    N_FRAMES,
+                )
+                for i in batch
+            ]
+        ).to(model.device)
+        options = _decoding_options(model, 0.0, kwargs.get("initial_prompt"))
+        with _model_lock(model_name, backend):
+            decoded = model.decode(mel, options)
+        for i, result in zip(batch, decoded):
+            decoded_greedily.add(i)
+            if not _is_acceptable(
+                result,
+                compression_ratio_threshold,
+                logprob_threshold,
+                no_speech_threshold,
+            ):
+                continue
+            results[i] = _decoded_output(
+                model, result, logprob_threshold, no_speech_threshold
+            )
+
+    for i, np_data in enumerate(np_datas):
+        if results[i] is not None:
+            continue
+        if i in decoded_greedily and len(temperatures) > 1:
+            fallback_kwargs["temperature"] = temperatures[1:]
+        else:
+            fallback_kwargs["temperature"] = temperatures
+        results[i] = transcribe(
+            np_data, model_name, backend, **fallback_kwargs
+        )
+    return results
@@ -1,12 +1,21 @@
+from concurrent.futures import Future, wait
 from typing import List
 
-from speech2text.audio_data import WHISPER_PCM_PARAMS, PcmParams
+from speech2text.audio_data import WHISPER_PCM_PARAMS, PcmConverter, PcmParams
 
-from .state import State
+from .state import State, TranscriptionCounters
 from .strategy import DEFAULT_STRATEGY, IStrategy
 
 
 class Workflow:
+    """Transcribes a stream of PCM-encoded chunks.
+
+    The models are loaded in the background, so a `Workflow` accepts chunks
+    right away: until it's ready, they are only buffered, and then processed
+    at once. The readiness can be checked (`is_ready`), waited for
+    (`wait_until_ready`) or awaited (`await asyncio.wrap_future(wf.ready)`).
+    """
+
     def __init__(
         self,
         *,
@@ -14,19 +23,64 @@ class Workflow:
         input_pcm_params: PcmParams = WHISPER_PCM_PARAMS,
     ) -> None:
         self.strategy = strategy
-        self.strategy.cold_start()
-        self.state = State(input_pcm_params)
+        self._ready = self.strategy.cold_start()
+        self._pending_chunks: List[bytes] = []  # received before it's ready
+        self.input_pcm_params = input_pcm_params
+        # the chunks are converted to `WHISPER_PCM_PARAMS` once, on arrival
+        self._converter = None
+        if input_pcm_params != WHISPER_PCM_PARAMS:
+            self._converter = PcmConverter(
+                input_pcm_params, WHISPER_PCM_PARAMS
+            )
+        self.state = State(WHISPER_PCM_PARAMS)
 
     def process_chunk(
         self,
-        chunk: bytes | bytearray,
+        chunk: bytes | bytearray | memoryview,
         latency_ratio: float = 0.0,
     ):
+        """The `chunk` is used only during the call (it can be a view of a
+        buffer, which is reused afterwards)."""
+        if self._converter:
+            chunk = self._converter.convert(chunk)
+        if not self.is_ready:
+            self._pending_chunks.append(bytes(chunk))
+            return
+        if self._pending_chunks:
+            self._ready.result()  # raises, if the models failed to load
+            self._pending_chunks.append(bytes(chunk))
+            chunk = b"".join(self._pending_chunks)
+            self._pending_chunks = []
         self.state = self.strategy.process_chunk(
             self.state, chunk, latency_ratio
         )
 
-    def get_finalized_text(self, flush_blocks=False) -> List[str]:
+    @property
+    def ready(self) -> Future:
+        """Done, when the models are loaded and warmed up."""
+        return self._ready
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.done()
+
+    def wait_until_ready(self, timeout: float | None = None) -> bool:
+        """Blocks until the models are loaded (or the `timeout`, in seconds,
+        expires). Raises the exception, if the loading failed."""
+        done, _ = wait([self._ready], timeout)
+        if done:
+            self._ready.result()
+        return bool(done)
+
+    @property
+    def pending_chunks_count(self) -> int:
+        """How many chunks are buffered, waiting for the models."""
+        return len(self._pending_chunks)
+
+    def get_finalized_text(self, flush_blocks=False, wait=False) -> List[str]:
+        """The lines finalized so far (the blocks still being transcribed in
+        the background are not included, unless `wait` is set)."""
+        self.state.collect_finalized(wait)
         lines = [block.text for block in self.state.finalized]
         if flush_blocks and self.state.finalized:
             self.state.finalized = []
@@ -34,3 +88,13 @@ class Workflow:
 
     def get_ongoing_text(self) -> str:
         return self.state.ongoing.text or ""
+
+    @property
+    def finalizing_count(self) -> int:
+        """How many blocks are still being transcribed in the background."""
+        return len(self.state.finalizing)
+
+    @property
+    def counters(self) -> TranscriptionCounters:
+        """How many times whisper was called / skipped so far."""
+        return self.state.counters
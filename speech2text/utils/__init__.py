@@ -1,3 +1,4 @@
+from .ring_buffer import SharedRingBuffer
 from .tick import Ticker
 
-__all__ = ["Ticker"]
+__all__ = ["SharedRingBuffer", "Ticker"]
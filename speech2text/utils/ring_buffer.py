@@ -0,0 +1,159 @@
+"""`SharedRingBuffer` passes the chunks of a stream from one process to
+another (a single producer and a single consumer) through shared memory.
+The producer writes a chunk right into a slot of the buffer, and the
+consumer gets it as a `memoryview` of that slot: no chunk is pickled or
+copied on the way.
+```
+ring = SharedRingBuffer(slot_size=chunk_size_bytes, slots_count=16)
+# the producer process:
+ring.put(chunk)  # `False`: the ring is full, the chunk is dropped
+# the consumer process:
+chunk, sent_at = ring.get(timeout=1.0)  # `None`, if there was no chunk
+...  # `chunk` is valid until `release`
+ring.release()
+```
+
+Every slot keeps the length of its chunk and the `time.monotonic()` it was
+put at. The producer moves only `write_index`, and the consumer moves only
+`read_index` (both count the chunks from the start). The producer rings a
+doorbell (a pipe) for every chunk put, which wakes the consumer up: `get`
+waits on it, and an event loop can watch its `fileno()`.
+
+The producer never waits: if the consumer is behind by all the slots, the
+new chunk is dropped (an overrun), and `overruns` counts them.
+"""
+
+import os
+import time
+from multiprocessing import Pipe
+from multiprocessing.shared_memory import SharedMemory
+from typing import Tuple
+
+import numpy as np
+
+_HEADER = np.dtype(
+    [("write_index", "<u8"), ("read_index", "<u8"), ("overruns", "<u8")]
+)
+_SLOT = np.dtype([("length", "<u8"), ("sent_at", "<f8")])
+
+
+class SharedRingBuffer:
+    def __init__(self, slot_size: int, slots_count: int) -> None:
+        self.slot_size = slot_size
+        self.slots_count = slots_count
+        self._shared = SharedMemory(create=True, size=self._size())
+        self._owner_pid = os.getpid()  # a forked process isn't the owner
+        # a message per chunk put
+        self._doorbell, self._doorbell_writer = Pipe(duplex=False)
+        self._map()
+        self._header["write_index"] = 0
+        self._header["read_index"] = 0
+        self._header["overruns"] = 0
+
+    def _size(self) -> int:
+        return (
+            _HEADER.itemsize
+            + (_SLOT.itemsize + self.slot_size) * self.slots_count
+        )
+
+    def _map(self) -> None:
+        buf = self._shared.buf
+        self._header = np.ndarray((), _HEADER, buf)
+        self._slots = np.ndarray(
+            (self.slots_count,), _SLOT, buf, offset=_HEADER.itemsize
+        )
+        data_offset = _HEADER.itemsize + _SLOT.itemsize * self.slots_count
+        self._data = buf[data_offset : self._size()]
+        self._held: memoryview | None = None
+
+    def __getstate__(self) -> dict:
+        """Another process attaches to the same shared memory (a ring can
+        be passed to a `Process` only on its start, as the pipe)."""
+        return {
+            "name": self._shared.name,
+            "slot_size": self.slot_size,
+            "slots_count": self.slots_count,
+            "doorbell": self._doorbell,
+            "doorbell_writer": self._doorbell_writer,
+        }
+
+    def __setstate__(self, state: dict) -> None:
+        self.slot_size = state["slot_size"]
+        self.slots_count = state["slots_count"]
+        self._shared = SharedMemory(state["name"])
+        self._owner_pid = None
+        self._doorbell = state["doorbell"]
+        self._doorbell_writer = state["doorbell_writer"]
+        self._map()
+
+    @property
+    def overruns(self) -> int:
+        """How many chunks were dropped, because the ring was full."""
+        return int(self._header["overruns"])
+
+    @property
+    def pending_count(self) -> int:
+        """How many chunks are put, but not released yet."""
+        return int(self._header["write_index"] - self._header["read_index"])
+
+    def _slot_data(self, index: int) -> memoryview:
+        start = index % self.slots_count * self.slot_size
+        return self._data[start : start + self.slot_size]
+
+    def put(self, chunk: bytes | bytearray | memoryview) -> bool:
+        """Copies the chunk to the next slot (in the producer)."""
+        chunk = memoryview(chunk).cast("B")
+        if len(chunk) > self.slot_size:
+            raise ValueError(
+                f"The chunk is {len(chunk)} bytes, the slots are "
+                f"{self.slot_size}"
+            )
+        write_index = int(self._header["write_index"])
+        if write_index - int(self._header["read_index"]) >= self.slots_count:
+            self._header["overruns"] += 1
+            return False
+        self._slot_data(write_index)[: len(chunk)] = chunk
+        slot = self._slots[write_index % self.slots_count]
+        slot["length"] = len(chunk)
+        slot["sent_at"] = time.monotonic()
+        # the chunk is complete, before the consumer can see it
+        self._header["write_index"] = write_index + 1
+        self._doorbell_writer.send_bytes(b"\x01")
+        return True
+
+    def fileno(self) -> int:
+        """Readable, when `get` has a chunk to return."""
+        return self._doorbell.fileno()
+
+    def get(self, timeout: float | None = None) -> Tuple[memoryview, float]:
+        """Waits for the next chunk (in the consumer), returns it along with
+        the time it was put at, or `None` on the `timeout`. Every chunk is
+        to be `release`d before the next `get`."""
+        assert self._held is None, "The previous chunk isn't released"
+        if not self._doorbell.poll(timeout):
+            return None
+        self._doorbell.recv_bytes()
+        read_index = int(self._header["read_index"])
+        slot = self._slots[read_index % self.slots_count]
+        self._held = self._slot_data(read_index)[: int(slot["length"])]
+        return self._held, float(slot["sent_at"])
+
+    def release(self) -> None:
+        """Gives the slot of the last chunk back to the producer."""
+        if self._held is None:
+            return
+        self._held.release()
+        self._held = None
+        self._header["read_index"] += 1
+
+    def close(self) -> None:
+        """Detaches from the shared memory (the owner also frees it). The
+        chunks got from the ring must not be used anymore."""
+        self.release()
+        del self._header, self._slots
+        self._data.release()
+        self._shared.close()
+        self._doorbell.close()
+        self._doorbell_writer.close()
+        if self._owner_pid == os.getpid():
+            self._shared.unlink()
@@ -14,7 +14,7 @@ class SampleDType(Enum):
 
     @staticmethod
     def guess(data: Any):
-        if isinstance(data, bytes | bytearray):
+        if isinstance(data, bytes | bytearray | memoryview):
             return SampleDType.BYTES_2
         if not isinstance(data, np.ndarray | list):
             raise ValueError
@@ -139,7 +139,82 @@ TYPE_FACTORY = {
     SampleDType.NP_F32: lambda arr=[]: np.array(arr, "f4"),
 }
 
-# BYTES_EXTEND = lambda arr, add: arr.extend(add)
+BUFFER_NP_DTYPE = {
+    SampleDType.BYTES_2: "u1",
+    SampleDType.BYTES_4: "u1",
+    SampleDType.NP_I16: "<i2",
+    SampleDType.NP_I32: "<i4",
+    SampleDType.NP_F16: "f2",
+    SampleDType.NP_F32: "f4",
+}
+
+
+class SampleBuffer:
+    """A growable buffer of samples of a `SampleDType` (`BYTES_*` samples are
+    stored byte by byte, like in a `bytearray`).
+
+    - `extend` takes O(1) amortized time: the capacity doubles when exceeded
+    - `view` returns the samples without copying: a `memoryview` for
+    `BYTES_*`, a (read-only) `np.ndarray` for the rest
+    - `trim_front` drops the first samples in O(1): the space is reclaimed
+    the next time the buffer grows
+
+    The storage is never modified below the end of the samples, and the
+    samples are moved to a new storage instead of being shifted, so the
+    views taken earlier stay valid and unchanged.
+    """
+
+    MIN_CAPACITY = 1024
+
+    def __init__(self, dtype: SampleDType, data: Any = None) -> None:
+        self.dtype = dtype
+        self._storage = np.empty(0, BUFFER_NP_DTYPE[dtype])
+        self._start = 0
+        self._end = 0
+        if data is not None:
+            self.extend(data)
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __eq__(self, other: object) -> bool:
+        """Equal, if the samples are (the storage beyond them is ignored)."""
+        if not isinstance(other, SampleBuffer):
+            return NotImplemented
+        return self.dtype == other.dtype and np.array_equal(
+            self._storage[self._start : self._end],
+            other._storage[other._start : other._end],
+        )
+
+    def _to_array(self, data: Any) -> np.ndarray:
+        if self.dtype in (SampleDType.BYTES_2, SampleDType.BYTES_4):
+            return np.frombuffer(data, "u1")
+        return np.asarray(data, self._storage.dtype).reshape(-1)
+
+    def extend(self, data: Any) -> "SampleBuffer":
+        data = self._to_array(data)
+        size = len(self) + len(data)
+        if self._end + len(data) > len(self._storage):
+            capacity = max(len(self._storage), self.MIN_CAPACITY)
+            while capacity < size:
+                capacity *= 2
+            storage = np.empty(capacity, self._storage.dtype)
+            storage[: len(self)] = self._storage[self._start : self._end]
+            self._storage, self._start, self._end = storage, 0, len(self)
+        self._storage[self._end : self._end + len(data)] = data
+        self._end += len(data)
+        return self
+
+    def trim_front(self, count: int) -> None:
+        """Drops the first `count` samples."""
+        self._start += max(0, min(count, len(self)))
+
+    def view(self) -> memoryview | np.ndarray:
+        samples = self._storage[self._start : self._end]
+        samples.flags.writeable = False
+        if self.dtype in (SampleDType.BYTES_2, SampleDType.BYTES_4):
+            return memoryview(samples)
+        return samples
 
 
 def bytes_extend(arr, add):
@@ -148,16 +223,10 @@ def bytes_extend(arr, add):
 
 
 def np_extend(arr, add):
+    if isinstance(arr, SampleBuffer):
+        return arr.extend(add)
     return np.append(arr, add)
-    # arradd = np.append(arr, add)
-    # np.resize()
-    # arr.resize(len(arr) + len(add))
-    # arr[-len(add) :] = add
-    # np.copyto(arr, arradd)
-    # arr[:] = np.append(arr, add)
-
 
-# NP_EXTEND = lambda arr, add: (arr = np.append(arr, add))
 
 TYPE_CONCAT_FUNC = {
     SampleDType.BYTES_2: bytes_extend,
@@ -0,0 +1,53 @@
+import pytest
+from pydub import silence
+
+from speech2text.audio_data import LoudnessProfile, PdData
+from tests.conftest import AUDIO_FILES
+
+SPLIT_PARAMS = [
+    (1000, -30, 10),
+    (800, -28, 8),
+    (800, -26, 8),
+    (300, -35, 7),
+]
+
+
+def make_profile(seg: PdData, chunk_len_frames: int = 12345):
+    profile = LoudnessProfile(seg.pcm_params)
+    chunk_len_bytes = chunk_len_frames * seg.frame_width
+    raw_data = seg.raw_data
+    for pos in range(0, len(raw_data), chunk_len_bytes):
+        profile.extend(raw_data[pos : pos + chunk_len_bytes])
+    return profile
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_detect_nonsilent_like_pydub(file_name):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])
+    profile = make_profile(seg)
+    assert profile.duration_msec == len(seg)
+    for params in SPLIT_PARAMS:
+        expected = silence.detect_nonsilent(seg, *params)
+        assert profile.detect_nonsilent(*params) == expected
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_slice_and_extend(file_name):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])
+    profile = make_profile(seg).slice(500, 2000)
+    profile.extend(seg[2000:].raw_data)
+    for params in SPLIT_PARAMS:
+        expected = silence.detect_nonsilent(seg[500:], *params)
+        assert profile.detect_nonsilent(*params) == expected
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_nonsilent_span_of_appended_silence(file_name):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])[:4000]
+    profile = make_profile(seg)
+    span = profile.nonsilent_span(100, -35, 10)
+    energy = profile.energy(*span)
+    profile.extend(bytes(len(seg[:800].raw_data)))  # silence
+    assert profile.nonsilent_span(100, -35, 10, end_msec=4000) == span
+    assert profile.energy(*span) == energy
+    assert profile.nonsilent_span(100, -35, 10, start_msec=4000) is None
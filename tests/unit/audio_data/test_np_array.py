@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from speech2text.audio_data import NpData, PdData, WavData
+from tests.conftest import AUDIO_FILES
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_load_from_pd_data_like_wav_file(file_name):
+    wav_data = WavData.load_from_wav_file(AUDIO_FILES[file_name]["path"])
+    pd_data = PdData.load_from_wav_file(wav_data)
+    assert pd_data.raw_data == wav_data.raw_data
+    assert pd_data.pcm_params == wav_data.pcm_params
+
+    np_data = NpData.load_from_pd_data(pd_data)
+    expected = NpData.load_from_wav_file(pd_data.create_io_stream())
+    assert np.array_equal(np_data._data, expected._data)
+    assert np_data.raw_data == wav_data.raw_data
+    assert np_data.create_pd_data().raw_data == wav_data.raw_data
+
+
+def test_raw_data_clipping():
+    np_data = NpData(WavData().pcm_params, np.array([1.0, -1.0, 0.5], "f4"))
+    samples = np.frombuffer(np_data.raw_data, "<i2")
+    assert samples.tolist() == [32767, -32768, 16384]
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from speech2text.audio_data import NpData, PdData, np_effects
+from tests.conftest import AUDIO_FILES
+
+EFFECTS = [
+    ("low_pass_filter", (300,)),
+    ("high_pass_filter", (3500,)),
+    ("apply_gain", (6.0,)),
+    ("normalize", ()),
+]
+
+
+def to_samples(audio: PdData) -> np.ndarray:
+    return np.frombuffer(audio.raw_data, f"<i{audio.sample_width}")
+
+
+@pytest.mark.parametrize("effect, args", EFFECTS)
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_effects_like_pydub(file_name, effect, args):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])[:3000]
+    arr = NpData.load_from_pd_data(seg)
+    expected = to_samples(getattr(seg, effect)(*args))
+    actual = to_samples(getattr(arr, effect)(*args).create_pd_data())
+    diff = np.abs(expected.astype("i8") - actual.astype("i8"))
+    assert diff.max(initial=0) <= 1
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_filters_continue_from_state(file_name):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])[:3000]
+    frames = NpData.load_from_pd_data(seg).frames.astype("f8")
+    frame_rate = seg.frame_rate
+    for filter_func, cutoff in [
+        (np_effects.low_pass_filter, 300),
+        (np_effects.high_pass_filter, 3500),
+    ]:
+        whole, _ = filter_func(frames, frame_rate, cutoff)
+        head, state = filter_func(frames[:1001], frame_rate, cutoff)
+        tail, _ = filter_func(frames[1001:], frame_rate, cutoff, state)
+        assert np.allclose(np.vstack([head, tail]), whole)
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_speedup_duration(file_name):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])[:3000]
+    arr = NpData.load_from_pd_data(seg).speedup(1.5)
+    assert abs(arr.frames.shape[0] - seg.frame_count() / 1.5) <= 1
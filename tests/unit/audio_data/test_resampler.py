@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from speech2text.audio_data import (
+    WHISPER_PCM_PARAMS,
+    PcmConverter,
+    PcmParams,
+    WavData,
+)
+from speech2text.audio_data.resampler import convert_pcm_params
+from tests.conftest import AUDIO_FILES
+
+
+def make_sine(pcm_params: PcmParams, freqs, duration_sec=2.0):
+    t = np.arange(int(duration_sec * pcm_params.frame_rate))
+    t = t / pcm_params.frame_rate
+    signal = sum(0.3 * np.sin(2 * np.pi * freq * t) for freq in freqs)
+    frames = np.repeat(signal[:, np.newaxis], pcm_params.channels_count, 1)
+    return (frames * 32767).astype("<i2").tobytes()
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_chunked_like_whole(file_name):
+    wav = WavData.load_from_wav_file(AUDIO_FILES[file_name]["path"])
+    whole = convert_pcm_params(wav.raw_data, wav.pcm_params)
+    converter = PcmConverter(wav.pcm_params, WHISPER_PCM_PARAMS)
+    raw_data = wav.raw_data
+    chunked = b"".join(
+        converter.convert(raw_data[pos : pos + 12345])
+        for pos in range(0, len(raw_data), 12345)
+    )
+    assert chunked + converter.flush() == whole
+
+
+@pytest.mark.parametrize(
+    "pcm_params",
+    [PcmParams(2, 2, 48_000), PcmParams(2, 2, 44_100), PcmParams(1, 2, 8_000)],
+)
+def test_keeps_passband_removes_aliases(pcm_params):
+    freqs = [440, 3000] + [
+        f for f in (11_000,) if f < pcm_params.frame_rate / 2
+    ]
+    data = convert_pcm_params(make_sine(pcm_params, freqs), pcm_params)
+    samples = np.frombuffer(data, "<i2") / 32768
+    assert len(samples) == 2 * WHISPER_PCM_PARAMS.frame_rate
+    t = np.arange(len(samples)) / WHISPER_PCM_PARAMS.frame_rate
+    expected = sum(0.3 * np.sin(2 * np.pi * freq * t) for freq in (440, 3000))
+    assert np.abs(samples - expected)[100:-100].max() < 1e-3
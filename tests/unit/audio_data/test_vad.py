@@ -0,0 +1,39 @@
+import pytest
+from pydub.generators import WhiteNoise
+
+from speech2text.audio_data import (
+    WHISPER_PCM_PARAMS,
+    PdData,
+    VoiceActivity,
+    VoiceActivityDetector,
+)
+from tests.conftest import AUDIO_FILES
+
+
+def detect(seg: PdData, chunk_len_msec: int = 800):
+    detector = VoiceActivityDetector(seg.pcm_params)
+    activity = VoiceActivity(detector.frame_msec)
+    for end in range(
+        chunk_len_msec, len(seg) + chunk_len_msec, chunk_len_msec
+    ):
+        detector.update(activity, seg[:end].raw_data)
+    return detector, activity
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_speech_is_detected(file_name):
+    seg = PdData.from_wav(AUDIO_FILES[file_name]["path"])
+    detector, activity = detect(seg)
+    assert activity.frames_count == len(seg) // detector.frame_msec
+    assert activity.has_speech
+
+
+@pytest.mark.parametrize("volume", [-20, -40])
+def test_noise_is_not_speech(volume):
+    # (the louder one isn't split off as silence by `split_on_silence`)
+    noise = WhiteNoise(sample_rate=WHISPER_PCM_PARAMS.frame_rate)
+    noise = noise.to_audio_segment(5000, volume).set_sample_width(2)
+    seg = PdData.load_from_raw(noise.raw_data, WHISPER_PCM_PARAMS)
+    detector, activity = detect(seg)
+    assert not activity.has_speech
+    assert detector.noise_floor_db == pytest.approx(volume - 5, abs=1)
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("pyaudio")  # `speech2text.listener` needs it
+
+from speech2text.audio_data import PcmParams
+from speech2text.listener.listener import Listener
+from speech2text.utils import SharedRingBuffer, Ticker
+
+CHUNKS = [bytes([i]) * 4 for i in range(5)]
+
+
+def _chunks_recorder_proc(
+    ring: SharedRingBuffer, chunk_size_sec: float, pcm_params: PcmParams
+) -> None:
+    with Ticker(chunk_size_sec) as ticker:
+        for chunk in CHUNKS:
+            ticker.tick()
+            ring.put(chunk)
+
+
+class ChunksListener(Listener):
+    def __init__(self) -> None:
+        super().__init__()
+        self._recorder_proc_func = _chunks_recorder_proc
+
+    def _get_recorder_proc_kwargs(self):
+        return {}
+
+
+def test_listener_delivers_chunks_as_they_arrive():
+    listener = ChunksListener()
+    delivery_latencies = []
+    chunks = []
+    for chunk in listener.get_chunks_iterator(0.02):
+        chunks.append(bytes(chunk))
+        delivery_latencies.append(listener.delivery_latency_sec)
+
+    assert chunks == CHUNKS  # and it stops with the recorder
+    assert max(delivery_latencies) < 0.02
+
+
+def test_listener_delivers_chunks_to_asyncio():
+    async def main():
+        listener = ChunksListener()
+        return [
+            bytes(chunk)
+            async for chunk in listener.get_async_chunks_iterator(0.02)
+        ]
+
+    assert asyncio.run(main()) == CHUNKS
@@ -0,0 +1,68 @@
+import asyncio
+import json
+from concurrent.futures import Future
+
+from speech2text.audio_data import WHISPER_PCM_PARAMS
+from speech2text.server import TranscriptionServer
+from speech2text.settings import ServerSettings, app_settings
+from speech2text.transcriber.finalizer import finalize_now
+from speech2text.transcriber.state import Block
+from speech2text.transcriber.strategy import IStrategy
+
+
+class ChunkSizeStrategy(IStrategy):
+    """Every chunk is finalized as its size, and the ongoing text is the
+    size of the last one."""
+
+    def cold_start(self) -> Future:
+        loaded = Future()
+        loaded.set_result(None)
+        return loaded
+
+    def process_chunk(self, state, chunk, latency_ratio=0.0):
+        text = str(len(chunk))
+        state.ongoing.text = text
+        state.finalizing.append(finalize_now(lambda: [Block(text=text)]))
+        return state
+
+
+def test_server_streams_text_back(tmp_path):
+    chunk_size = WHISPER_PCM_PARAMS.seconds_to_byte_count(
+        app_settings.listener.chunk_size_sec
+    )
+    settings = ServerSettings(
+        unix_socket=str(tmp_path / "server.sock"), max_streams=1
+    )
+
+    async def main():
+        server = TranscriptionServer(settings, strategy=ChunkSizeStrategy())
+        async with await server.start():
+            reader, writer = await asyncio.open_unix_connection(
+                settings.unix_socket
+            )
+            writer.write(bytes(chunk_size))
+            messages = [json.loads(await reader.readline())]
+
+            refused = await asyncio.open_unix_connection(settings.unix_socket)
+            error = json.loads(await refused[0].readline())
+            refused[1].close()
+
+            writer.write(bytes(chunk_size + chunk_size // 2 + 1))
+            writer.write_eof()  # the partial frame is dropped
+            messages += [json.loads(line) async for line in reader]
+            writer.close()
+        return messages, error
+
+    messages, error = asyncio.run(main())
+    assert error["type"] == "error"
+    finalized = [msg["text"] for msg in messages if msg["type"] == "final"]
+    assert finalized == [
+        str(chunk_size),
+        str(chunk_size),
+        str(chunk_size // 2),
+    ]
+    ongoing = [msg for msg in messages if msg["type"] == "ongoing"]
+    assert ongoing[-1]["text"] == str(chunk_size // 2)
+    assert (
+        messages[-1]["audio_sec"] == 2.5 * app_settings.listener.chunk_size_sec
+    )
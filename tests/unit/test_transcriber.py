@@ -0,0 +1,679 @@
+import asyncio
+import logging
+from concurrent.futures import Future
+from dataclasses import replace
+
+import numpy as np
+import pytest
+import torch
+import whisper
+from whisper.audio import N_FRAMES, N_SAMPLES
+
+from speech2text.audio_data import WHISPER_PCM_PARAMS, NpData, PdData, WavData
+from speech2text.audio_data.resampler import convert_pcm_params
+from speech2text.settings import (
+    PyDubSettings,
+    QualityControlSettings,
+    RefineStageSettings,
+    SpectralGateSettings,
+    app_settings,
+)
+from speech2text.transcriber import AsyncWorkflow, Workflow, weights_cache
+from speech2text.transcriber.agreement import LocalAgreement, Word
+from speech2text.transcriber.controller import QualityController, QualityLevel
+from speech2text.transcriber.finalizer import finalize_in_background
+from speech2text.transcriber.mel_cache import MelCache
+from speech2text.transcriber.noisereduce import NoiseProfile, spectral_gate
+from speech2text.transcriber.refiner import refine_audio, refine_in_pool
+from speech2text.transcriber.state import Block, State
+from speech2text.transcriber.strategy import IStrategy
+from speech2text.transcriber.strategy.realtime import (
+    RealtimeProcessing,
+    apply_effects,
+)
+from speech2text.transcriber.whisper import (
+    Backend,
+    ModelName,
+    ModelRegistry,
+    _avg_logprob,
+    _DeadlineFilter,
+    _decode_together,
+    _decode_until,
+    _decoding_options,
+    _is_acceptable,
+    _model_size_bytes,
+    _quantize_dynamic_int8,
+    fitting_model,
+    transcribe,
+    transcribe_batch,
+)
+from tests.conftest import AUDIO_FILES
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_incremental_adjust_like_whole_block(file_name):
+    settings = PyDubSettings(
+        low_pass_filter=300, high_pass_filter=3500, volume_up=3.0
+    )
+    wav = WavData.load_from_wav_file(AUDIO_FILES[file_name]["path"])
+    state = State(wav.pcm_params)
+    strategy = RealtimeProcessing()
+    for chunk in wav.split_in_chunks(0.3):
+        state.ongoing.raw_data.append_chunk(chunk)
+        state = strategy._adjust_incrementally(state, settings)
+
+    expected = apply_effects(NpData.load_from_wav_file(wav), settings)
+    expected = expected.create_pd_data()
+    assert isinstance(state.ongoing.seg_data, PdData)
+    assert state.ongoing.seg_data.frame_count() == expected.frame_count()
+    dtype = f"<i{wav.pcm_params.sample_width_bytes}"
+    actual = np.frombuffer(state.ongoing.seg_data.raw_data, dtype)
+    expected = np.frombuffer(expected.raw_data, dtype)
+    assert np.abs(actual.astype("i8") - expected).max(initial=0) <= 1
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_incremental_adjust_continues_after_split(file_name):
+    settings = PyDubSettings(
+        low_pass_filter=300, high_pass_filter=3500, volume_up=3.0
+    )
+    wav = WavData.load_from_wav_file(AUDIO_FILES[file_name]["path"])
+    chunks = list(wav.split_in_chunks(0.3))
+    state = State(wav.pcm_params)
+    strategy = RealtimeProcessing()
+    for chunk in chunks[:5]:
+        state.ongoing.raw_data.append_chunk(chunk)
+        state = strategy._adjust_incrementally(state, settings)
+    split_msec = 700
+    block = state.ongoing
+    state.ongoing = Block.load_from_seg_data(
+        block.seg_data[split_msec:], state.input_pcm_params
+    )
+    strategy._carry_adjust_state(block, state.ongoing)
+    for chunk in chunks[5:]:
+        state.ongoing.raw_data.append_chunk(chunk)
+        state = strategy._adjust_incrementally(state, settings)
+
+    expected = apply_effects(NpData.load_from_wav_file(wav), settings)
+    dtype = f"<i{wav.pcm_params.sample_width_bytes}"
+    expected = np.frombuffer(expected.create_pd_data().raw_data, dtype)
+    # sliced by frames (a `PdData` slice is padded to whole milliseconds)
+    split_frames = split_msec * wav.pcm_params.frame_rate // 1000
+    expected = expected[split_frames * wav.pcm_params.channels_count :]
+    actual = np.frombuffer(state.ongoing.seg_data.raw_data, dtype)
+    assert actual.shape == expected.shape
+    assert np.abs(actual.astype("i8") - expected).max(initial=0) <= 1
+
+
+def test_collect_finalized_keeps_order():
+    state = State(WHISPER_PCM_PARAMS)
+    futures = [Future() for _ in range(3)]
+    state.finalizing.extend(futures)
+
+    futures[1].set_result([Block(text="b")])
+    state.collect_finalized()
+    assert state.finalized == []
+
+    futures[0].set_result([Block(text="a")])
+    state.collect_finalized()
+    assert [block.text for block in state.finalized] == ["a", "b"]
+    assert state.ongoing_init_prompt == "b"
+
+    futures[2].set_result([Block(text="c")])
+    state.collect_finalized(wait=True)
+    assert [block.text for block in state.finalized] == ["a", "b", "c"]
+    assert len(state.finalizing) == 0
+
+
+def fake_ongoing_transcription(monkeypatch, fake_transcribe):
+    settings = app_settings.transcriber.stages.transcribe.ongoing
+    monkeypatch.setattr(settings, "mel_cache", False)
+    monkeypatch.setattr(settings, "local_agreement", None)
+    monkeypatch.setattr(
+        "speech2text.transcriber.strategy.realtime.transcribe",
+        fake_transcribe,
+    )
+
+
+def speech_chunks(chunk_size: int) -> list[bytes]:
+    wav = WavData.load_from_wav_file(AUDIO_FILES["en_123.wav"]["path"])
+    data = convert_pcm_params(wav.raw_data, wav.pcm_params)
+    return [
+        data[start : start + chunk_size]
+        for start in range(0, len(data) - chunk_size + 1, chunk_size)
+    ]
+
+
+def test_ongoing_skipped_after_silence(monkeypatch):
+    calls = []
+
+    def fake_transcribe(np_data, **whisper_params):
+        calls.append(np_data)
+        return {"text": f" {len(calls)}", "segments": []}
+
+    fake_ongoing_transcription(monkeypatch, fake_transcribe)
+    chunk_size = WHISPER_PCM_PARAMS.seconds_to_byte_count(0.3)
+    state = State(WHISPER_PCM_PARAMS)
+    strategy = RealtimeProcessing()
+    for chunk in speech_chunks(chunk_size):
+        state = strategy.process_chunk(state, chunk)
+    text, counters = state.ongoing.text, replace(state.counters)
+    assert text == f" {len(calls)}"
+
+    for _ in range(3):  # shorter than the silence the block is split on
+        state = strategy.process_chunk(state, bytes(chunk_size))
+    assert state.ongoing.text == text
+    assert state.counters.ongoing == counters.ongoing
+    assert state.counters.ongoing_skipped == counters.ongoing_skipped + 3
+
+
+def test_late_ongoing_keeps_text(monkeypatch):
+    late = []
+
+    def fake_transcribe(np_data, **whisper_params):
+        if late:  # too late to begin decoding
+            return {"text": "", "segments": [], "deadline_exceeded": True}
+        return {"text": " 1, 2", "segments": []}
+
+    fake_ongoing_transcription(monkeypatch, fake_transcribe)
+    chunks = speech_chunks(WHISPER_PCM_PARAMS.seconds_to_byte_count(0.3))
+    state = State(WHISPER_PCM_PARAMS)
+    strategy = RealtimeProcessing()
+    for chunk in chunks[:4]:
+        state = strategy.process_chunk(state, chunk)
+    assert state.ongoing.text == " 1, 2"
+
+    late.append(True)
+    for chunk in chunks[4:]:
+        state = strategy.process_chunk(state, chunk)
+    assert state.counters.ongoing_deadline_exceeded > 0
+    assert state.ongoing.text == " 1, 2"
+    assert state.ongoing.fingerprint is None  # transcribed again
+
+
+def whisper_mel(samples: np.ndarray) -> np.ndarray:
+    """The first segment's mel, as `whisper.transcribe` computes it."""
+    mel = whisper.log_mel_spectrogram(samples, 80, padding=N_SAMPLES)
+    content = mel[:, : mel.shape[-1] - N_FRAMES]
+    return whisper.pad_or_trim(content, N_FRAMES).numpy()
+
+
+@pytest.mark.parametrize("file_name", AUDIO_FILES.keys())
+def test_mel_cache_like_whisper(file_name):
+    wav = WavData.load_from_wav_file(AUDIO_FILES[file_name]["path"])
+    samples = NpData.load_from_raw(
+        convert_pcm_params(wav.raw_data, wav.pcm_params), WHISPER_PCM_PARAMS
+    )._data.astype("f4")[: 10 * WHISPER_PCM_PARAMS.frame_rate]
+    cache = MelCache(80)
+    for end in [150, 12_800, 12_900, 64_000, len(samples)]:
+        cache.update(samples[:end])
+        assert np.allclose(cache.mel().numpy(), whisper_mel(samples[:end]))
+
+    changed = samples.copy()
+    changed[50_000:] *= 0.5
+    cache.update(changed)
+    assert np.allclose(cache.mel().numpy(), whisper_mel(changed))
+
+    for trimmed in [3_200, 1_001]:  # aligned with the STFT hop, and not
+        changed = changed[trimmed:]
+        cache.trim_front(trimmed)
+        cache.update(changed)
+        assert np.allclose(cache.mel().numpy(), whisper_mel(changed))
+
+
+class RecordingStrategy(IStrategy):
+    def __init__(self) -> None:
+        self.loaded = Future()
+        self.chunks = []
+
+    def cold_start(self) -> Future:
+        return self.loaded
+
+    def process_chunk(self, state, chunk, latency_ratio=0.0):
+        self.chunks.append(bytes(chunk))
+        return state
+
+
+def test_workflow_buffers_chunks_until_ready():
+    strategy = RecordingStrategy()
+    workflow = Workflow(strategy=strategy)
+    assert not workflow.is_ready
+    assert not workflow.wait_until_ready(timeout=0.01)
+
+    workflow.process_chunk(b"\x01\x00")
+    workflow.process_chunk(b"\x02\x00")
+    assert strategy.chunks == []
+    assert workflow.pending_chunks_count == 2
+
+    strategy.loaded.set_result(None)
+    assert workflow.wait_until_ready()
+    workflow.process_chunk(b"\x03\x00")
+    assert strategy.chunks == [b"\x01\x00\x02\x00\x03\x00"]
+    workflow.process_chunk(b"\x04\x00")
+    assert strategy.chunks[-1] == b"\x04\x00"
+    assert workflow.pending_chunks_count == 0
+
+
+class TextStrategy(IStrategy):
+    """The ongoing text is the last chunk, and every odd chunk is finalized
+    in the background."""
+
+    def cold_start(self) -> Future:
+        loaded = Future()
+        loaded.set_result(None)
+        return loaded
+
+    def process_chunk(self, state, chunk, latency_ratio=0.0):
+        text = bytes(chunk).decode()
+        state.ongoing.text = text
+        if int(text) % 2:
+            state.finalizing.append(
+                finalize_in_background(lambda: [Block(text=text)])
+            )
+        return state
+
+
+def test_async_workflow_streams_text():
+    async def main():
+        workflow = AsyncWorkflow(strategy=TextStrategy())
+        await workflow.wait_until_ready()
+
+        async def collect(stream):
+            return [text async for text in stream]
+
+        finalized = asyncio.create_task(collect(workflow.finalized_lines()))
+        ongoing = asyncio.create_task(collect(workflow.ongoing_texts()))
+        for i in range(4):
+            await workflow.process_chunk(memoryview(f"{i:02d}".encode()))
+        await workflow.close()
+        return await finalized, await ongoing
+
+    finalized, ongoing = asyncio.run(main())
+    assert finalized == ["01", "03"]
+    assert ongoing[-1] == "03"
+    assert set(ongoing) <= {"00", "01", "02", "03"}
+
+
+def test_model_registry_fits_budget(monkeypatch, caplog):
+    parameters_mb = {"tiny.en": 1, "small.en": 3}
+    monkeypatch.setattr(
+        whisper,
+        "load_model",
+        lambda name, **kwargs: torch.nn.Linear(
+            parameters_mb[name] * 2**18, 1, bias=False  # float32
+        ),
+    )
+    monkeypatch.setattr(app_settings.transcriber.models, "memory_budget_mb", 3)
+    monkeypatch.setattr(
+        app_settings.transcriber.models, "weights_cache_dir", None
+    )
+    registry = ModelRegistry()
+
+    tiny = registry.get("tiny.en")
+    assert registry.get(ModelName.TINY_EN) is tiny  # shared
+    registry.get("small.en")
+    assert [info.name for info in registry.loaded()] == [ModelName.SMALL_EN]
+    assert registry.used_bytes == 3 * 2**20
+
+    assert registry.get("tiny.en") is not tiny  # loaded again
+    assert [info.name for info in registry.loaded()] == [ModelName.TINY_EN]
+
+    registry.keep("tiny.en")  # needed by a stage
+    with caplog.at_level(logging.WARNING):
+        registry.get("small.en")
+        registry.unload("small.en")
+        registry.get("small.en")
+    assert [info.name for info in registry.loaded()] == [
+        ModelName.TINY_EN,
+        ModelName.SMALL_EN,
+    ]
+    assert len(caplog.records) == 1  # over the budget, warned once
+
+
+def test_fitting_model(monkeypatch):
+    models = app_settings.transcriber.models
+    monkeypatch.setattr(models, "memory_budget_mb", None)
+    assert fitting_model("small.en") == ModelName.SMALL_EN
+    monkeypatch.setattr(models, "memory_budget_mb", 500)
+    assert fitting_model("small.en") == ModelName.TINY_EN
+    assert fitting_model("small") == ModelName.TINY
+    monkeypatch.setattr(models, "memory_budget_mb", 1)
+    assert fitting_model("small.en") == ModelName.TINY_EN  # the smallest
+
+
+def test_smaller_model_only_if_it_fits(monkeypatch):
+    settings = app_settings.transcriber.stages.transcribe.ongoing
+    monkeypatch.setattr(settings.whisper, "model_name", "small.en")
+    registry = ModelRegistry()
+    registry.keep("small.en")  # the stages' models stay loaded
+    monkeypatch.setattr(
+        "speech2text.transcriber.strategy.realtime.model_registry", registry
+    )
+    loaded = Future()
+    loaded.set_result(None)
+    monkeypatch.setattr(
+        "speech2text.transcriber.strategy.realtime.load_in_background",
+        lambda model_name, backend: loaded,
+    )
+    state = State(WHISPER_PCM_PARAMS)
+    state.quality.level = QualityLevel.SMALLER_MODEL
+    models = app_settings.transcriber.models
+    monkeypatch.setattr(models, "memory_budget_mb", 1200)
+    model_name = RealtimeProcessing._ongoing_model_name(state, settings)
+    assert model_name == "tiny.en"
+    monkeypatch.setattr(models, "memory_budget_mb", 1000)  # small.en only
+    model_name = RealtimeProcessing._ongoing_model_name(state, settings)
+    assert model_name == "small.en"
+
+
+TINY_DIMS = whisper.model.ModelDimensions(
+    n_mels=80,
+    n_audio_ctx=1500,
+    n_audio_state=64,
+    n_audio_head=2,
+    n_audio_layer=1,
+    n_vocab=51864,
+    n_text_ctx=448,
+    n_text_state=64,
+    n_text_head=2,
+    n_text_layer=1,
+)
+
+
+def test_quantize_dynamic_int8():
+    torch.manual_seed(0)
+    model = whisper.model.Whisper(TINY_DIMS).eval()
+    mel = torch.randn(1, 80, N_FRAMES)
+    with torch.no_grad():
+        expected = model.embed_audio(mel)
+    linear_bytes = sum(
+        _model_size_bytes(module)
+        for module in model.modules()
+        if isinstance(module, torch.nn.Linear)
+    )
+    size_bytes = _model_size_bytes(model)
+
+    model = _quantize_dynamic_int8(model)
+    assert not any(
+        isinstance(module, torch.nn.Linear) for module in model.modules()
+    )
+    assert _model_size_bytes(model) < size_bytes - linear_bytes // 2
+    with torch.no_grad():
+        actual = model.embed_audio(mel)
+    similarity = torch.cosine_similarity(
+        actual.flatten(), expected.flatten(), 0
+    )
+    assert similarity > 0.99
+
+
+def test_deadline_filter_ends_text():
+    logits = torch.tensor([[1.0, 5.0, -2.0, 0.5]])
+    tokens = torch.zeros(1, 3, dtype=torch.long)
+    in_time = _DeadlineFilter(deadline=float("inf"), eot=3)
+    in_time.apply(logits, tokens)
+    assert not in_time.exceeded and logits.argmax() == 1
+
+    late = _DeadlineFilter(deadline=0.0, eot=3)
+    late.apply(logits, tokens)
+    assert late.exceeded and logits.argmax() == 3
+    assert logits[0, 3] == 0.0  # its probability becomes 1
+
+    # `SuppressBlank` has suppressed the end-of-text (the first step)
+    suppressed = torch.tensor([[1.0, 5.0, -2.0, -float("inf")]])
+    late.apply(suppressed, tokens)
+    assert suppressed.argmax() == 3
+    assert torch.log_softmax(suppressed, dim=-1)[0, 3] == 0.0
+
+    # nothing is decoded yet (whisper can't rank an empty text)
+    first = _DeadlineFilter(deadline=0.0, eot=3, sample_begin=3)
+    first_logits = torch.tensor([[1.0, 5.0, -2.0, 0.5]])
+    first.apply(first_logits, tokens)
+    assert first.exceeded and first_logits.argmax() == 1
+
+
+def test_decode_until_late_is_empty():
+    model = whisper.model.Whisper(TINY_DIMS)
+    options = _decoding_options(model, 0.0, None, sample_len=4)
+    result, exceeded = _decode_until(
+        model, torch.zeros(TINY_DIMS.n_mels, N_FRAMES), options, 0.0
+    )
+    assert exceeded and result.tokens == [] and result.avg_logprob == 0.0
+    assert _is_acceptable(result, 2.4, -1.0, 0.6)
+
+
+def test_nan_logprob_is_not_acceptable():
+    result = whisper.DecodingResult(
+        audio_features=torch.zeros(1), language="en", avg_logprob=np.nan
+    )
+    assert not _is_acceptable(result, 2.4, -1.0, 0.6)
+    assert _avg_logprob(result) == -np.inf
+
+
+def test_silence_is_acceptable_whatever_compression():
+    silence = whisper.DecodingResult(
+        audio_features=torch.zeros(1),
+        language="en",
+        avg_logprob=-2.0,
+        no_speech_prob=0.9,
+        compression_ratio=5.0,
+    )
+    assert _is_acceptable(silence, 2.4, -1.0, 0.6)
+    assert not _is_acceptable(
+        replace(silence, no_speech_prob=0.1), 2.4, -1.0, 0.6
+    )
+    assert not _is_acceptable(
+        replace(silence, avg_logprob=-0.5), 2.4, -1.0, 0.6
+    )
+
+
+def test_transcribe_batch_like_one_by_one(monkeypatch):
+    torch.manual_seed(0)
+    model = whisper.model.Whisper(TINY_DIMS).eval()
+    with torch.no_grad():  # `torch.empty` in `TextDecoder`
+        model.decoder.positional_embedding.normal_()
+    monkeypatch.setattr(
+        "speech2text.transcriber.whisper._pick_whisper_model",
+        lambda model_name, backend: model,
+    )
+    np_datas = []
+    for file_name in ["en_123.wav", "en_hedgehog.wav"]:
+        wav = WavData.load_from_wav_file(AUDIO_FILES[file_name]["path"])
+        np_datas.append(
+            NpData.load_from_raw(
+                convert_pcm_params(wav.raw_data, wav.pcm_params),
+                WHISPER_PCM_PARAMS,
+            )
+        )
+    params = dict(
+        temperature=0.0,
+        compression_ratio_threshold=None,  # the greedy results are kept
+        logprob_threshold=None,
+        no_speech_threshold=None,
+    )
+    batched = transcribe_batch(np_datas, **params)
+    one_by_one = [
+        transcribe(np_data, without_timestamps=True, **params)
+        for np_data in np_datas
+    ]
+    assert [output["text"] for output in batched] == [
+        output["text"] for output in one_by_one
+    ]
+
+
+def test_decode_together_like_one_by_one():
+    torch.manual_seed(0)
+    model = whisper.model.Whisper(TINY_DIMS)
+    with torch.no_grad():  # `torch.empty` in `TextDecoder`
+        model.decoder.positional_embedding.normal_()
+    mels = [torch.randn(TINY_DIMS.n_mels, N_FRAMES) for _ in range(5)]
+    options = _decoding_options(model, 0.0, None, sample_len=4)
+    prompted = _decoding_options(model, 0.0, "Hello", sample_len=4)
+    # two decoder passes of two rows (by the prompt), and a late row
+    rows_options = [options, prompted, options, prompted, options]
+    deadlines = [None, None, None, None, 0.0]
+
+    together = _decode_together(model, mels, rows_options, deadlines)
+    for mel, row_options, deadline, (result, exceeded) in zip(
+        mels, rows_options, deadlines, together
+    ):
+        alone, alone_exceeded = _decode_until(
+            model, mel, row_options, deadline
+        )
+        assert result.tokens == alone.tokens
+        assert exceeded == alone_exceeded
+    late, late_exceeded = together[4]
+    assert late_exceeded and not together[0][1]
+    assert late.tokens == [] and np.isfinite(late.avg_logprob)
+
+
+def test_quality_controller_hysteresis(monkeypatch):
+    settings = QualityControlSettings(
+        window_chunks=2,
+        step_down_ratio=1.0,
+        step_up_ratio=0.5,
+        cooldown_chunks=3,
+        max_level=2,
+    )
+    monkeypatch.setattr(app_settings.transcriber, "quality_control", settings)
+    controller = QualityController()
+
+    def observe(latency_ratio, times):
+        return [
+            controller.observe(latency_ratio, 0.0, 1.0) for _ in range(times)
+        ]
+
+    assert observe(2.0, 3) == [QualityLevel.FULL] * 2 + [
+        QualityLevel.LIGHT_REFINE
+    ]
+    assert observe(2.0, 3)[-1] == QualityLevel.SMALLER_MODEL
+    assert observe(2.0, 3)[-1] == QualityLevel.SMALLER_MODEL  # `max_level`
+    assert observe(0.7, 6)[-1] == QualityLevel.SMALLER_MODEL  # in between
+    assert observe(0.1, 1) == [QualityLevel.LIGHT_REFINE]
+    assert observe(0.1, 2) == [QualityLevel.LIGHT_REFINE] * 2  # cooldown
+    assert observe(0.1, 1) == [QualityLevel.FULL]
+
+    slow = [controller.observe(0.0, 2.0, 1.0) for _ in range(3)]
+    assert slow[-1] == QualityLevel.LIGHT_REFINE  # the load counts too
+
+
+def test_local_agreement_commits_stable_words():
+    agreement = LocalAgreement(hypotheses_count=2)
+    first = [Word(" One,", 0.0, 0.52), Word(" two", 0.6, 0.9)]
+    assert agreement.insert(first) == []
+    assert agreement.text == " One, two"
+
+    second = [Word(" One,", 0.0, 0.5), Word(" to", 0.6, 0.9)]
+    second.append(Word(" three", 1.0, 1.3))
+    assert agreement.insert(second) == [second[0]]
+    assert agreement.window_start == 8000  # 0.5 sec
+    assert agreement.text == " One, to three"
+
+    # the words of the window after the committed ones
+    third = [Word(" to", 0.6, 0.9), Word(" three.", 1.0, 1.4)]
+    assert agreement.insert(third) == [third[0]]
+    assert agreement.window_start == 14400  # 0.9 sec
+    assert agreement.committed_text == " One, to"
+    assert agreement.text == " One, to three."
+
+
+def test_late_hypothesis_is_not_committed():
+    agreement = LocalAgreement(hypotheses_count=2)
+    agreement.insert([Word(" One,", 0.0, 0.5), Word(" two", 0.6, 0.9)])
+    block = Block(text=agreement.text)
+    words = [{"word": " One,", "start": 0.0, "end": 0.5}]
+    late = {"segments": [{"words": words}], "deadline_exceeded": True}
+    RealtimeProcessing._commit_agreed(block, agreement, late)
+    assert agreement.committed == [] and len(agreement.hypotheses) == 1
+    assert block.text == " One, two"
+
+    RealtimeProcessing._commit_agreed(block, agreement, {"segments": []})
+    assert block.text == ""  # in time, even if empty
+
+
+@pytest.mark.parametrize("dtype", ["float32", "float16"])
+def test_weights_cache_like_whisper(monkeypatch, tmp_path, dtype):
+    torch.manual_seed(0)
+    model = whisper.model.Whisper(TINY_DIMS)
+    with torch.no_grad():  # `torch.empty` in `TextDecoder`
+        model.decoder.positional_embedding.normal_()
+    model.register_buffer(
+        "alignment_heads",
+        torch.tensor([[False, True]]).to_sparse(),
+        persistent=False,
+    )
+    monkeypatch.setattr(whisper, "load_model", lambda name, **kwargs: model)
+    weights_cache.build("tiny.en", tmp_path, dtype)
+    cached = weights_cache.load("tiny.en", "cpu", tmp_path, dtype)
+
+    assert torch.equal(
+        cached.alignment_heads.to_dense(), model.alignment_heads.to_dense()
+    )
+    assert cached.encoder.conv1.weight.dtype == weights_cache.DTYPES[dtype]
+    assert cached.decoder.ln.weight.dtype == torch.float32
+    mel = torch.randn(1, 80, N_FRAMES)
+    tokens = torch.tensor([[50257, 50362]])
+    with torch.no_grad():
+        expected = model(mel, tokens)
+        actual = cached(mel, tokens)
+    assert torch.allclose(
+        actual, expected, atol=0.05 if dtype == "float16" else 0
+    )
+    assert weights_cache.load("tiny.en", "cpu", tmp_path / "none") is None
+
+    models_settings = app_settings.transcriber.models
+    monkeypatch.setattr(models_settings, "weights_cache_dir", str(tmp_path))
+    monkeypatch.setattr(models_settings, "weights_cache_dtype", dtype)
+    quantized = ModelRegistry().get("tiny.en", Backend.CPU_INT8)
+    with torch.no_grad():
+        assert torch.isfinite(quantized(mel, tokens)).all()
+
+
+def test_spectral_gate_keeps_louder_than_noise():
+    rng = np.random.default_rng(0)
+    rate = WHISPER_PCM_PARAMS.frame_rate
+    profile = NoiseProfile(rate)
+    profile.learn(0.01 * rng.standard_normal(rate))
+    assert profile.is_ready(min_noise_msec=500)
+
+    samples = 0.01 * rng.standard_normal(4 * rate)
+    samples[rate : 3 * rate] += 0.3 * rng.standard_normal(2 * rate)
+    np_data = NpData(WHISPER_PCM_PARAMS, samples.astype("f4"))
+    gated = spectral_gate(np_data, profile)._data
+
+    assert gated.shape == np_data._data.shape
+    assert gated.dtype == np_data._data.dtype
+    assert gated[: rate // 2].std() < 0.01 / 5  # the noise is reduced
+    signal = samples[rate + rate // 4 : 3 * rate - rate // 4]
+    kept = gated[rate + rate // 4 : 3 * rate - rate // 4]
+    assert np.sqrt(np.mean((kept - signal) ** 2)) < 0.3 / 10
+
+
+def test_spectral_gate_requires_numpy_engine():
+    settings = dict(noisereduce=None, spectral_gate=SpectralGateSettings())
+    pydub = dict(low_pass_filter=300, high_pass_filter=3500)
+    RefineStageSettings.SubSection(
+        pydub=PyDubSettings(engine="numpy", **pydub), **settings
+    )
+    with pytest.raises(ValueError, match="numpy"):
+        RefineStageSettings.SubSection(
+            pydub=PyDubSettings(engine="pydub", **pydub), **settings
+        )
+
+
+def test_refine_in_pool_like_refine_audio():
+    settings = app_settings.transcriber.stages.refine.final.model_copy(
+        update={"noisereduce": None}
+    )
+    wav = WavData.load_from_wav_file(AUDIO_FILES["en_chunk.wav"]["path"])
+    seg_data = PdData.load_from_wav_file(wav)
+    seg_datas = [seg_data[:1000], seg_data[1000:3000], seg_data[3000:3500]]
+    noise_profile = NoiseProfile(WHISPER_PCM_PARAMS.frame_rate)
+    noise_profile.learn(np.random.default_rng(0).normal(0, 0.01, 16000))
+
+    arr_datas = refine_in_pool(seg_datas, settings, noise_profile, workers=2)
+
+    assert len(arr_datas) == len(seg_datas)
+    for seg_data, arr_data in zip(seg_datas, arr_datas):
+        _, expected = refine_audio(seg_data, settings, noise_profile)
+        assert arr_data.pcm_params == expected.pcm_params
+        assert np.array_equal(arr_data._data, expected._data)
@@ -0,0 +1,27 @@
+from speech2text.utils import SharedRingBuffer
+
+
+def test_ring_buffer_drops_chunks_when_full():
+    ring = SharedRingBuffer(slot_size=4, slots_count=2)
+    try:
+        assert ring.get(timeout=0) is None
+        assert ring.put(b"ab")
+        assert ring.put(b"cdef")
+        assert not ring.put(b"gh")  # an overrun
+        assert ring.overruns == 1
+
+        for expected in (b"ab", b"cdef"):
+            chunk, sent_at = ring.get(timeout=0)
+            assert bytes(chunk) == expected
+            assert sent_at > 0
+            ring.release()
+        assert ring.pending_count == 0
+
+        for expected in (b"ij", b"kl", b"mn"):  # over the end of the ring
+            assert ring.put(expected)
+            chunk, _ = ring.get(timeout=0)
+            assert bytes(chunk) == expected
+            ring.release()
+        assert ring.overruns == 1
+    finally:
+        ring.close()
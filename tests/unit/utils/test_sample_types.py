@@ -2,6 +2,7 @@ import numpy as np
 import pytest
 
 import speech2text.utils.sample_types as st
+from speech2text.audio_data import WavData
 from speech2text.utils.sample_types import SampleDType as Sdt
 
 
@@ -178,3 +179,46 @@ def test_concat_func():
         samples_ab = st.TYPE_FACTORY[dtype](data_a + data_b)
         samples_a = st.TYPE_CONCAT_FUNC[dtype](samples_a, samples_b)
         assert all(x == y for x, y in zip(samples_a, samples_ab))
+
+
+def test_concat_func_sample_buffer():
+    data_a = [0, 1, 2, 3, 4]
+    data_b = [5, 6, 7]
+    for dtype in Sdt:
+        samples_a = st.SampleBuffer(dtype, st.TYPE_FACTORY[dtype](data_a))
+        samples_b = st.TYPE_FACTORY[dtype](data_b)
+        samples_ab = st.TYPE_FACTORY[dtype](data_a + data_b)
+        samples_a = st.TYPE_CONCAT_FUNC[dtype](samples_a, samples_b)
+        assert isinstance(samples_a, st.SampleBuffer)
+        assert list(samples_a.view()) == list(samples_ab)
+
+
+@pytest.mark.parametrize("dtype", list(Sdt))
+def test_sample_buffer_views_stay_valid(dtype: Sdt):
+    buffer = st.SampleBuffer(dtype, st.TYPE_FACTORY[dtype]([1, 2, 3]))
+    view = buffer.view()
+    for _ in range(1000):  # grows past the initial capacity
+        buffer.extend(st.TYPE_FACTORY[dtype]([4, 5]))
+    buffer.trim_front(2)
+    buffer.extend(st.TYPE_FACTORY[dtype]([6]))
+    assert list(view) == [1, 2, 3]
+    assert len(buffer) == 1 + 2000 + 1
+    assert list(buffer.view()[:3]) == [3, 4, 5]
+    assert buffer.view()[-1] == 6
+
+
+@pytest.mark.parametrize("dtype", list(Sdt))
+def test_sample_buffer_equal_by_samples(dtype: Sdt):
+    buffer = st.SampleBuffer(dtype, st.TYPE_FACTORY[dtype]([9, 1, 2, 3]))
+    buffer.trim_front(1)
+    same = st.SampleBuffer(dtype, st.TYPE_FACTORY[dtype]([1, 2, 3]))
+    assert buffer == same
+    same.extend(st.TYPE_FACTORY[dtype]([4]))
+    assert buffer != same
+
+
+def test_wav_data_equal_by_frames():
+    wav = WavData(_data=b"\x09\x00\x01\x00\x02\x00")
+    wav.trim_front(1)
+    assert wav == WavData(_data=b"\x01\x00\x02\x00")
+    assert wav != WavData(_data=b"\x01\x00\x03\x00")